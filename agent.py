@@ -1,12 +1,38 @@
+import asyncio
+import itertools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from cache import normalize_question
 from database import DatabaseConnection
-from utils import format_table_schema, format_table_profile, format_table_list
+from utils import format_table_schema, format_table_profile, format_table_list, stream_table_profile, stream_table_schema
 from llm import LLMHandler
+from metrics import configure, metrics, profiled
+from results import Records
+from router import IntentRouter, TableMatcher
 import json
 
 class DatabaseAgent:
-    def __init__(self):
-        self.db = DatabaseConnection()
-        self.llm = LLMHandler()
+    def __init__(self, db=None, llm=None):
+        # Benchmarks and tests pass in their own database backend and LLM
+        self.db = db or DatabaseConnection()
+        self.llm = llm or LLMHandler()
+        # Confident questions are routed locally; the rest go to the LLM
+        threshold = float(os.getenv('ROUTER_THRESHOLD', '0.45'))
+        self.router = IntentRouter(threshold=threshold) if threshold > 0 else None
+        # Schemas of the tables a question names are fetched while the LLM is deciding
+        self.prefetch_limit = int(os.getenv('PREFETCH_TABLE_LIMIT', '3'))
+        self._prefetcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix='prefetch')
+        self._matcher = (None, None)
+        # Set by start_event_loop in the daemon, so batches share one async LLM client and its limits
+        self._loop = None
+        self._loop_thread = None
+        # Exporters come from METRICS_* / SLOW_QUERY_* settings; the Prometheus
+        # file is rewritten and a cProfile dump taken per question when set
+        configure(metrics)
+        self.metrics_path = os.getenv('METRICS_PROM_PATH')
+        self.cprofile_path = os.getenv('METRICS_CPROFILE_PATH')
 
     def check_database_connection(self):
         """Check if the database connection is working"""
@@ -26,40 +52,344 @@ class DatabaseAgent:
             print(f"Could not retrieve schema for table '{table_name}'")
         return format_table_schema(schema)
 
-    def profile_table(self, table_name):
+    def profile_table(self, table_name, row_count=None):
         """Profile and display table statistics"""
-        profile = self.db.profile_table(table_name)
+        profile = self.db.profile_table(table_name, row_count=row_count)
         if not profile:
             print(f"Could not profile table '{table_name}'")
         return format_table_profile(profile)
 
+    def profile_database(self, max_workers=None):
+        """Profile every table in parallel and display each profile"""
+        def report(done, total, table_name, profile):
+            status = "done" if profile else "failed"
+            print(f"[{done}/{total}] {table_name} {status}")
+
+        profiles = self.db.profile_database(max_workers=max_workers, progress=report)
+        for profile in profiles.values():
+            format_table_profile(profile)
+        return profiles
+
+    def _find_row_count(self, tables, table_name):
+        """Look up a table's row count in the list_tables result"""
+        for table in tables:
+            if table_name.lower() in (table['name'].lower(), f"{table['schema']}.{table['name']}".lower()):
+                return table['row_count']
+        return None
+
     def process_question(self, question: str):
         """Process a natural language question about the database"""
+        with profiled(self.cprofile_path), metrics.span('question'):
+            result = self._process_question(question)
+        self.write_metrics()
+        return result
+
+    def _process_question(self, question: str):
+        """Answer one question and display each operation's result.
+
+        A lone schema or profile operation is displayed as the database
+        returns it, so the first columns show before the last are read.
+        """
+        routed = self._route(question)
+        if not routed:
+            return
+        plan, tables = routed
+        if len(plan) == 1 and plan[0][0] in ("get_table_schema", "profile_table"):
+            with metrics.span('question.execute'):
+                return self._stream_operation(plan[0][0], plan[0][1], tables)
+
+        with metrics.span('question.execute'):
+            answers = self._execute_plan(plan, tables)
+        with metrics.span('question.display'):
+            results = [self._display_operation(answer) for answer in answers]
+        return results[0] if len(results) == 1 else results
+
+    def answer(self, question: str):
+        """Route a question and run its operations without displaying anything.
+
+        Returns one {tool_name, parameters, result} dict per operation, or None
+        when there are no tables or no operation fits the question.
+        """
+        routed = self._route(question)
+        if not routed:
+            return None
+        plan, tables = routed
+        # Execute the selected operations; a multi-table question returns one result per operation
+        with metrics.span('question.execute'):
+            return self._execute_plan(plan, tables)
+
+    def _route(self, question: str):
+        """Get (plan, tables) for a question, or None when it cannot be answered"""
         # First, get list of tables
-        tables = self.db.list_tables()
+        with metrics.span('question.catalog'):
+            tables = self.db.list_tables()
         if not tables:
             print("No tables available to process the question.")
-            return
+            return None
 
-        # Use LLM to determine which operation to perform
-        result = self.llm.process_question(question, tables)
+        # Use the local router, or the LLM when it is unsure, to determine which operation to perform
+        with metrics.span('question.route'):
+            result = self.router.route(question, tables) if self.router else None
+        if not result:
+            with metrics.span('question.llm'):
+                prefetch = self._start_prefetch(question, tables, self._prefetcher)
+                result = self.llm.process_question(question, tables)
+                if prefetch is not None:
+                    # Wait for schemas already in flight rather than fetching them twice
+                    prefetch.result()
         if not result:
             print("Could not determine which operation to perform.")
+            return None
+        return self._plan(result), tables
+
+    def start_event_loop(self):
+        """Run batches on one long-lived event loop in a background thread.
+
+        Without it every batch gets its own loop, which is fine for one-off
+        runs; a daemon handling concurrent requests calls this so they share
+        the async LLM client, LLM_CONCURRENCY and LLM_RATE_LIMIT.
+        """
+        if self._loop is not None:
+            return
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(target=self._loop.run_forever, name='batch-loop', daemon=True)
+        self._loop_thread.start()
+
+    def close(self):
+        """Release pooled connections, the prefetch thread, the event loop and the routing cache file"""
+        if self._loop is not None:
+            self._run(self._close_llm())
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop_thread.join()
+            self._loop.close()
+            self._loop = None
+        self._prefetcher.shutdown(wait=False)
+        self.db.disconnect()
+        routing_cache = getattr(self.llm, 'routing_cache', None)
+        if routing_cache:
+            routing_cache.close()
+        self.write_metrics()
+
+    def write_metrics(self):
+        """Rewrite the Prometheus metrics file when METRICS_PROM_PATH is set"""
+        if not self.metrics_path:
             return
+        try:
+            metrics.write_prometheus(self.metrics_path)
+        except OSError as e:
+            print(f"Error writing metrics: {str(e)}")
+
+    def _prefetch_names(self, question: str, tables) -> List[str]:
+        """Guess the tables a question is about whose schemas are not cached yet"""
+        if self.prefetch_limit <= 0:
+            return []
+        matched, matcher = self._matcher
+        if tables is not matched:
+            matcher = TableMatcher(tables)
+            self._matcher = (tables, matcher)
+        names = [table['name'] if table['schema'] == 'dbo' else f"{table['schema']}.{table['name']}"
+                 for table in matcher.candidates(question, self.prefetch_limit)]
+        return [name for name in names if not self.db.catalog_cache.has_schema(name)]
+
+    def _start_prefetch(self, question: str, tables, executor):
+        """Start fetching the likely schemas in the background, returning the future or None.
+
+        The snapshot warms the catalog cache, which the operations then read
+        from; a wrong guess only costs one catalog query. Row counts need no
+        prefetch because they come with the table list.
+        """
+        names = self._prefetch_names(question, tables)
+        if not names:
+            return None
+        return executor.submit(self.db.get_catalog_snapshot, names)
+
+    def _plan(self, result):
+        """Get the (tool_name, parameters) operations of a routing result, in order"""
+        calls = result.get("calls") or [result]
+        return [(call["tool_name"], json.loads(call["parameters"])) for call in calls]
+
+    def _execute_plan(self, plan, tables):
+        """Run every operation of a plan concurrently and return their answers in plan order.
 
-        # Execute the selected operation
-        tool_name = result["tool_name"]
-        parameters = json.loads(result["parameters"])
+        Schemas that several operations need are fetched together in one catalog
+        snapshot first, so operations on the same table share a single lookup,
+        and repeated operations run once.
+        """
+        operations = list(dict.fromkeys((tool_name, json.dumps(parameters, sort_keys=True))
+                                        for tool_name, parameters in plan))
+        if len(operations) > 1:
+            names = dict.fromkeys(json.loads(parameters).get("table_name") for _, parameters in operations)
+            names = [name for name in names if name and not self.db.catalog_cache.has_schema(name)]
+            if names:
+                self.db.get_catalog_snapshot(names)
 
+        if len(operations) == 1:
+            results = {operations[0]: self._run_operation(plan[0][0], plan[0][1], tables)}
+        else:
+            workers = min(len(operations), self.db.pool.max_size)
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='operation') as executor:
+                futures = {operation: executor.submit(self._run_operation, operation[0], json.loads(operation[1]), tables)
+                           for operation in operations}
+                results = {operation: future.result() for operation, future in futures.items()}
+
+        return [{"tool_name": tool_name, "parameters": parameters,
+                 "result": results[(tool_name, json.dumps(parameters, sort_keys=True))]}
+                for tool_name, parameters in plan]
+
+    def _run_operation(self, tool_name, parameters, tables):
+        """Run one database operation and return its unformatted result"""
+        with metrics.span('operation', tool=tool_name) as span:
+            span['table'] = parameters.get("table_name")
+            if tool_name == "list_tables":
+                return tables
+            elif tool_name == "get_table_schema":
+                return self.db.get_table_schema(parameters["table_name"])
+            elif tool_name == "profile_table":
+                # Reuse the catalog row count so large tables can be sampled without another lookup
+                row_count = self._find_row_count(tables, parameters["table_name"])
+                return self.db.profile_table(parameters["table_name"], row_count=row_count)
+            return None
+
+    def _stream_operation(self, tool_name, parameters, tables):
+        """Run a schema or profile operation while displaying it, returning the result"""
+        table_name = parameters["table_name"]
+        with metrics.span('operation', tool=tool_name) as span:
+            span['table'] = table_name
+            if tool_name == "get_table_schema":
+                columns = self.db.iter_table_schema(table_name)
+                first = next(columns, None)
+                if first is None:
+                    print(f"Could not retrieve schema for table '{table_name}'")
+                    return None
+                shown = []
+                stream_table_schema(table_name, _collect(itertools.chain([first], columns), shown))
+                return {'table_name': table_name, 'columns': Records.from_dicts(shown)}
+
+            if self.db.profile_distributions:
+                # Distribution sketches are only added to whole profiles
+                return self._display_operation({"tool_name": tool_name, "parameters": parameters,
+                                                "result": self._run_operation(tool_name, parameters, tables)})
+            items = self.db.iter_profile(table_name, row_count=self._find_row_count(tables, table_name))
+            header = next(items, None)
+            if header is None:
+                print(f"Could not profile table '{table_name}'")
+                return None
+            shown = []
+            stream_table_profile(itertools.chain([header], _collect(items, shown)))
+            return dict(header, columns=Records.from_dicts(shown))
+
+    def process_questions(self, questions: List[str], display: bool = True):
+        """Process a batch of questions concurrently.
+
+        The catalog is fetched once, LLM calls run through the async client
+        within its concurrency and rate limits, database work runs on a thread
+        pool sized to the connection pool, and identical questions share one
+        answer. Returns, per question and in order, a list with one
+        {tool_name, parameters, result} dict per operation (or None), and
+        displays them in order when display is set.
+        """
+        with profiled(self.cprofile_path):
+            with metrics.span('batch') as span:
+                span['questions'] = len(questions)
+                answers = self._run(self._process_questions(questions))
+            if display:
+                with metrics.span('question.display'):
+                    for question, answer in zip(questions, answers):
+                        print("-----------------question---------------")
+                        print(f"\nProcessing question: {question}")
+                        self._display_answer(answer)
+        self.write_metrics()
+        return answers
+
+    def _run(self, coroutine):
+        """Run a coroutine on the shared event loop, or on a new one closed afterwards"""
+        if self._loop is not None:
+            return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+        async def run_once():
+            try:
+                return await coroutine
+            finally:
+                await self._close_llm()
+        return asyncio.run(run_once())
+
+    async def _close_llm(self):
+        """Close the LLM's async client for the running loop, if it has one"""
+        aclose = getattr(self.llm, 'aclose', None)
+        if aclose is not None:
+            await aclose()
+
+    async def _process_questions(self, questions: List[str]):
+        """Run the batch pipeline on the current event loop"""
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=self.db.pool.max_size, thread_name_prefix='question') as executor:
+            tables = await loop.run_in_executor(executor, self.db.list_tables)
+            if not tables:
+                print("No tables available to process the question.")
+                return [None] * len(questions)
+
+            # Questions that normalize the same are answered once
+            in_flight = {}
+            def answer(question):
+                key = normalize_question(question)
+                if key not in in_flight:
+                    in_flight[key] = asyncio.ensure_future(self._answer(question, tables, executor))
+                return in_flight[key]
+
+            return await asyncio.gather(*(answer(question) for question in questions))
+
+    async def _answer(self, question: str, tables, executor):
+        """Route one question and run its database operations off the event loop"""
+        result = self.router.route(question, tables) if self.router else None
+        if not result:
+            prefetch = self._start_prefetch(question, tables, executor)
+            result = await self.llm.aprocess_question(question, tables)
+            if prefetch is not None:
+                await asyncio.wrap_future(prefetch)
+        if not result:
+            return None
+
+        plan = self._plan(result)
+        loop = asyncio.get_running_loop()
+        if len(plan) == 1:
+            tool_name, parameters = plan[0]
+            data = await loop.run_in_executor(executor, self._run_operation, tool_name, parameters, tables)
+            return [{"tool_name": tool_name, "parameters": parameters, "result": data}]
+        # Multi-operation plans fan out on their own threads so they cannot starve the batch executor
+        return await loop.run_in_executor(None, self._execute_plan, plan, tables)
+
+    def _display_answer(self, answer):
+        """Print one batch answer the way process_question does"""
+        if not answer:
+            print("Could not determine which operation to perform.")
+            return
+        for operation in answer:
+            self._display_operation(operation)
+
+    def _display_operation(self, answer):
+        """Print the result of one operation and return it formatted"""
+        tool_name, data = answer["tool_name"], answer["result"]
         if tool_name == "list_tables":
-            return self.get_database_tables()
+            if not data:
+                print("No tables found or error occurred while fetching tables.")
+            return format_table_list(data)
         elif tool_name == "get_table_schema":
-            return self.get_table_schema(parameters["table_name"])
+            if not data:
+                print(f"Could not retrieve schema for table '{answer['parameters']['table_name']}'")
+            return format_table_schema(data)
         elif tool_name == "profile_table":
-            return self.profile_table(parameters["table_name"])
+            if not data:
+                print(f"Could not profile table '{answer['parameters']['table_name']}'")
+            return format_table_profile(data)
         else:
             print(f"Unknown operation: {tool_name}")
 
+def _collect(items, collected):
+    """Pass items through, appending each to collected"""
+    for item in items:
+        collected.append(item)
+        yield item
+
 def main():
     # Create an instance of the agent
     agent = DatabaseAgent()
@@ -77,11 +407,8 @@ def main():
             "Profile the vendors table"
         ]
         
-        # Process each question
-        for question in questions:
-            print("-----------------question---------------")
-            print(f"\nProcessing question: {question}")
-            agent.process_question(question)
+        # Process the questions concurrently; answers are printed in order
+        agent.process_questions(questions)
     else:
         print("Agent failed to connect to the database.")
 
@@ -0,0 +1,272 @@
+"""Local stand-ins for SQL Server and the OpenAI API, used by the benchmark suite.
+
+SQLiteDatabase is a DatabaseConnection whose catalog queries read SQLite's
+own catalog, and whose profiling statements are rewritten only where T-SQL
+and SQLite differ. Only the exact, approximate, auto, metadata (which
+falls back to a sample) and snapshot profile modes run on it. FakeLLM answers questions deterministically after an
+injectable delay, so end-to-end runs measure this code rather than the API.
+"""
+import asyncio
+import math
+import random
+import re
+import sqlite3
+import time
+from collections import namedtuple
+from functools import lru_cache
+
+from cache import CatalogState
+from database import DatabaseConnection
+from profiler import TableProfiler, quote_identifier, quote_table_name
+
+COLUMN_TYPES = ['int', 'float', 'varchar', 'datetime', 'bigint', 'decimal', 'bit', 'date']
+
+
+@lru_cache(maxsize=None)
+def _row_type(fields):
+    return namedtuple('Row', fields, rename=True)
+
+
+def _named_row(cursor, row):
+    """Row factory giving attribute access by column name, like pyodbc rows"""
+    return _row_type(tuple(description[0] for description in cursor.description))(*row)
+
+
+class _Stdev:
+    """Sample standard deviation aggregate, which SQLite lacks"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.squares = 0.0
+
+    def step(self, value):
+        if value is None:
+            return
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.squares += delta * (value - self.mean)
+
+    def finalize(self):
+        return math.sqrt(self.squares / (self.count - 1)) if self.count > 1 else None
+
+
+class SQLiteConnection:
+    """sqlite3 connection that accepts the attributes pyodbc connections have"""
+
+    def __init__(self, path):
+        self.raw = sqlite3.connect(path, check_same_thread=False)
+        self.raw.row_factory = _named_row
+        self.raw.create_aggregate('STDEV', 1, _Stdev)
+        self.timeout = 0
+
+    def cursor(self):
+        return self.raw.cursor()
+
+    def interrupt(self):
+        """Abort the running statement, as cursor.cancel() does on pyodbc"""
+        self.raw.interrupt()
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def close(self):
+        self.raw.close()
+
+
+class SQLiteProfiler(TableProfiler):
+    """TableProfiler emitting statements SQLite understands"""
+
+    count_function = 'COUNT'
+
+    def sample_source(self, source, rows, method='tablesample'):
+        return f"(SELECT * FROM {source} LIMIT {rows})"
+
+
+def build_catalog(path, tables, columns, rows, seed=42):
+    """Create a synthetic database of `tables` tables, each `columns` wide with `rows` rows.
+
+    Table sizes vary between a tenth of `rows` and `rows`. A bench_tables
+    table stands in for sys.tables, holding row counts and modify dates.
+    """
+    rng = random.Random(seed)
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE bench_tables (name TEXT PRIMARY KEY, row_count INTEGER, modify_date TEXT)")
+    generators = {
+        'int': lambda: rng.randint(0, 100000),
+        'bigint': lambda: rng.randint(0, 10 ** 12),
+        'float': lambda: rng.random() * 1000,
+        'decimal': lambda: round(rng.random() * 1000, 2),
+        'bit': lambda: rng.randint(0, 1),
+        'varchar': lambda: f"value_{rng.randint(0, 5000)}",
+        'datetime': lambda: f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 12:00:00",
+        'date': lambda: f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+    }
+    for table_index in range(tables):
+        name = f"table_{table_index:04d}"
+        table_columns = [('id', 'int')] + [(f"col_{i}", COLUMN_TYPES[(i + table_index) % len(COLUMN_TYPES)])
+                                          for i in range(columns - 1)]
+        definitions = ", ".join(f"{quote_identifier(column)} {data_type}" for column, data_type in table_columns)
+        connection.execute(f"CREATE TABLE {quote_table_name(name)} ({definitions}, PRIMARY KEY (id))")
+        row_count = max(1, int(rows * (0.1 + 0.9 * rng.random())))
+        placeholders = ", ".join("?" for _ in table_columns)
+        connection.executemany(
+            f"INSERT INTO {quote_table_name(name)} VALUES ({placeholders})",
+            ((row,) + tuple(None if rng.random() < 0.05 else generators[data_type]()
+                            for _, data_type in table_columns[1:])
+             for row in range(1, row_count + 1)))
+        connection.execute("INSERT INTO bench_tables VALUES (?, ?, ?)", (name, row_count, '2024-01-01 00:00:00'))
+    connection.commit()
+    connection.close()
+
+
+class SQLiteDatabase(DatabaseConnection):
+    """DatabaseConnection over a database made by build_catalog.
+
+    Only the catalog lookups differ from the SQL Server implementation, and
+    schema-qualified names such as dbo.name lose their schema before they
+    reach SQLite. Pooling, caching and streaming run unchanged, as do the
+    exact, approximate, auto, metadata and snapshot profile modes. The
+    partitioned and incremental modes and distribution sketches build
+    T-SQL-only range and scan statements and fail here.
+    """
+
+    def __init__(self, path):
+        super().__init__(connect=lambda: SQLiteConnection(path), driver_error=sqlite3.Error)
+        self.profiler = SQLiteProfiler(exact_row_limit=self.profiler.exact_row_limit,
+                                       sample_rows=self.profiler.sample_rows)
+        # SQLite has no isolation statements or server wait statistics
+        self.governor.isolation = None
+
+    def profile_table(self, table_name, mode=None, row_count=None):
+        return super().profile_table(self._table(table_name), mode, row_count)
+
+    def iter_profile(self, table_name, mode=None, row_count=None):
+        return super().iter_profile(self._table(table_name), mode, row_count)
+
+    def snapshot_table(self, table_name):
+        return super().snapshot_table(self._table(table_name))
+
+    def _table(self, table_name):
+        # Accept the same spellings as SQL Server: [dbo].[name], dbo.name, name
+        name = table_name.replace('[', '').replace(']', '')
+        return name[4:] if name.lower().startswith('dbo.') else name
+
+    def _stream_tables(self, batch_size=None):
+        with self.cursor() as cursor:
+            cursor.execute("SELECT name AS TableName, 'dbo' AS SchemaName, row_count AS RowCounts "
+                           "FROM bench_tables ORDER BY name")
+            while True:
+                tables = cursor.fetchmany(batch_size or self.fetch_batch_size)
+                if not tables:
+                    break
+                for table in tables:
+                    yield {'name': table.TableName, 'schema': table.SchemaName, 'row_count': table.RowCounts}
+
+    def _column_query(self, source):
+        return f"""
+            SELECT c.name AS ColumnName, lower(c.type) AS DataType, NULL AS MaxLength, NULL AS Precision,
+                   NULL AS Scale, NOT c."notnull" AS IsNullable, c.pk > 0 AS IsPrimaryKey, 0 AS IsForeignKey,
+                   0 AS IsIdentity, c.cid + 1 AS ColumnOrder, b.modify_date AS ModifyDate,
+                   b.name AS TableName, 'dbo' AS SchemaName, b.row_count AS RowCounts
+            FROM {source}
+            """
+
+    def _stream_table_schema(self, table_name, batch_size=None):
+        with self.cursor() as cursor:
+            cursor.execute(self._column_query("bench_tables b, pragma_table_info(b.name) c WHERE b.name = ?")
+                           + " ORDER BY c.cid", (self._table(table_name),))
+            while True:
+                columns = cursor.fetchmany(batch_size or self.fetch_batch_size)
+                if not columns:
+                    break
+                for col in columns:
+                    yield self._column_info(col), col.ModifyDate
+
+    def _fetch_snapshot(self, table_names, snapshot, batch_size, state):
+        names = None if table_names is None else {self._table(name): name for name in table_names}
+        current = None
+        source = "bench_tables b, pragma_table_info(b.name) c"
+        params = ()
+        if names is not None:
+            source += f" WHERE b.name IN ({', '.join('?' for _ in names)})"
+            params = tuple(names)
+        with self.cursor() as cursor:
+            cursor.execute(self._column_query(source) + " ORDER BY b.name, c.cid", params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    requested = f"dbo.{row.TableName}" if names is None else names[row.TableName]
+                    if current is None or requested != current['table_name']:
+                        if current is not None:
+                            self._put_schema(current, modify_date, state)
+                        current = {'table_name': requested, 'columns': []}
+                        modify_date = row.ModifyDate
+                        snapshot['schemas'][requested] = current
+                        snapshot['tables'].append({'name': row.TableName, 'schema': row.SchemaName,
+                                                   'row_count': row.RowCounts})
+                    current['columns'].append(self._column_info(row))
+        if current is not None:
+            self._put_schema(current, modify_date, state)
+
+    def _fetch_pressure_waits(self):
+        return None
+
+    def _fetch_catalog_state(self):
+        with self.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*), MAX(modify_date), SUM(row_count) FROM bench_tables")
+            return CatalogState(*cursor.fetchone())
+
+    def _fetch_modify_date(self, table_name):
+        with self.cursor() as cursor:
+            cursor.execute("SELECT modify_date FROM bench_tables WHERE name = ?", (self._table(table_name),))
+            row = cursor.fetchone()
+            return row[0] if row else None
+
+    def get_row_count(self, table_name):
+        with self.cursor() as cursor:
+            cursor.execute("SELECT row_count FROM bench_tables WHERE name = ?", (self._table(table_name),))
+            row = cursor.fetchone()
+            return row[0] if row else None
+
+
+class FakeLLM:
+    """Deterministic stand-in for LLMHandler with a fixed per-call latency.
+
+    Picks profile_table for questions about statistics or profiles,
+    get_table_schema for structure or columns and list_tables otherwise,
+    on the first catalog table named in the question.
+    """
+
+    PROFILE_WORDS = re.compile(r"\b(profile|statistics|stats|quality|distribution|nulls?)\b")
+    SCHEMA_WORDS = re.compile(r"\b(schema|structure|columns?|fields?|types?|describe)\b")
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+
+    def _route(self, question, tables):
+        self.calls += 1
+        text = question.lower()
+        table = next((t['name'] for t in tables if re.search(rf"\b{re.escape(t['name'].lower())}\b", text)), None)
+        if table and self.PROFILE_WORDS.search(text):
+            return {"tool_name": "profile_table", "parameters": f'{{"table_name": "{table}"}}'}
+        if table and self.SCHEMA_WORDS.search(text):
+            return {"tool_name": "get_table_schema", "parameters": f'{{"table_name": "{table}"}}'}
+        return {"tool_name": "list_tables", "parameters": "{}"}
+
+    def process_question(self, question, tables):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._route(question, tables)
+
+    async def aprocess_question(self, question, tables):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._route(question, tables)
@@ -0,0 +1,106 @@
+"""Compare the per-column profiling queries with the single-scan profiler.
+
+Builds a synthetic wide table in an in-memory SQLite database and counts the
+statements and table scans each approach issues. Run from the repository root:
+
+    python -m benchmarks.profile_scans --columns 60 --rows 20000
+"""
+import argparse
+import random
+import sqlite3
+import time
+
+from profiler import TableProfiler, column_metrics, quote_identifier, quote_table_name
+
+COLUMN_TYPES = ['int', 'float', 'varchar', 'datetime']
+
+
+class CountingCursor:
+    """Cursor wrapper that counts statements and the table scans SQLite plans for them"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.cursor = connection.cursor()
+        self.queries = 0
+        self.scans = 0
+
+    def execute(self, sql, params=()):
+        self.queries += 1
+        plan = self.connection.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        self.scans += sum(1 for step in plan if step[-1].startswith('SCAN'))
+        return self.cursor.execute(sql, params)
+
+    def fetchone(self):
+        return self.cursor.fetchone()
+
+
+def build_table(connection, table_name, column_count, row_count):
+    """Create and fill a synthetic table, returning its column list"""
+    columns = [{'name': f"col_{i}", 'data_type': COLUMN_TYPES[i % len(COLUMN_TYPES)]}
+               for i in range(column_count)]
+    definitions = ", ".join(f"{quote_identifier(c['name'])} {c['data_type']}" for c in columns)
+    connection.execute(f"CREATE TABLE {quote_table_name(table_name)} ({definitions})")
+
+    rng = random.Random(42)
+    generators = {
+        'int': lambda: rng.randint(0, 1000),
+        'float': lambda: rng.random() * 100,
+        'varchar': lambda: f"value_{rng.randint(0, 500)}",
+        'datetime': lambda: f"2024-01-{rng.randint(1, 28):02d}",
+    }
+    placeholders = ", ".join("?" for _ in columns)
+    rows = [
+        tuple(None if rng.random() < 0.1 else generators[c['data_type']]() for c in columns)
+        for _ in range(row_count)
+    ]
+    connection.executemany(f"INSERT INTO {quote_table_name(table_name)} VALUES ({placeholders})", rows)
+    return columns
+
+
+def profile_per_column(cursor, table_name, columns):
+    """Issue the statements the original per-column profile_table ran"""
+    source = quote_table_name(table_name)
+    cursor.execute(f"SELECT COUNT(*) FROM {source}")
+    cursor.fetchone()
+    for column in columns:
+        name = quote_identifier(column['name'])
+        cursor.execute(f"SELECT COUNT(*), COUNT(DISTINCT {name}) FROM {source} WHERE {name} IS NULL")
+        cursor.fetchone()
+        cursor.execute(f"SELECT COUNT(DISTINCT {name}) FROM {source}")
+        cursor.fetchone()
+        if 'min' in column_metrics(column['data_type']):
+            cursor.execute(f"SELECT MIN({name}), MAX({name}) FROM {source}")
+            cursor.fetchone()
+
+
+def run(label, connection, profile):
+    """Time one profiling approach and report its query and scan counts"""
+    cursor = CountingCursor(connection)
+    started = time.perf_counter()
+    profile(cursor)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<14} queries={cursor.queries:<6} scans={cursor.scans:<6} time={elapsed * 1000:.1f} ms")
+    return cursor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--columns', type=int, default=60)
+    parser.add_argument('--rows', type=int, default=20000)
+    args = parser.parse_args()
+
+    connection = sqlite3.connect(':memory:')
+    table_name = 'fact_sales'
+    columns = build_table(connection, table_name, args.columns, args.rows)
+
+    profiler = TableProfiler()
+    profiler.count_function = 'COUNT'
+
+    print(f"Profiling {args.columns} columns x {args.rows} rows")
+    before = run('per-column', connection, lambda cursor: profile_per_column(cursor, table_name, columns))
+    after = run('single-scan', connection, lambda cursor: profiler.profile(cursor, table_name, columns))
+    print(f"Scan reduction: {before.scans / max(after.scans, 1):.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Measure how often the local intent router answers without the LLM, and how well.
+
+Routes every question in fixtures/router_questions.json and reports coverage
+(questions resolved locally), accuracy of the resolved ones, and latency.
+Questions whose expected tool is null should fall through to the LLM.
+Run from the repository root:
+
+    python -m benchmarks.router_accuracy --threshold 0.45
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+from router import IntentRouter
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'router_questions.json')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threshold', type=float, default=0.45)
+    parser.add_argument('--repeat', type=int, default=200, help="timed routing passes per question")
+    parser.add_argument('--verbose', action='store_true', help="print every routing decision")
+    args = parser.parse_args()
+
+    with open(FIXTURE) as f:
+        fixture = json.load(f)
+    tables = fixture['tables']
+
+    started = time.perf_counter()
+    router = IntentRouter(threshold=args.threshold)
+    build_ms = (time.perf_counter() - started) * 1000
+    router.route("warm up", tables)
+
+    routed = correct = fallbacks_expected = fallbacks_correct = 0
+    latencies = []
+    for case in fixture['questions']:
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            result = router.route(case['question'], tables)
+            latencies.append(time.perf_counter() - started)
+
+        expected_table = case['table']
+        if case['tool'] is None:
+            fallbacks_expected += 1
+            fallbacks_correct += result is None
+        if result is not None:
+            routed += 1
+            table = json.loads(result['parameters']).get('table_name')
+            correct += result['tool_name'] == case['tool'] and table == expected_table
+        if args.verbose:
+            decision = f"{result['tool_name']} {result['parameters']} ({result['confidence']:.2f})" if result else "-> LLM"
+            print(f"{case['question']:<55} {decision}")
+
+    latencies.sort()
+    answerable = len(fixture['questions']) - fallbacks_expected
+    print(f"Router built in {build_ms:.1f} ms over {len(router.vocabulary)} n-grams")
+    print(f"Resolved locally: {routed}/{len(fixture['questions'])} "
+          f"(coverage of answerable questions {routed - (fallbacks_expected - fallbacks_correct)}/{answerable})")
+    print(f"Accuracy of local answers: {correct}/{routed}")
+    print(f"Unanswerable questions sent to the LLM: {fallbacks_correct}/{fallbacks_expected}")
+    print(f"Latency: p50={statistics.median(latencies) * 1e6:.0f} us "
+          f"p99={latencies[int(len(latencies) * 0.99)] * 1e6:.0f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Compare profiling on the database with profiling a local columnar snapshot.
+
+Builds a synthetic table in an on-disk SQLite database standing in for SQL
+Server, profiles it with the aggregate statements, exports it once to an Arrow
+snapshot and profiles the snapshot, checking that both give the same counts.
+Run from the repository root:
+
+    python -m benchmarks.snapshot_profile --columns 40 --rows 200000
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+from benchmarks.profile_scans import build_table
+from profiler import TableProfiler
+from snapshot import SnapshotStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--columns', type=int, default=40)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        connection = sqlite3.connect(os.path.join(directory, 'source.sqlite'))
+        table_name = 'fact_sales'
+        columns = build_table(connection, table_name, args.columns, args.rows)
+        connection.commit()
+
+        profiler = TableProfiler()
+        profiler.count_function = 'COUNT'
+        store = SnapshotStore(os.path.join(directory, 'snapshots'))
+
+        print(f"Profiling {args.columns} columns x {args.rows} rows, {args.repeats} times each")
+        started = time.perf_counter()
+        for _ in range(args.repeats):
+            database_profile = profiler.profile(connection.cursor(), table_name, columns)
+        database_time = (time.perf_counter() - started) / args.repeats
+
+        started = time.perf_counter()
+        path, rows = store.export(connection.cursor(), table_name, columns)
+        export_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for _ in range(args.repeats):
+            table, metadata = store.open(table_name)
+            snapshot_profile = store.profile(profiler, table, table_name, columns, metadata)
+        snapshot_time = (time.perf_counter() - started) / args.repeats
+
+        mismatches = [
+            column['name'] for column, expected in zip(snapshot_profile['columns'], database_profile['columns'])
+            if (column['null_count'], column['unique_count']) != (expected['null_count'], expected['unique_count'])
+        ]
+        print(f"{'database':<10} {database_time * 1000:.1f} ms per profile")
+        print(f"{'export':<10} {export_time * 1000:.1f} ms once ({rows} rows, {os.path.getsize(path) / 1e6:.1f} MB)")
+        print(f"{'snapshot':<10} {snapshot_time * 1000:.1f} ms per profile")
+        print(f"Columns with different null/unique counts: {mismatches or 'none'}")
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+"""Benchmark the catalog, schema, profile and end-to-end question workloads.
+
+Builds a synthetic catalog in SQLite (see benchmarks/backends.py), runs each
+workload through the real DatabaseConnection and DatabaseAgent with a fake
+LLM, and reports latency percentiles, statements issued, rows fetched, rows
+scanned and peak Python memory. Results can be written as JSON and compared
+with a run from another commit. Run from the repository root:
+
+    python -m benchmarks.suite --tables 200 --columns 30 --rows 20000 --output before.json
+    python -m benchmarks.suite --tables 200 --columns 30 --rows 20000 --compare before.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+
+# The suite must not read or write the developer's caches and profile store
+os.environ['ROUTING_CACHE_PATH'] = ''
+os.environ['PROFILE_STORE_PATH'] = ''
+
+from agent import DatabaseAgent
+from benchmarks.backends import FakeLLM, SQLiteDatabase, build_catalog
+from metrics import metrics
+
+QUESTIONS = [
+    "Show me all the tables in the database",
+    "What's the structure of the {table} table?",
+    "Give me statistics about the {table} table",
+    "Which columns does {table} have?",
+]
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of a list of samples"""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))]
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Workload:
+    """One benchmarked operation; run(i) performs iteration i"""
+
+    def __init__(self, name, run, setup=None):
+        self.name = name
+        self.run = run
+        self.setup = setup
+
+
+def scanned_rows(path, statements, row_counts):
+    """Estimate rows read from the full table scans in each statement's query plan"""
+    connection = sqlite3.connect(path)
+    total = 0
+    try:
+        for sql in statements:
+            try:
+                plan = connection.execute(f"EXPLAIN QUERY PLAN {sql}", (None,) * sql.count('?')).fetchall()
+            except sqlite3.Error:
+                continue
+            for step in plan:
+                words = step[-1].split()
+                if words[:1] == ['SCAN'] and len(words) > 1:
+                    total += row_counts.get(words[1].strip('[]"'), 0)
+    finally:
+        connection.close()
+    return total
+
+
+def measure(workload, iterations, path, row_counts, llm):
+    """Time a workload, then repeat it under tracemalloc for peak memory"""
+    statements = []
+    listener = lambda event: statements.append(event['sql']) if event['span'] == 'db.query' else None
+    metrics.reset()
+    metrics.listeners.append(listener)
+    llm_calls = llm.calls
+    latencies = []
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(iterations):
+                if workload.setup:
+                    workload.setup(i)
+                started = time.perf_counter()
+                workload.run(i)
+                latencies.append(time.perf_counter() - started)
+    finally:
+        metrics.listeners.remove(listener)
+    counters = {name: value for (name, labels), value in metrics.counters.items() if not labels}
+    llm_calls = llm.calls - llm_calls
+
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            if workload.setup:
+                workload.setup(iterations)
+            workload.run(iterations)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'iterations': iterations,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'mean_ms': sum(latencies) / len(latencies) * 1000,
+        'queries': counters.get('db.queries', 0) / iterations,
+        'rows_fetched': counters.get('db.rows', 0) / iterations,
+        'rows_scanned': scanned_rows(path, statements, row_counts) / iterations,
+        'llm_calls': llm_calls / iterations,
+        'peak_memory_kb': peak / 1024,
+    }
+
+
+def workloads(agent, tables):
+    """The catalog, schema, profile and question workloads over a built catalog"""
+    db = agent.db
+    names = [table['name'] for table in tables]
+
+    def cold(i):
+        db.catalog_cache.invalidate()
+
+    def question(i):
+        table = names[i % len(names)]
+        agent.process_question(QUESTIONS[i % len(QUESTIONS)].format(table=table))
+
+    return [
+        Workload('catalog', lambda i: db.list_tables(), setup=cold),
+        Workload('catalog_cached', lambda i: db.list_tables()),
+        Workload('schema', lambda i: db.get_table_schema(names[i % len(names)]), setup=cold),
+        Workload('profile', lambda i: db.profile_table(names[i % len(names)], mode='exact')),
+        Workload('question', question, setup=cold),
+    ]
+
+
+def compare(results, baseline):
+    """Print the change of each workload's latency and statement count against a baseline run"""
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'}:")
+    for name, result in results['workloads'].items():
+        before = baseline['workloads'].get(name)
+        if not before:
+            continue
+        changes = []
+        for key in ('p50_ms', 'p95_ms', 'queries', 'peak_memory_kb'):
+            if before[key]:
+                changes.append(f"{key} {(result[key] - before[key]) / before[key] * 100:+.1f}%")
+        print(f"{name:<16} {', '.join(changes)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tables', type=int, default=50)
+    parser.add_argument('--columns', type=int, default=20)
+    parser.add_argument('--rows', type=int, default=5000, help="rows of the largest table")
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--llm-latency', type=float, default=0.0, help="seconds each fake LLM call takes")
+    parser.add_argument('--router-threshold', type=float, default=0.45,
+                        help="local router threshold; 0 sends every question to the fake LLM")
+    parser.add_argument('--only', nargs='*', help="workloads to run")
+    parser.add_argument('--output', help="write results as JSON to this file")
+    parser.add_argument('--compare', help="JSON results of an earlier run to compare with")
+    args = parser.parse_args()
+
+    os.environ['ROUTER_THRESHOLD'] = str(args.router_threshold)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bench.sqlite')
+        started = time.perf_counter()
+        build_catalog(path, args.tables, args.columns, args.rows)
+        print(f"Built {args.tables} tables x {args.columns} columns in {time.perf_counter() - started:.1f}s")
+
+        llm = FakeLLM(args.llm_latency)
+        db = SQLiteDatabase(path)
+        agent = DatabaseAgent(db=db, llm=llm)
+        tables = db.list_tables()
+        row_counts = {table['name']: table['row_count'] for table in tables}
+
+        results = {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'config': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+            'workloads': {}
+        }
+        print(f"{'workload':<16} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8} "
+              f"{'fetched':>9} {'scanned':>10} {'llm':>5} {'peak KB':>9}")
+        for workload in workloads(agent, tables):
+            if args.only and workload.name not in args.only:
+                continue
+            result = measure(workload, args.iterations, path, row_counts, llm)
+            results['workloads'][workload.name] = result
+            print(f"{workload.name:<16} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} "
+                  f"{result['queries']:>8.1f} {result['rows_fetched']:>9.0f} {result['rows_scanned']:>10.0f} "
+                  f"{result['llm_calls']:>5.2f} {result['peak_memory_kb']:>9.0f}")
+        db.disconnect()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,283 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from typing import Any, Callable, Dict, List, Optional
+
+# Cheap summary of sys.tables used to tell whether cached catalog data is stale.
+# table_count and last_modified change on CREATE/DROP/ALTER, total_rows on DML.
+CatalogState = namedtuple('CatalogState', ['table_count', 'last_modified', 'total_rows'])
+
+
+class CacheEntry:
+    """A cached value with the versions it was valid for"""
+
+    def __init__(self, value, state: Optional[CatalogState], item_version=None):
+        self.value = value
+        self.state = state
+        self.item_version = item_version
+        self.checked_at = time.monotonic()
+
+
+class LRUCache:
+    """Thread-safe mapping that evicts the least recently used key past max_size"""
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            return self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class CatalogCache:
+    """In-process cache for the table list and per-table schemas.
+
+    Entries younger than ttl seconds are served without touching the database.
+    Older entries are revalidated against a one-row summary of sys.tables
+    (fetched at most once per ttl and shared by every entry), and a schema whose
+    table did change is checked against its own modify_date before reloading.
+    """
+
+    def __init__(self, fetch_state: Callable[[], CatalogState], ttl: float = 60, max_size: int = 1024):
+        self.fetch_state = fetch_state
+        self.ttl = ttl
+        self.entries = LRUCache(max_size)
+        self.hits = 0
+        self.misses = 0
+        self._state = None
+        self._state_checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def catalog_state(self) -> CatalogState:
+        """Get the catalog summary, querying it at most once per ttl"""
+        with self._lock:
+            if self._state is not None and time.monotonic() - self._state_checked_at < self.ttl:
+                return self._state
+        state = self.fetch_state()
+        with self._lock:
+            self._state = state
+            self._state_checked_at = time.monotonic()
+        return state
+
+    def get_tables(self, load: Callable[[], Any]):
+        """Get the cached table list, reloading it when any table or row count changed"""
+        def still_valid(entry, state):
+            return entry.state == state
+        return self._get('tables', load, still_valid)
+
+    def get_schema(self, table_name: str, load: Callable[[], Any], fetch_modify_date: Callable[[str], Any]):
+        """Get a cached table schema.
+
+        load must return a (schema, modify_date) pair. When other tables changed
+        but this one's modify_date did not, the entry is kept.
+        """
+        def still_valid(entry, state):
+            if entry.state is not None and entry.state[:2] == state[:2]:
+                return True
+            return entry.item_version is not None and fetch_modify_date(table_name) == entry.item_version
+        return self._get(self._schema_key(table_name), load, still_valid, versioned=True)
+
+    def has_tables(self) -> bool:
+        """Whether a table list is cached, fresh or not"""
+        return self.entries.get('tables') is not None
+
+    def has_schema(self, table_name: str) -> bool:
+        """Whether a schema for the table is cached, fresh or not"""
+        return self.entries.get(self._schema_key(table_name)) is not None
+
+    def put_tables(self, tables):
+        """Store a table list fetched outside get_tables"""
+        self.entries.put('tables', CacheEntry(tables, self.catalog_state()))
+
+    def put_schema(self, table_name: str, schema, modify_date, state: Optional[CatalogState] = None):
+        """Store a schema fetched outside get_schema, such as from a bulk snapshot.
+
+        Pass state when the caller already holds a connection, so checking the
+        catalog doesn't need a second one.
+        """
+        if state is None:
+            state = self.catalog_state()
+        self.entries.put(self._schema_key(table_name), CacheEntry(schema, state, modify_date))
+
+    def invalidate(self, table_name: Optional[str] = None):
+        """Drop one table's schema, or everything when no table is given"""
+        if table_name is None:
+            self.entries.clear()
+            with self._lock:
+                self._state = None
+            return
+        self.entries.pop(self._schema_key(table_name))
+        self.entries.pop('tables')
+
+    def stats(self) -> Dict:
+        """Hit/miss counters for the cache"""
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries)}
+
+    def _schema_key(self, table_name: str):
+        # "vendors", "dbo.vendors" and "[dbo].[Vendors]" name the same table
+        name = table_name.replace('[', '').replace(']', '').lower()
+        if name.startswith('dbo.'):
+            name = name[4:]
+        return ('schema', name)
+
+    def _get(self, key, load, still_valid, versioned: bool = False):
+        entry = self.entries.get(key)
+        if entry is not None:
+            if time.monotonic() - entry.checked_at < self.ttl:
+                self.hits += 1
+                return entry.value
+            state = self.catalog_state()
+            if still_valid(entry, state):
+                entry.state = state
+                entry.checked_at = time.monotonic()
+                self.hits += 1
+                return entry.value
+
+        self.misses += 1
+        state = self.catalog_state()
+        if versioned:
+            value, item_version = load()
+        else:
+            value, item_version = load(), None
+        # Failed lookups are not cached so the next call retries them
+        if value:
+            self.entries.put(key, CacheEntry(value, state, item_version))
+        return value
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase a question and drop whitespace and punctuation differences"""
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip("?.! ")
+
+
+def catalog_fingerprint(tables: List[Dict]) -> str:
+    """Hash the table names a routing decision could depend on"""
+    names = sorted(f"{table['schema']}.{table['name']}".lower() for table in tables)
+    return hashlib.sha1("\n".join(names).encode()).hexdigest()
+
+
+def tools_fingerprint(tools: List[Dict]) -> str:
+    """Hash the tool definitions sent to the LLM"""
+    return hashlib.sha1(json.dumps(tools, sort_keys=True).encode()).hexdigest()
+
+
+class RoutingCache:
+    """Persistent cache of LLM tool-routing decisions.
+
+    Keys combine the normalized question, model, tool schemas and catalog
+    fingerprint, so any change to those produces a miss. Entries live in a
+    SQLite file and are mirrored in memory, so hits never touch the disk;
+    recency updates are written back in batches and the least recently used
+    entries are evicted past max_size.
+    """
+
+    def __init__(self, path: str, max_size: int = 10000):
+        self.path = path
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._touched = {}
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS routes (
+                key TEXT PRIMARY KEY,
+                tool_name TEXT NOT NULL,
+                parameters TEXT NOT NULL,
+                last_used REAL NOT NULL,
+                calls TEXT
+            )""")
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(routes)")]
+        if 'calls' not in columns:
+            # Files written before multi-call results were cached
+            self._db.execute("ALTER TABLE routes ADD COLUMN calls TEXT")
+        for key, tool_name, parameters, calls in self._db.execute(
+                "SELECT key, tool_name, parameters, calls FROM routes ORDER BY last_used"):
+            self._entries[key] = self._result(tool_name, parameters, json.loads(calls) if calls else None)
+
+    @staticmethod
+    def make_key(question: str, model: str, tools_hash: str, catalog_hash: str) -> str:
+        """Build the cache key for one routing decision from precomputed fingerprints"""
+        parts = [normalize_question(question), model, tools_hash, catalog_hash]
+        return hashlib.sha1("\0".join(parts).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._touched[key] = time.time()
+            self.hits += 1
+            return dict(result)
+
+    def put(self, key: str, result: Dict):
+        calls = result.get("calls")
+        with self._lock:
+            self._entries[key] = self._result(result["tool_name"], result["parameters"], calls)
+            self._entries.move_to_end(key)
+            self._touched.pop(key, None)
+            self._db.execute(
+                "INSERT OR REPLACE INTO routes (key, tool_name, parameters, last_used, calls) VALUES (?, ?, ?, ?, ?)",
+                (key, result["tool_name"], result["parameters"], time.time(), json.dumps(calls) if calls else None))
+            evicted = []
+            while len(self._entries) > self.max_size:
+                evicted.append((self._entries.popitem(last=False)[0],))
+            if evicted:
+                self._db.executemany("DELETE FROM routes WHERE key = ?", evicted)
+            self._flush_touched()
+            self._db.commit()
+
+    def stats(self) -> Dict:
+        """Hit/miss counters for the cache"""
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+    @staticmethod
+    def _result(tool_name: str, parameters: str, calls: Optional[List[Dict]]) -> Dict:
+        result = {"tool_name": tool_name, "parameters": parameters}
+        if calls:
+            result["calls"] = calls
+        return result
+
+    def close(self):
+        """Write back pending recency updates and close the file"""
+        with self._lock:
+            self._flush_touched()
+            self._db.commit()
+            self._db.close()
+
+    def _flush_touched(self):
+        if self._touched:
+            self._db.executemany("UPDATE routes SET last_used = ? WHERE key = ?",
+                                 [(used, key) for key, used in self._touched.items()])
+            self._touched.clear()
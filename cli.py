@@ -0,0 +1,129 @@
+"""Thin client for the agent daemon (server.py).
+
+Only the standard library is imported up front, so a question costs one
+local HTTP round-trip instead of loading pyodbc, openai and the catalog:
+
+    python cli.py serve &
+    python cli.py ask "What's the structure of the vendors table?"
+    python cli.py tables | schema vendors | profile vendors --mode metadata | metrics
+    python cli.py cancel
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import sys
+from urllib.parse import quote
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection over a Unix domain socket"""
+
+    def __init__(self, path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def request(args, method, path, payload=None):
+    """Send one request to the daemon and return (status, body text)"""
+    if args.socket:
+        connection = UnixHTTPConnection(args.socket, timeout=args.timeout)
+    else:
+        connection = http.client.HTTPConnection(args.host, args.port, timeout=args.timeout)
+    try:
+        body = json.dumps(payload) if payload is not None else None
+        headers = {'Content-Type': 'application/json'} if body else {}
+        connection.request(method, path, body=body, headers=headers)
+        response = connection.getresponse()
+        return response.status, response.read().decode()
+    finally:
+        connection.close()
+
+
+def display(command, data):
+    """Print a daemon response with the same formatting as agent.py"""
+    # The formatters are only needed once a response has arrived
+    from utils import format_table_list, format_table_profile, format_table_schema
+    formatters = {'list_tables': format_table_list, 'get_table_schema': format_table_schema,
+                  'profile_table': format_table_profile}
+    if command == 'health':
+        print(f"Agent daemon is {data['status']}")
+    elif command == 'cancel':
+        print(f"Cancelled {data['cancelled']} running profile(s)")
+    elif command == 'tables':
+        if not format_table_list(data['tables']):
+            print("No tables found or error occurred while fetching tables.")
+    elif command == 'schema':
+        if not format_table_schema(data['schema']):
+            print("Could not retrieve schema for table.")
+    elif command == 'profile':
+        if not format_table_profile(data['profile']):
+            print("Could not profile table.")
+    elif command == 'ask':
+        if not data['answer']:
+            print("Could not determine which operation to perform.")
+            return
+        for operation in data['answer']:
+            formatter = formatters.get(operation['tool_name'])
+            if formatter:
+                formatter(operation['result'])
+            else:
+                print(f"Unknown operation: {operation['tool_name']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the database agent daemon")
+    parser.add_argument('--host', default=os.getenv('AGENT_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('AGENT_PORT', '8765')))
+    parser.add_argument('--socket', default=os.getenv('AGENT_SOCKET'), help="Unix socket path of the daemon")
+    parser.add_argument('--timeout', type=float, default=600)
+    parser.add_argument('--json', action='store_true', help="print the raw JSON response")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('serve', help="run the daemon in the foreground")
+    commands.add_parser('ask', help="answer a question").add_argument('question')
+    commands.add_parser('tables', help="list tables")
+    commands.add_parser('schema', help="show a table's schema").add_argument('table')
+    profile = commands.add_parser('profile', help="profile a table")
+    profile.add_argument('table')
+    profile.add_argument('--mode')
+    commands.add_parser('metrics', help="show the daemon's Prometheus metrics")
+    commands.add_parser('health', help="check that the daemon is running")
+    commands.add_parser('cancel', help="cancel the daemon's running profiles")
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        # The heavy imports happen only in the daemon process
+        from server import serve
+        return serve(args.host, args.port, args.socket)
+
+    if args.command == 'ask':
+        method, path, payload = 'POST', '/ask', {'question': args.question}
+    elif args.command == 'cancel':
+        method, path, payload = 'POST', '/cancel', {}
+    elif args.command in ('schema', 'profile'):
+        method, path, payload = 'GET', f"/{args.command}/{quote(args.table, safe='')}", None
+        if args.command == 'profile' and args.mode:
+            path += f"?mode={quote(args.mode)}"
+    else:
+        method, path, payload = 'GET', f"/{args.command}", None
+
+    try:
+        status, text = request(args, method, path, payload)
+    except OSError as e:
+        print(f"Could not reach the agent daemon: {str(e)}. Start it with 'python cli.py serve'.")
+        return 2
+    if args.json or args.command == 'metrics' or status != 200:
+        print(text)
+        return 0 if status == 200 else 1
+    display(args.command, json.loads(text))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,28 @@
 import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
 from dotenv import load_dotenv
-import pyodbc
 from collections import defaultdict
+from cache import CatalogCache, CatalogState
+from governor import PRESSURE_WAITS_QUERY, Cancelled, GovernedCursor, QueryGovernor
+from metrics import InstrumentedCursor, metrics
+from pool import ConnectionPool
+from results import Records
+from profiler import STATISTICS_QUERY, TableProfiler, quote_identifier, quote_table_name
+from store import ProfileStore
+
+# Table names bound as parameters per bulk catalog statement
+SNAPSHOT_NAMES_PER_QUERY = 1000
 
 class DatabaseConnection:
-    def __init__(self):
+    def __init__(self, connect=None, driver_error=None):
+        """Connect to SQL Server through pyodbc, or through another DB-API backend.
+
+        connect is a zero-argument connection factory and driver_error the
+        exception class its driver raises; both default to pyodbc, which is
+        only imported when it is used.
+        """
         # Load environment variables
         load_dotenv()
         
@@ -23,90 +41,268 @@ class DatabaseConnection:
             f'TrustServerCertificate=yes;'
         )
         
-        self.connection = None
+        # Profiling configuration: 'auto' samples tables larger than the exact row limit
+        self.profile_mode = os.getenv('PROFILE_MODE', 'auto')
+        self.profile_time_budget = int(os.getenv('PROFILE_TIME_BUDGET', '0'))
+        self.profile_workers = int(os.getenv('PROFILE_WORKERS', '4'))
+        # Rows fetched per round-trip by the streaming iter_* methods
+        self.fetch_batch_size = int(os.getenv('FETCH_BATCH_SIZE', '500'))
+        # Optional client-side quantiles, histograms and top values; 0 sketch rows reads whole tables
+        self.profile_distributions = os.getenv('PROFILE_DISTRIBUTIONS', 'no').lower() in ('1', 'yes', 'true')
+        self.sketch_rows = int(os.getenv('PROFILE_SKETCH_ROWS', '100000'))
+        
+        # Connections are shared through a bounded pool so concurrent callers
+        # reuse logged-in sessions instead of opening one per request
+        if connect is None:
+            import pyodbc
+            connect, driver_error = lambda: pyodbc.connect(self.connection_string), pyodbc.Error
+        self.driver_error = driver_error or Exception
+        self.pool = ConnectionPool(
+            connect,
+            max_size=int(os.getenv('DB_POOL_SIZE', '5')),
+            timeout=float(os.getenv('DB_POOL_TIMEOUT', '30')),
+            max_lifetime=float(os.getenv('DB_POOL_MAX_LIFETIME', '1800')),
+            health_check_interval=float(os.getenv('DB_POOL_HEALTH_CHECK_INTERVAL', '60'))
+        )
+        # Table list and schemas are served from memory until the catalog changes
+        self.catalog_cache = CatalogCache(
+            self._fetch_catalog_state,
+            ttl=float(os.getenv('CATALOG_CACHE_TTL', '60')),
+            max_size=int(os.getenv('CATALOG_CACHE_SIZE', '1024'))
+        )
+        self.profiler = TableProfiler(
+            exact_row_limit=int(os.getenv('PROFILE_EXACT_ROW_LIMIT', '5000000')),
+            sample_rows=int(os.getenv('PROFILE_SAMPLE_ROWS', '100000')),
+            distinct_method=os.getenv('PROFILE_DISTINCT_METHOD', 'sample')
+        )
+        # Profiles are kept between runs so 'incremental' mode only rescans what changed
+        store_path = os.getenv('PROFILE_STORE_PATH', '.profile_store.sqlite')
+        self.profile_store = ProfileStore(store_path) if store_path else None
+        # Local columnar copies that 'snapshot' mode profiles instead of the live table
+        self.snapshot_dir = os.getenv('SNAPSHOT_DIR', '.snapshots')
+        self.snapshot_max_age = float(os.getenv('SNAPSHOT_MAX_AGE', '86400'))
+        self.snapshot_batch_size = int(os.getenv('SNAPSHOT_BATCH_SIZE', '50000'))
+        self._snapshots = None
+        # Profiling scans get timeouts, cancellation and load-based backoff
+        self.governor = QueryGovernor(
+            query_timeout=float(os.getenv('PROFILE_QUERY_TIMEOUT', str(self.profile_time_budget))),
+            job_budget=float(os.getenv('PROFILE_JOB_BUDGET', '0')),
+            isolation=os.getenv('PROFILE_ISOLATION', 'read_uncommitted'),
+            max_concurrency=int(os.getenv('PROFILE_MAX_CONCURRENCY', str(self.profile_workers))),
+            wait_threshold=float(os.getenv('PROFILE_WAIT_THRESHOLD_MS', '1000')),
+            latency_factor=float(os.getenv('PROFILE_LATENCY_FACTOR', '4')),
+            check_interval=float(os.getenv('PROFILE_LOAD_CHECK_INTERVAL', '15'))
+        )
 
     def connect(self):
-        """Establish connection to the database"""
+        """Make sure the pool can hand out a database connection"""
         try:
-            self.connection = pyodbc.connect(self.connection_string)
-            return True
+            self.pool.reopen()
+            with self.pool.connection():
+                return True
         except Exception as e:
             print(f"Error connecting to database: {str(e)}")
             return False
 
     def disconnect(self):
-        """Close the database connection"""
-        if self.connection:
-            self.connection.close()
-            self.connection = None
+        """Close all pooled database connections"""
+        self.pool.close()
 
     def test_connection(self):
         """Test the database connection"""
+        # The checked connection stays in the pool for the requests that follow
         if self.connect():
             print("Successfully connected to the database!")
-            self.disconnect()
             return True
         return False
 
+    @contextmanager
+    def cursor(self):
+        """Check out a pooled connection and yield a cursor on it"""
+        with self.connection() as (connection, wait):
+            cursor = self._instrument(connection.cursor(), wait)
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+
+    @contextmanager
+    def connection(self):
+        """Check out a pooled connection, yielding it with the seconds spent waiting for it"""
+        started = time.perf_counter()
+        with self.pool.connection() as connection:
+            wait = time.perf_counter() - started
+            metrics.observe('db.connection_wait', wait)
+            yield connection, wait
+
+    @contextmanager
+    def scan_cursor(self):
+        """Check out a cursor for a profiling scan, governed by self.governor.
+
+        Statements run at the governor's isolation level under its timeouts
+        and can be cancelled with cancel_profiles().
+        """
+        self.governor.check_load(self._fetch_pressure_waits)
+        with self.connection() as (connection, wait):
+            isolation = self.governor.isolation_statement()
+            if isolation:
+                # Snapshot reads fail at the first statement unless ALLOW_SNAPSHOT_ISOLATION is on
+                setup = self._instrument(connection.cursor(), wait)
+                try:
+                    setup.execute(isolation)
+                finally:
+                    setup.close()
+                wait = 0.0
+            waits = [wait]
+            cursor = GovernedCursor(lambda: self._instrument(connection.cursor(), waits.pop() if waits else 0.0),
+                                    connection, self.governor)
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+                connection.timeout = 0
+                if isolation:
+                    # Pooled connections go back at the default level
+                    reset = connection.cursor()
+                    try:
+                        reset.execute("SET TRANSACTION ISOLATION LEVEL READ COMMITTED")
+                    finally:
+                        reset.close()
+
+    def _fetch_pressure_waits(self):
+        """Total milliseconds the server has spent in I/O, lock, memory and CPU waits, or None"""
+        try:
+            with self.cursor() as cursor:
+                cursor.execute(PRESSURE_WAITS_QUERY)
+                return cursor.fetchone()[0] or 0
+        except Exception as e:
+            print(f"Server wait statistics unavailable ({str(e)}), watching scan latency only")
+            return None
+
+    def cancel_profiles(self):
+        """Cancel every running and queued profiling job, returning how many were running"""
+        return self.governor.cancel_all()
+
+    def _instrument(self, cursor, wait):
+        """Wrap a cursor so its statements are timed, unless metrics are off"""
+        return InstrumentedCursor(cursor, metrics, wait) if metrics.enabled else cursor
+
     def list_tables(self):
         """List all tables in the current database"""
-        if not self.connection:
-            if not self.connect():
-                return []
+        try:
+            return self.catalog_cache.get_tables(self._fetch_tables)
+        except Exception as e:
+            print(f"Error listing tables: {str(e)}")
+            return []
 
+    def iter_tables(self, batch_size=None):
+        """Yield table dicts as the catalog query returns them.
+
+        Rows are fetched batch_size (default FETCH_BATCH_SIZE) at a time and
+        the connection is held until the iterator is exhausted or closed. A
+        table list already in the catalog cache is served from there.
+        """
         try:
-            cursor = self.connection.cursor()
-            # Query to get all user tables
+            if self.catalog_cache.has_tables():
+                yield from self.list_tables()
+                return
+            yield from self._stream_tables(batch_size)
+        except Exception as e:
+            print(f"Error listing tables: {str(e)}")
+
+    def _fetch_tables(self):
+        """Run the catalog query behind list_tables"""
+        return Records.from_dicts(self._stream_tables())
+
+    def _stream_tables(self, batch_size=None):
+        """Stream the catalog query behind list_tables"""
+        with self.cursor() as cursor:
+            # Query to get all user tables. Row counts are summed once per table
+            # from the heap or clustered index partitions, so tables with several
+            # indexes or partitions appear exactly once.
             query = """
             SELECT 
                 t.name AS TableName,
                 s.name AS SchemaName,
-                p.rows AS RowCounts
+                ISNULL(p.RowCounts, 0) AS RowCounts
             FROM 
                 sys.tables t
-            INNER JOIN      
-                sys.indexes i ON t.object_id = i.object_id
-            INNER JOIN 
-                sys.partitions p ON i.object_id = p.object_id AND i.index_id = p.index_id
             INNER JOIN 
                 sys.schemas s ON t.schema_id = s.schema_id
+            LEFT JOIN 
+                (SELECT object_id, SUM(rows) AS RowCounts
+                 FROM sys.partitions
+                 WHERE index_id IN (0, 1)
+                 GROUP BY object_id) p ON t.object_id = p.object_id
             WHERE 
                 t.is_ms_shipped = 0
-            GROUP BY 
-                t.name, s.name, p.rows
             ORDER BY 
                 t.name;
             """
-            
+
             cursor.execute(query)
-            tables = cursor.fetchall()
-            
-            # Format the results
-            table_list = []
-            for table in tables:
-                table_info = {
-                    'name': table.TableName,
-                    'schema': table.SchemaName,
-                    'row_count': table.RowCounts
-                }
-                table_list.append(table_info)
-            
-            return table_list
-            
-        except Exception as e:
-            print(f"Error listing tables: {str(e)}")
-            return []
-        finally:
-            cursor.close()
+            while True:
+                tables = cursor.fetchmany(batch_size or self.fetch_batch_size)
+                if not tables:
+                    break
+
+                # Format the results
+                for table in tables:
+                    yield {
+                        'name': table.TableName,
+                        'schema': table.SchemaName,
+                        'row_count': table.RowCounts
+                    }
 
     def get_table_schema(self, table_name):
         """Get the schema information for a specific table"""
-        if not self.connection:
-            if not self.connect():
-                return None
+        try:
+            return self.catalog_cache.get_schema(
+                table_name, lambda: self._fetch_table_schema(table_name), self._fetch_modify_date)
+        except Exception as e:
+            print(f"Error getting table schema: {str(e)}")
+            return None
 
+    def iter_table_schema(self, table_name, batch_size=None):
+        """Yield a table's column dicts as the column query returns them.
+
+        A schema already in the catalog cache is served from there; otherwise
+        rows are fetched batch_size (default FETCH_BATCH_SIZE) at a time and
+        the complete schema is cached for later lookups.
+        """
         try:
-            cursor = self.connection.cursor()
+            if self.catalog_cache.has_schema(table_name):
+                schema = self.get_table_schema(table_name)
+                yield from schema['columns'] if schema else []
+                return
+            columns = []
+            modify_date = None
+            for column, modify_date in self._stream_table_schema(table_name, batch_size):
+                columns.append(column)
+                yield column
+            if columns:
+                self._put_schema({'table_name': table_name, 'columns': columns}, modify_date)
+            else:
+                print(f"Table '{table_name}' not found or no columns available.")
+        except Exception as e:
+            print(f"Error getting table schema: {str(e)}")
+
+    def _fetch_table_schema(self, table_name):
+        """Run the column query behind get_table_schema, returning (schema, modify_date)"""
+        columns = []
+        modify_date = None
+        for column, modify_date in self._stream_table_schema(table_name):
+            columns.append(column)
+
+        if not columns:
+            print(f"Table '{table_name}' not found or no columns available.")
+            return None, None
+
+        return {'table_name': table_name, 'columns': Records.from_dicts(columns)}, modify_date
+
+    def _stream_table_schema(self, table_name, batch_size=None):
+        """Stream the column query behind get_table_schema as (column, modify_date) pairs"""
+        with self.cursor() as cursor:
             # Query to get column information
             query = """
             SELECT 
@@ -119,9 +315,12 @@ class DatabaseConnection:
                 CASE WHEN pk.column_id IS NOT NULL THEN 1 ELSE 0 END AS IsPrimaryKey,
                 CASE WHEN fk.parent_column_id IS NOT NULL THEN 1 ELSE 0 END AS IsForeignKey,
                 CASE WHEN c.is_identity = 1 THEN 1 ELSE 0 END AS IsIdentity,
-                c.column_id AS ColumnOrder
+                c.column_id AS ColumnOrder,
+                o.modify_date AS ModifyDate
             FROM 
                 sys.columns c
+            INNER JOIN 
+                sys.objects o ON c.object_id = o.object_id
             INNER JOIN 
                 sys.types t ON c.user_type_id = t.user_type_id
             LEFT JOIN 
@@ -137,150 +336,684 @@ class DatabaseConnection:
             ORDER BY 
                 c.column_id;
             """
-            
+
             cursor.execute(query, (table_name,))
-            columns = cursor.fetchall()
-            
-            if not columns:
-                print(f"Table '{table_name}' not found or no columns available.")
-                return None
-            
-            # Format the results
-            schema_info = {
-                'table_name': table_name,
-                'columns': []
-            }
-            
-            for col in columns:
-                column_info = {
-                    'name': col.ColumnName,
-                    'data_type': col.DataType,
-                    'max_length': col.MaxLength,
-                    'precision': col.Precision,
-                    'scale': col.Scale,
-                    'is_nullable': bool(col.IsNullable),
-                    'is_primary_key': bool(col.IsPrimaryKey),
-                    'is_foreign_key': bool(col.IsForeignKey),
-                    'is_identity': bool(col.IsIdentity),
-                    'column_order': col.ColumnOrder
-                }
-                schema_info['columns'].append(column_info)
-            
-            return schema_info
-            
+            while True:
+                columns = cursor.fetchmany(batch_size or self.fetch_batch_size)
+                if not columns:
+                    break
+                for col in columns:
+                    yield self._column_info(col), col.ModifyDate
+
+    def _column_info(self, col):
+        """Turn one row of a column query into a schema column dict"""
+        return {
+            'name': col.ColumnName,
+            'data_type': col.DataType,
+            'max_length': col.MaxLength,
+            'precision': col.Precision,
+            'scale': col.Scale,
+            'is_nullable': bool(col.IsNullable),
+            'is_primary_key': bool(col.IsPrimaryKey),
+            'is_foreign_key': bool(col.IsForeignKey),
+            'is_identity': bool(col.IsIdentity),
+            'column_order': col.ColumnOrder
+        }
+
+    def get_catalog_snapshot(self, table_names=None, batch_size=1000):
+        """Get the table list and schemas of many tables in one round-trip.
+
+        Returns {'tables': [...], 'schemas': {name: schema}} where both use the
+        same dicts as list_tables and get_table_schema. Without table_names every
+        user table is included and keyed by 'schema.table'; otherwise schemas are
+        keyed by the names as given. Results also warm the catalog cache.
+        """
+        try:
+            snapshot = {'tables': [], 'schemas': {}}
+            # Checked before the bulk query holds a pooled connection
+            state = self.catalog_cache.catalog_state()
+            if table_names is None:
+                self._fetch_snapshot(None, snapshot, batch_size, state)
+                snapshot['tables'].sort(key=lambda table: table['name'])
+                self.catalog_cache.put_tables(Records.from_dicts(snapshot['tables']))
+            else:
+                # Stay well under SQL Server's 2100 parameter limit per statement
+                names = list(dict.fromkeys(table_names))
+                for start in range(0, len(names), SNAPSHOT_NAMES_PER_QUERY):
+                    self._fetch_snapshot(names[start:start + SNAPSHOT_NAMES_PER_QUERY], snapshot, batch_size, state)
+            snapshot['tables'] = Records.from_dicts(snapshot['tables'])
+            return snapshot
         except Exception as e:
-            print(f"Error getting table schema: {str(e)}")
+            print(f"Error getting catalog snapshot: {str(e)}")
+            return None
+
+    def _fetch_snapshot(self, table_names, snapshot, batch_size, state):
+        """Stream the bulk column query and group its rows by table"""
+        if table_names is None:
+            source = """
+                sys.tables tb
+            INNER JOIN 
+                sys.schemas s ON tb.schema_id = s.schema_id"""
+            requested_name = "s.name + '.' + tb.name"
+            params = ()
+        else:
+            values = ", ".join("(?)" for _ in table_names)
+            source = f"""
+                (VALUES {values}) AS r(RequestedName)
+            INNER JOIN 
+                sys.tables tb ON tb.object_id = OBJECT_ID(r.RequestedName)
+            INNER JOIN 
+                sys.schemas s ON tb.schema_id = s.schema_id"""
+            requested_name = "r.RequestedName"
+            params = tuple(table_names)
+
+        query = f"""
+            SELECT 
+                {requested_name} AS RequestedName,
+                tb.name AS TableName,
+                s.name AS SchemaName,
+                tb.modify_date AS ModifyDate,
+                ISNULL(p.RowCounts, 0) AS RowCounts,
+                c.name AS ColumnName,
+                t.name AS DataType,
+                c.max_length AS MaxLength,
+                c.precision AS Precision,
+                c.scale AS Scale,
+                c.is_nullable AS IsNullable,
+                CASE WHEN pk.column_id IS NOT NULL THEN 1 ELSE 0 END AS IsPrimaryKey,
+                CASE WHEN EXISTS (SELECT 1 FROM sys.foreign_key_columns fk
+                                  WHERE fk.parent_object_id = c.object_id
+                                    AND fk.parent_column_id = c.column_id) THEN 1 ELSE 0 END AS IsForeignKey,
+                CASE WHEN c.is_identity = 1 THEN 1 ELSE 0 END AS IsIdentity,
+                c.column_id AS ColumnOrder
+            FROM {source}
+            INNER JOIN 
+                sys.columns c ON c.object_id = tb.object_id
+            INNER JOIN 
+                sys.types t ON c.user_type_id = t.user_type_id
+            LEFT JOIN 
+                (SELECT object_id, SUM(rows) AS RowCounts
+                 FROM sys.partitions
+                 WHERE index_id IN (0, 1)
+                 GROUP BY object_id) p ON tb.object_id = p.object_id
+            LEFT JOIN 
+                (SELECT ic.column_id, ic.object_id
+                 FROM sys.index_columns ic
+                 INNER JOIN sys.indexes i ON ic.object_id = i.object_id AND ic.index_id = i.index_id
+                 WHERE i.is_primary_key = 1) pk 
+                ON c.object_id = pk.object_id AND c.column_id = pk.column_id
+            WHERE 
+                tb.is_ms_shipped = 0
+            ORDER BY 
+                RequestedName, c.column_id;
+            """
+
+        with self.cursor() as cursor:
+            cursor.execute(query, params)
+            current = None
+            modify_date = None
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    if current is None or row.RequestedName != current['table_name']:
+                        if current is not None:
+                            self._put_schema(current, modify_date, state)
+                        current = {'table_name': row.RequestedName, 'columns': []}
+                        modify_date = row.ModifyDate
+                        snapshot['schemas'][row.RequestedName] = current
+                        snapshot['tables'].append({
+                            'name': row.TableName,
+                            'schema': row.SchemaName,
+                            'row_count': row.RowCounts
+                        })
+                    current['columns'].append(self._column_info(row))
+            if current is not None:
+                self._put_schema(current, modify_date, state)
+
+    def _put_schema(self, schema, modify_date, state=None):
+        """Compact a schema assembled from snapshot rows and cache it"""
+        schema['columns'] = Records.from_dicts(schema['columns'])
+        self.catalog_cache.put_schema(schema['table_name'], schema, modify_date, state)
+
+    def _fetch_catalog_state(self):
+        """Summarize sys.tables so cached catalog data can be revalidated cheaply"""
+        with self.cursor() as cursor:
+            cursor.execute("""
+            SELECT
+                COUNT(*) AS TableCount,
+                MAX(t.modify_date) AS LastModified,
+                (SELECT SUM(p.rows)
+                 FROM sys.partitions p
+                 INNER JOIN sys.tables pt ON p.object_id = pt.object_id
+                 WHERE p.index_id IN (0, 1) AND pt.is_ms_shipped = 0) AS TotalRows
+            FROM sys.tables t
+            WHERE t.is_ms_shipped = 0;
+            """)
+            row = cursor.fetchone()
+            return CatalogState(row.TableCount, row.LastModified, row.TotalRows)
+
+    def _fetch_modify_date(self, table_name):
+        """Get the last DDL change time of a single table"""
+        with self.cursor() as cursor:
+            cursor.execute("SELECT modify_date FROM sys.objects WHERE object_id = OBJECT_ID(?)", (table_name,))
+            row = cursor.fetchone()
+            return row[0] if row else None
+
+    def get_row_count(self, table_name):
+        """Get a table's row count from partition metadata without scanning it"""
+        try:
+            with self.cursor() as cursor:
+                cursor.execute("""
+                SELECT SUM(p.rows)
+                FROM sys.partitions p
+                WHERE p.object_id = OBJECT_ID(?) AND p.index_id IN (0, 1);
+                """, (table_name,))
+                return cursor.fetchone()[0]
+        except Exception as e:
+            print(f"Error getting row count: {str(e)}")
+            return None
+
+    def profile_table(self, table_name, mode=None, row_count=None):
+        """Profile a table with various data quality metrics.
+
+        mode is 'exact', 'approximate', 'partitioned', 'incremental', 'metadata',
+        'snapshot' or 'auto' (default from PROFILE_MODE). row_count is the catalog row count from
+        list_tables, looked up if not given.
+        """
+        with metrics.span('profile') as span:
+            span['table'] = table_name
+            try:
+                with self.governor.job(table_name):
+                    profile = self._profile_table(table_name, mode, row_count)
+                    if profile and self.profile_distributions:
+                        self.add_distributions(profile)
+            except Cancelled as e:
+                # Raised while waiting for a slot; cancelled scans are reported by _profile_table
+                print(f"Error profiling table: {str(e)}")
+                profile = None
+            if profile:
+                # One column per field instead of one dict per profiled column
+                profile['columns'] = Records.from_dicts(profile['columns'])
+                span.update(mode=profile.get('mode'), columns=len(profile['columns']), rows=profile['total_rows'])
+            else:
+                metrics.inc('errors', stage='profile', error='failed')
+        return profile
+
+    def _profile_table(self, table_name, mode=None, row_count=None):
+        """Build a profile in the given mode, without distribution sketches"""
+        mode = mode or self.profile_mode
+        if mode == 'partitioned':
+            return self.profile_table_partitioned(table_name)
+        if mode == 'incremental':
+            return self.refresh_profile(table_name, row_count)
+        if mode == 'metadata':
+            return self.profile_from_statistics(table_name, row_count)
+        if mode == 'snapshot':
+            return self.profile_from_snapshot(table_name)
+        try:
+            try:
+                return _collect_profile(self._scan_profile(table_name, mode, row_count))
+            except self.driver_error as e:
+                # An exact scan that overruns the time budget is retried from a sample
+                if mode != 'auto' or e.args[0] != 'HYT00':
+                    raise
+                print(f"Exact profile of '{table_name}' exceeded {self.governor.query_timeout:g}s, sampling instead")
+                return _collect_profile(self._scan_profile(table_name, 'approximate', row_count))
+
+        except Exception as e:
+            print(f"Error profiling table: {str(e)}")
             return None
+
+    def iter_profile(self, table_name, mode=None, row_count=None):
+        """Yield a table's profile dict (with an empty column list), then each column profile.
+
+        Scanning modes yield each column as soon as the statement covering it
+        completes, so utils.stream_table_profile can show the first columns of
+        a wide table early. Other modes are computed whole and then yielded the
+        same way. An 'auto' scan that overruns the time budget before yielding
+        anything switches to a sample.
+        """
+        mode = mode or self.profile_mode
+        if mode in ('partitioned', 'incremental', 'metadata', 'snapshot'):
+            profile = self.profile_table(table_name, mode, row_count)
+            if profile:
+                yield dict(profile, columns=[])
+                yield from profile['columns']
+            return
+
+        started = False
+        job = self.governor.create_job(table_name)
+        try:
+            try:
+                for item in self._governed(job, self._scan_profile(table_name, mode, row_count)):
+                    started = True
+                    yield item
+            except self.driver_error as e:
+                if started or mode != 'auto' or e.args[0] != 'HYT00':
+                    raise
+                print(f"Exact profile of '{table_name}' exceeded {self.governor.query_timeout:g}s, sampling instead")
+                yield from self._governed(job, self._scan_profile(table_name, 'approximate', row_count))
+        except Exception as e:
+            print(f"Error profiling table: {str(e)}")
+
+    def _governed(self, job, items):
+        """Advance a profile iterator one item at a time inside a governor job.
+
+        The job is left before each item is yielded, so the consumer's own
+        queries do not join it and an abandoned iterator holds no slot.
+        """
+        try:
+            while True:
+                with self.governor.job(resume=job):
+                    item = next(items, None)
+                if item is None:
+                    return
+                yield item
         finally:
-            cursor.close()
+            items.close()
+
+    def _scan_profile(self, table_name, mode, row_count):
+        """Stream an exact or sampled profile from the aggregate statements, raising on errors"""
+        # Catalog lookups run on their own checkouts before the scan takes a
+        # connection, so a profile never holds two pooled connections at once
+        schema = self.get_table_schema(table_name)
+        if not schema:
+            return
+
+        if row_count is None and mode in ('auto', 'approximate'):
+            row_count = self.get_row_count(table_name)
+        if mode == 'auto' and self.governor.prefer_sampling() and (row_count or 0) > self.profiler.sample_rows:
+            print(f"Server under pressure, sampling '{table_name}' instead of scanning it")
+            mode = 'approximate'
+
+        scanned = row_count
+        if row_count and self.profiler.choose_mode(row_count, mode) == 'approximate':
+            scanned = min(row_count, self.profiler.sample_rows)
+        started = time.perf_counter()
+        with self.scan_cursor() as cursor:
+            # All per-column aggregates are computed in one (or a few) wide scans
+            yield from self.profiler.iter_profile(cursor, table_name, schema['columns'], row_count, mode)
+        # Scan time per cell read tells the governor when the server slows down
+        self.governor.observe(time.perf_counter() - started, (scanned or 0) * len(schema['columns']))
+
 
-    def profile_table(self, table_name):
-        """Profile a table with various data quality metrics"""
-        if not self.connection:
-            if not self.connect():
+    def profile_from_statistics(self, table_name, row_count=None):
+        """Estimate a table's profile from its statistics objects without reading its rows.
+
+        Falls back to a sampled profile when the server cannot return histograms.
+        """
+        try:
+            schema = self.get_table_schema(table_name)
+            if not schema:
                 return None
+            if row_count is None:
+                row_count = self.get_row_count(table_name)
+            with self.cursor() as cursor:
+                cursor.execute(STATISTICS_QUERY, (table_name,))
+                rows = cursor.fetchall()
+        except self.driver_error as e:
+            print(f"Statistics for '{table_name}' unavailable ({str(e)}), sampling instead")
+            return self._profile_table(table_name, mode='approximate', row_count=row_count)
+        except Exception as e:
+            print(f"Error profiling table: {str(e)}")
+            return None
+        return self.profiler.metadata_profile(table_name, schema['columns'], rows, row_count)
 
+    def profile_table_partitioned(self, table_name, partitions=None):
+        """Profile one table by scanning primary-key ranges on separate connections in parallel"""
         try:
-            cursor = self.connection.cursor()
             schema = self.get_table_schema(table_name)
             if not schema:
                 return None
 
-            profile_data = {
-                'table_name': table_name,
-                'total_rows': 0,
-                'columns': []
-            }
-
-            # Get total row count
-            cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-            profile_data['total_rows'] = cursor.fetchone()[0]
-
-            # Profile each column
-            for column in schema['columns']:
-                col_name = column['name']
-                col_type = column['data_type']
-                
-                # Initialize column profile
-                col_profile = {
-                    'name': col_name,
-                    'data_type': col_type,
-                    'null_count': 0,
-                    'null_percentage': 0,
-                    'unique_count': 0,
-                    'unique_percentage': 0,
-                    'min_value': None,
-                    'max_value': None,
-                    'avg_value': None,
-                    'distinct_values': 0
-                }
-
-                # Get null count and percentage
-                cursor.execute(f"""
-                    SELECT 
-                        COUNT(*) as null_count,
-                        COUNT(DISTINCT {col_name}) as distinct_count
-                    FROM {table_name}
-                    WHERE {col_name} IS NULL
-                """)
-                null_stats = cursor.fetchone()
-                col_profile['null_count'] = null_stats.null_count
-                col_profile['null_percentage'] = (null_stats.null_count / profile_data['total_rows']) * 100 if profile_data['total_rows'] > 0 else 0
-                col_profile['distinct_values'] = null_stats.distinct_count
-
-                # Get unique count and percentage
-                cursor.execute(f"""
-                    SELECT COUNT(DISTINCT {col_name}) as unique_count
-                    FROM {table_name}
-                """)
-                unique_count = cursor.fetchone().unique_count
-                col_profile['unique_count'] = unique_count
-                col_profile['unique_percentage'] = (unique_count / profile_data['total_rows']) * 100 if profile_data['total_rows'] > 0 else 0
-
-                # Get min, max, and avg for numeric columns
-                if col_type in ('int', 'bigint', 'decimal', 'numeric', 'float', 'real', 'money', 'smallmoney'):
-                    cursor.execute(f"""
-                        SELECT 
-                            MIN({col_name}) as min_val,
-                            MAX({col_name}) as max_val,
-                            AVG(CAST({col_name} as float)) as avg_val
-                        FROM {table_name}
-                    """)
-                    numeric_stats = cursor.fetchone()
-                    col_profile['min_value'] = numeric_stats.min_val
-                    col_profile['max_value'] = numeric_stats.max_val
-                    col_profile['avg_value'] = numeric_stats.avg_val
-
-                # Get min and max for string columns
-                elif col_type in ('varchar', 'nvarchar', 'char', 'nchar', 'text', 'ntext'):
-                    cursor.execute(f"""
-                        SELECT 
-                            MIN({col_name}) as min_val,
-                            MAX({col_name}) as max_val
-                        FROM {table_name}
-                    """)
-                    string_stats = cursor.fetchone()
-                    col_profile['min_value'] = string_stats.min_val
-                    col_profile['max_value'] = string_stats.max_val
-
-                # Get min and max for date columns
-                elif col_type in ('datetime', 'date', 'datetime2', 'datetimeoffset', 'smalldatetime'):
-                    cursor.execute(f"""
-                        SELECT 
-                            MIN({col_name}) as min_val,
-                            MAX({col_name}) as max_val
-                        FROM {table_name}
-                    """)
-                    date_stats = cursor.fetchone()
-                    col_profile['min_value'] = date_stats.min_val
-                    col_profile['max_value'] = date_stats.max_val
-
-                profile_data['columns'].append(col_profile)
-
-            return profile_data
+            columns = schema['columns']
+            key_index = self.profiler.range_key(columns)
+            if key_index is None:
+                print(f"Table '{table_name}' has no single-column integer or date primary key, "
+                      f"profiling it in one scan")
+                return self._profile_table(table_name, mode='exact')
+
+            # MIN/MAX of the primary key are answered from the ends of its index
+            key = quote_identifier(columns[key_index]['name'])
+            with self.cursor() as cursor:
+                cursor.execute(f"SELECT MIN({key}), MAX({key}) FROM {quote_table_name(table_name)}")
+                low, high = cursor.fetchone()
+
+            ranges = self.profiler.split_range(low, high, partitions or self.profile_workers)
+            if not ranges:
+                return self._profile_table(table_name, mode='exact')
+
+            def profile_range(key_range):
+                with self.scan_cursor() as cursor:
+                    return self.profiler.profile_range(cursor, table_name, columns, key_index, key_range)
+
+            workers = min(len(ranges), self.pool.max_size)
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='range') as executor:
+                partials = list(executor.map(self.governor.bind(profile_range), ranges))
+            return self.profiler.merge_ranges(table_name, columns, partials)
 
         except Exception as e:
             print(f"Error profiling table: {str(e)}")
             return None
-        finally:
-            cursor.close() 
\ No newline at end of file
+
+    def snapshot_store(self):
+        """Get the snapshot store, created on first use since only snapshot mode needs pyarrow"""
+        if self._snapshots is None:
+            from snapshot import SnapshotStore
+            self._snapshots = SnapshotStore(self.snapshot_dir, batch_size=self.snapshot_batch_size)
+        return self._snapshots
+
+    def snapshot_table(self, table_name):
+        """Export a table to its local columnar snapshot, returning the number of rows written"""
+        try:
+            schema = self.get_table_schema(table_name)
+            if not schema:
+                return None
+            with self.scan_cursor() as cursor:
+                path, rows = self.snapshot_store().export(cursor, table_name, schema['columns'])
+            return rows
+        except Exception as e:
+            print(f"Error exporting snapshot: {str(e)}")
+            return None
+
+    def profile_from_snapshot(self, table_name, refresh=False):
+        """Profile a table from its local snapshot instead of querying the server.
+
+        The table is exported first when it has no snapshot, the snapshot is
+        older than SNAPSHOT_MAX_AGE seconds or lacks a current column, or
+        refresh is set; otherwise the profile touches only local disk.
+        """
+        try:
+            schema = self.get_table_schema(table_name)
+            if not schema:
+                return None
+            columns = schema['columns']
+            store = self.snapshot_store()
+            opened = None if refresh else store.open(table_name)
+            if opened is not None:
+                table, metadata = opened
+                expired = time.time() - metadata.get('exported_at', 0) > self.snapshot_max_age
+                if expired or any(column['name'] not in table.column_names for column in columns):
+                    opened = None
+            if opened is None:
+                with self.scan_cursor() as cursor:
+                    store.export(cursor, table_name, columns)
+                opened = store.open(table_name)
+            table, metadata = opened
+            return store.profile(self.profiler, table, table_name, columns, metadata)
+        except Exception as e:
+            print(f"Error profiling table: {str(e)}")
+            return None
+
+    def sketch_table(self, table_name, sample_rows=None, batch_size=None):
+        """Stream a table's rows once into mergeable per-column distribution sketches.
+
+        Reads a sample of sample_rows rows when given, otherwise the whole
+        table; whole-table scans of tables with an integer or date primary key
+        are split into key ranges sketched on parallel connections and merged.
+        Returns {column name: ColumnSketch}, or None on error.
+        """
+        try:
+            schema = self.get_table_schema(table_name)
+            if not schema:
+                return None
+            columns = schema['columns']
+            indexes = self.profiler.distribution_columns(columns)
+            if not indexes:
+                return {}
+            batch_size = batch_size or self.fetch_batch_size
+
+            key_index = self.profiler.range_key(columns) if not sample_rows else None
+            ranges = []
+            if key_index is not None and self.profile_workers > 1:
+                key = quote_identifier(columns[key_index]['name'])
+                with self.cursor() as cursor:
+                    cursor.execute(f"SELECT MIN({key}), MAX({key}) FROM {quote_table_name(table_name)}")
+                    low, high = cursor.fetchone()
+                ranges = self.profiler.split_range(low, high, self.profile_workers)
+
+            if not ranges:
+                with self.scan_cursor() as cursor:
+                    cursor.execute(self.profiler.build_scan_query(table_name, columns, indexes, sample_rows))
+                    return self.profiler.sketch_rows(cursor, columns, indexes, batch_size)
+
+            def sketch_range(key_range):
+                lower, upper, is_last = key_range
+                sql = self.profiler.build_scan_query(table_name, columns, indexes, key_index=key_index, is_last=is_last)
+                with self.scan_cursor() as cursor:
+                    cursor.execute(sql, (lower, upper))
+                    return self.profiler.sketch_rows(cursor, columns, indexes, batch_size)
+
+            workers = min(len(ranges), self.pool.max_size)
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='sketch') as executor:
+                partials = list(executor.map(self.governor.bind(sketch_range), ranges))
+            sketches = partials[0]
+            for partial in partials[1:]:
+                for name, sketch in partial.items():
+                    sketches[name].merge(sketch)
+            return sketches
+
+        except Exception as e:
+            print(f"Error sketching table: {str(e)}")
+            return None
+
+    def add_distributions(self, profile):
+        """Attach quantiles, histograms and top values from sketch_table to a profile's columns"""
+        sketches = self.sketch_table(profile['table_name'], sample_rows=self.sketch_rows or None)
+        if not sketches:
+            return profile
+        for column in profile['columns']:
+            sketch = sketches.get(column['name'])
+            if sketch is not None:
+                column['distribution'] = sketch.summary()
+        return profile
+
+    def refresh_profile(self, table_name, row_count=None):
+        """Bring a table's stored profile up to date, recomputing only what changed.
+
+        A table whose modify_date changed is profiled from scratch. Tables with
+        a single-column integer or date primary key are profiled by key range:
+        each stored range is checked by row count (and largest rowversion, if
+        the table has one) and only ranges that differ are rescanned, while
+        rows added past the stored maximum key are profiled on their own and
+        merged into the last range. Other tables are reprofiled when their
+        catalog row count changes. Without a rowversion column, updates that
+        keep row counts unchanged are not detected.
+        """
+        if self.profile_store is None:
+            return self._profile_table(table_name, mode='auto', row_count=row_count)
+        try:
+            schema = self.get_table_schema(table_name)
+            if not schema:
+                return None
+            modify_date = self._fetch_modify_date(table_name)
+            if row_count is None:
+                row_count = self.get_row_count(table_name)
+
+            record = self.profile_store.get(table_name)
+            if record is not None and record['modify_date'] != modify_date:
+                # Columns may have been added, dropped or retyped
+                record = None
+
+            columns = schema['columns']
+            key_index = self.profiler.range_key(columns)
+            if key_index is None:
+                if record is not None and record['row_count'] == row_count:
+                    return _unchanged(record['profile'])
+                profile = self._profile_table(table_name, mode='auto', row_count=row_count)
+                if profile:
+                    self.profile_store.put(table_name, profile, modify_date, row_count)
+                return profile
+            return self._refresh_ranges(table_name, columns, key_index, record, modify_date, row_count)
+
+        except Exception as e:
+            print(f"Error refreshing profile: {str(e)}")
+            return None
+
+    def _refresh_ranges(self, table_name, columns, key_index, record, modify_date, row_count):
+        """Rescan the changed key ranges of a table and merge them with the stored ones"""
+        key = quote_identifier(columns[key_index]['name'])
+        with self.cursor() as cursor:
+            cursor.execute(f"SELECT MIN({key}), MAX({key}) FROM {quote_table_name(table_name)}")
+            low, high = cursor.fetchone()
+        if low is None:
+            profile = self._profile_table(table_name, mode='exact')
+            if profile:
+                self.profile_store.put(table_name, profile, modify_date, row_count)
+            return profile
+
+        stored = record['ranges'] if record else None
+        if stored and low < stored[0]['lower']:
+            # Keys below the first range fall outside every stored range
+            stored = None
+        if stored:
+            bounds = [(r['lower'], r['upper'], r['is_last'], r['lower_exclusive']) for r in stored]
+            previous = list(stored)
+            if high > stored[-1]['upper']:
+                # Rows past the stored maximum key are profiled on their own
+                bounds.append((stored[-1]['upper'], high, True, True))
+                previous.append(None)
+        else:
+            bounds = [(lower, upper, is_last, False)
+                      for lower, upper, is_last in self.profiler.split_range(low, high, self.profile_workers)]
+            previous = [None] * len(bounds)
+
+        # Markers are read before the scans, so changes made while scanning show up next time
+        markers = self._range_markers(table_name, columns, key_index, bounds)
+        changed = [i for i, marker in enumerate(markers)
+                   if previous[i] is None or (previous[i]['row_count'], previous[i]['version']) != marker]
+        if not changed and record is not None:
+            return _unchanged(record['profile'])
+
+        def profile_range(index):
+            lower, upper, is_last, lower_exclusive = bounds[index]
+            with self.scan_cursor() as cursor:
+                return self.profiler.profile_range(cursor, table_name, columns, key_index,
+                                                   (lower, upper, is_last), lower_exclusive)
+
+        workers = min(len(changed), self.pool.max_size)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='range') as executor:
+            fresh = dict(zip(changed, executor.map(self.governor.bind(profile_range), changed)))
+
+        ranges = []
+        for index, (lower, upper, is_last, lower_exclusive) in enumerate(bounds):
+            partial = fresh[index] if index in fresh else _load_partial(previous[index]['partial'])
+            ranges.append({'lower': lower, 'upper': upper, 'is_last': is_last, 'lower_exclusive': lower_exclusive,
+                           'row_count': markers[index][0], 'version': markers[index][1], 'partial': partial})
+        if stored and len(ranges) > len(stored):
+            # Fold the new rows into the last range so daily appends do not add a range each
+            tail = ranges.pop()
+            last = ranges[-1]
+            last['partial'] = self.profiler.merge_partials(columns, [last['partial'], tail['partial']])
+            last['upper'] = tail['upper']
+            last['row_count'] += tail['row_count']
+            versions = [version for version in (last['version'], tail['version']) if version is not None]
+            last['version'] = max(versions) if versions else None
+
+        profile = self.profiler.merge_ranges(table_name, columns, [r['partial'] for r in ranges])
+        profile['refreshed_partitions'] = len(changed)
+        for r in ranges:
+            r['partial'] = _dump_partial(r['partial'])
+        self.profile_store.put(table_name, profile, modify_date, row_count, ranges)
+        return profile
+
+    def _range_markers(self, table_name, columns, key_index, bounds):
+        """Get (row count, largest rowversion) for each key range in one statement"""
+        version_index = self.profiler.version_column(columns)
+        sql = self.profiler.build_version_query(table_name, columns, key_index, bounds, version_index)
+        params = tuple(value for lower, upper, is_last, lower_exclusive in bounds for value in (lower, upper))
+        with self.scan_cursor() as cursor:
+            cursor.execute(sql, params)
+            markers = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+        return [markers.get(index, (0, None)) for index in range(len(bounds))]
+
+    def profile_database(self, tables=None, max_workers=None, priorities=None, progress=None, mode=None):
+        """Profile many tables in parallel.
+
+        tables defaults to every table from list_tables. Work is ordered by
+        priority (higher first, from the priorities dict keyed by 'schema.table')
+        and then by row count, largest first, so the longest scans start early.
+        At most max_workers tables are scanned at once, and never more than the
+        connection pool can serve. progress(done, total, table_name, profile) is
+        called as each table finishes. Returns {table_name: profile or None}.
+        """
+        if tables is None:
+            tables = self.list_tables()
+        results = {f"{table['schema']}.{table['name']}": None for table in tables}
+        total = len(results)
+        for done, (table_name, profile) in enumerate(
+                self.iter_profiles(tables, max_workers, priorities, mode), start=1):
+            results[table_name] = profile
+            if progress:
+                progress(done, total, table_name, profile)
+        return results
+
+    def iter_profiles(self, tables=None, max_workers=None, priorities=None, mode=None):
+        """Yield (table_name, profile or None) pairs as tables finish, in the order of profile_database.
+
+        At most one profile per worker is in flight, so memory stays bounded by
+        the worker count rather than the number of tables when the caller does
+        not keep the results. After cancel_profiles(), tables not yet started
+        are skipped and not yielded.
+        """
+        if tables is None:
+            tables = self.list_tables()
+        priorities = priorities or {}
+
+        def qualified(table):
+            return f"{table['schema']}.{table['name']}"
+
+        work = sorted(tables, key=lambda table: (-priorities.get(qualified(table), 0), -(table['row_count'] or 0)))
+        if not work:
+            return
+
+        # Fetch every schema in one round-trip so workers start from the cache
+        self.get_catalog_snapshot([qualified(table) for table in work])
+
+        workers = min(max_workers or self.profile_workers, self.pool.max_size, len(work))
+        pending = iter(work)
+        # cancel_profiles() also stops the tables not submitted yet
+        generation = self.governor.generation
+        profile_table = self.governor.bind(self.profile_table, generation)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='profile') as executor:
+            def submit():
+                if self.governor.generation != generation:
+                    return
+                table = next(pending, None)
+                if table is not None:
+                    futures[executor.submit(profile_table, qualified(table), mode, table['row_count'])] = qualified(table)
+
+            futures = {}
+            for _ in range(workers):
+                submit()
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    table_name = futures.pop(future)
+                    submit()
+                    yield table_name, future.result()
+
+def _collect_profile(items):
+    """Assemble a profile dict from a header-then-columns iterator"""
+    profile = next(items, None)
+    if profile is not None:
+        profile['columns'] = list(items)
+    return profile
+
+
+def _unchanged(profile):
+    """Mark a stored profile as served without rescanning anything"""
+    profile['refreshed_partitions'] = 0
+    return profile
+
+
+def _dump_partial(partial):
+    """Make a key-range partial storable; sketch indexes become list entries since JSON keys are strings"""
+    return {'rows': partial['rows'], 'stats': partial['stats'], 'sketches': list(partial['sketches'].items())}
+
+
+def _load_partial(stored):
+    """Reverse _dump_partial"""
+    return {'rows': stored['rows'], 'stats': stored['stats'], 'sketches': dict(stored['sketches'])}
@@ -0,0 +1,361 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+# Waits that grow when the server is short of I/O, memory grants, CPU or locks
+PRESSURE_WAITS_QUERY = """
+SELECT SUM(wait_time_ms)
+FROM sys.dm_os_wait_stats
+WHERE wait_type LIKE 'PAGEIOLATCH[_]%'
+   OR wait_type LIKE 'LCK[_]M[_]%'
+   OR wait_type IN ('RESOURCE_SEMAPHORE', 'SOS_SCHEDULER_YIELD', 'WRITELOG', 'IO_COMPLETION');
+"""
+
+ISOLATION_LEVELS = {
+    'read_uncommitted': 'READ UNCOMMITTED',
+    'snapshot': 'SNAPSHOT',
+    'read_committed': 'READ COMMITTED',
+}
+
+
+class Cancelled(Exception):
+    """Raised inside a profiling job that was cancelled"""
+
+
+class BudgetExceeded(Cancelled):
+    """Raised inside a profiling job that ran past its time budget"""
+
+
+class Job:
+    """Deadline and cancellation flag shared by every statement of one profiling job.
+
+    cancel() may be called from any thread: the job's running statements are
+    cancelled on the server and its next statement raises Cancelled. Running
+    statements are cancelled the same way when the budget runs out.
+    """
+
+    def __init__(self, budget: Optional[float] = None, name: Optional[str] = None, generation: int = 0):
+        self.name = name
+        # cancel_all() stops every job from an earlier generation, even one not yet started
+        self.generation = generation
+        self.budget = budget or None
+        self.deadline = time.monotonic() + budget if budget else None
+        self._cancelled = threading.Event()
+        self._running = set()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left in the budget, or None without one"""
+        return None if self.deadline is None else self.deadline - time.monotonic()
+
+    def stopped(self) -> Optional[Cancelled]:
+        """The error to raise if the job was cancelled or its budget is spent, else None"""
+        label = f"Profiling job '{self.name}'" if self.name else "Profiling job"
+        if self.cancelled:
+            return Cancelled(f"{label} was cancelled")
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            return BudgetExceeded(f"{label} exceeded its {self.budget:g}s budget")
+        return None
+
+    def check(self):
+        """Raise if the job was cancelled or its budget is spent"""
+        error = self.stopped()
+        if error is not None:
+            raise error
+
+    def cancel(self):
+        self._cancelled.set()
+        self.interrupt()
+
+    def interrupt(self):
+        """Cancel the statements running now without cancelling the job"""
+        with self._lock:
+            running = list(self._running)
+        for cancel in running:
+            try:
+                cancel()
+            except Exception as e:
+                print(f"Error cancelling statement: {str(e)}")
+
+    @contextmanager
+    def running(self, cancel: Optional[Callable]):
+        """Register how to cancel the statement a block runs"""
+        if cancel is None:
+            yield
+            return
+        with self._lock:
+            self._running.add(cancel)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._running.discard(cancel)
+
+
+class QueryGovernor:
+    """Bounds what profiling scans may cost the server.
+
+    - Every scan statement gets a timeout: the per-query limit or the time left
+      in its job's budget, whichever is shorter.
+    - Jobs (one per profile_table call) can be cancelled. Cancellation is
+      cooperative between statements and via the driver's cancel() during one.
+    - Scan connections run at a configurable isolation level, so reads take no
+      shared locks (read_uncommitted) or read row versions (snapshot).
+    - Concurrent jobs are limited by an adaptive limit. It is halved while the
+      server is under pressure and grows back by one per calm check.
+
+    Pressure means that either signal is raised. The first signal is the growth
+    of I/O, lock, memory-grant and CPU waits in sys.dm_os_wait_stats. The second
+    is scan time per cell read (rows x columns) rising well above the best
+    seen so far. While under
+    pressure, 'auto' profiles sample instead of scanning whole tables.
+    """
+
+    def __init__(self, query_timeout: float = 0, job_budget: float = 0, isolation: str = 'read_uncommitted',
+                 max_concurrency: int = 4, wait_threshold: float = 0, latency_factor: float = 4,
+                 check_interval: float = 15):
+        self.query_timeout = query_timeout
+        self.job_budget = job_budget
+        self.isolation = isolation if isolation in ISOLATION_LEVELS else None
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = self.max_concurrency
+        self.wait_threshold = wait_threshold
+        self.latency_factor = latency_factor
+        self.check_interval = check_interval
+
+        self.under_pressure = False
+        self._active = 0
+        self._jobs = set()
+        self._condition = threading.Condition()
+        self._local = threading.local()
+        self._last_check = 0.0
+        self._last_waits = None
+        self._wait_checks = wait_threshold > 0
+        self._latency = None
+        self._best_latency = None
+        self._generation = 0
+
+    # Jobs
+
+    @property
+    def generation(self) -> int:
+        """Incremented by every cancel_all(); work queued under an older value is cancelled"""
+        return self._generation
+
+    def current(self) -> Optional[Job]:
+        """The job the calling thread is working for, if any"""
+        return getattr(self._local, 'job', None)
+
+    def create_job(self, name: Optional[str] = None, budget: Optional[float] = None) -> Job:
+        """Create a job to run in steps with job(resume=...), such as a generator between yields"""
+        generation = getattr(self._local, 'generation', None)
+        return Job(budget if budget is not None else self.job_budget, name,
+                   self._generation if generation is None else generation)
+
+    @contextmanager
+    def job(self, name: Optional[str] = None, budget: Optional[float] = None, resume: Optional[Job] = None):
+        """Run a block as a profiling job, waiting for a slot under the adaptive limit.
+
+        A block already inside a job joins it instead of starting another, so
+        nested profiling calls share one slot and one budget. resume runs the
+        block as one more step of a job from create_job(), which holds a slot
+        only while a step runs.
+        """
+        current = self.current()
+        if current is not None:
+            yield current
+            return
+
+        job = resume or self.create_job(name, budget)
+        self._acquire(job)
+        self._local.job = job
+        # Drivers without statement timeouts are interrupted when the budget runs out
+        deadline = threading.Timer(job.remaining(), job.interrupt) if job.deadline else None
+        if deadline:
+            deadline.daemon = True
+            deadline.start()
+        try:
+            yield job
+        finally:
+            if deadline:
+                deadline.cancel()
+            self._local.job = None
+            self._release(job)
+
+    def bind(self, function: Callable, generation: Optional[int] = None) -> Callable:
+        """Wrap a function so worker threads run it inside the caller's job.
+
+        With a generation, jobs the function starts belong to it, so work
+        queued before a cancel_all() is cancelled when it starts.
+        """
+        job = self.current()
+        if job is None and generation is None:
+            return function
+
+        def bound(*args, **kwargs):
+            previous = self.current(), getattr(self._local, 'generation', None)
+            self._local.job, self._local.generation = job, generation
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self._local.job, self._local.generation = previous
+        return bound
+
+    def cancel_all(self) -> int:
+        """Cancel every running and waiting job, returning how many were running"""
+        with self._condition:
+            self._generation += 1
+            jobs = list(self._jobs)
+            self._condition.notify_all()
+        for job in jobs:
+            job.cancel()
+        return len(jobs)
+
+    def _acquire(self, job: Job):
+        with self._condition:
+            while True:
+                if job.generation != self._generation:
+                    job.cancel()
+                job.check()
+                if self._active < self.limit:
+                    break
+                remaining = job.remaining()
+                self._condition.wait(min(remaining, 1.0) if remaining is not None else 1.0)
+            self._active += 1
+            self._jobs.add(job)
+
+    def _release(self, job: Job):
+        with self._condition:
+            self._active -= 1
+            self._jobs.discard(job)
+            self._condition.notify()
+
+    # Statements
+
+    def statement_timeout(self, job: Optional[Job]) -> int:
+        """Whole seconds the next statement may run, 0 for no limit"""
+        limits = [self.query_timeout] if self.query_timeout else []
+        remaining = job.remaining() if job else None
+        if remaining is not None:
+            limits.append(max(remaining, 1))
+        return int(math.ceil(min(limits))) if limits else 0
+
+    def isolation_statement(self) -> Optional[str]:
+        if not self.isolation:
+            return None
+        return f"SET TRANSACTION ISOLATION LEVEL {ISOLATION_LEVELS[self.isolation]}"
+
+    def observe(self, seconds: float, cells: Optional[int]):
+        """Track scan time per cell read, flagging pressure when it rises well above the best seen"""
+        if not cells or not self.latency_factor:
+            return
+        per_cell = seconds / cells
+        with self._condition:
+            self._latency = per_cell if self._latency is None else 0.8 * self._latency + 0.2 * per_cell
+            if self._best_latency is None or self._latency < self._best_latency:
+                self._best_latency = self._latency
+            slow = self._latency > self.latency_factor * self._best_latency
+        if slow and not self.under_pressure:
+            self._adjust(True, "scan latency rose")
+
+    # Server load
+
+    def check_load(self, fetch_waits: Callable[[], Optional[float]]):
+        """Sample server wait stats at most once per check_interval and adapt to them"""
+        now = time.monotonic()
+        with self._condition:
+            if now - self._last_check < self.check_interval:
+                return
+            self._last_check = now
+        reasons = []
+        with self._condition:
+            if self._latency is not None and self.latency_factor:
+                if self._latency > self.latency_factor * self._best_latency:
+                    reasons.append("scan latency rose")
+                # Decay toward the baseline so a past spike fades unless new scans confirm it
+                self._latency = (self._latency + self._best_latency) / 2
+
+        waits = fetch_waits() if self._wait_checks else None
+        if waits is None:
+            # Without VIEW SERVER STATE only scan latency is watched
+            self._wait_checks = False
+        else:
+            previous, self._last_waits = self._last_waits, (now, waits)
+            if previous is not None and (waits - previous[1]) / max(now - previous[0], 1e-3) > self.wait_threshold:
+                reasons.append("server waits rose")
+        self._adjust(bool(reasons), ", ".join(reasons))
+
+    def _adjust(self, pressure: bool, reason: str):
+        with self._condition:
+            if pressure:
+                limit = max(1, self.limit // 2)
+            else:
+                limit = min(self.max_concurrency, self.limit + 1)
+            changed = pressure != self.under_pressure or limit != self.limit
+            self.under_pressure = pressure
+            self.limit = limit
+            self._condition.notify_all()
+        if changed and pressure:
+            print(f"Server under pressure ({reason}), profiling with {limit} concurrent job(s) and sampling")
+        elif changed and limit == self.max_concurrency:
+            print("Server load back to normal, profiling at full concurrency")
+
+    def prefer_sampling(self) -> bool:
+        """Whether 'auto' profiles should sample rather than scan whole tables"""
+        return self.under_pressure
+
+
+class GovernedCursor:
+    """Cursor wrapper applying a governor's job checks, timeouts and cancellation.
+
+    Each statement runs on a new cursor from open_cursor, opened after the
+    statement's timeout is set on the connection: pyodbc copies
+    connection.timeout onto a cursor only when the cursor is created.
+    """
+
+    def __init__(self, open_cursor: Callable, connection, governor: QueryGovernor):
+        self._open_cursor = open_cursor
+        self._cursor = None
+        self._connection = connection
+        self._governor = governor
+
+    def execute(self, sql, *params):
+        job = self._governor.current()
+        if job is not None:
+            job.check()
+        timeout = self._governor.statement_timeout(job)
+        if hasattr(self._connection, 'timeout'):
+            self._connection.timeout = timeout
+        self.close()
+        self._cursor = self._open_cursor()
+        cancel = getattr(self._cursor, 'cancel', None) or getattr(self._connection, 'interrupt', None)
+        try:
+            if job is not None:
+                with job.running(cancel):
+                    result = self._cursor.execute(sql, *params)
+            else:
+                result = self._cursor.execute(sql, *params)
+        except Exception as e:
+            error = job.stopped() if job is not None else None
+            if error is not None:
+                raise error from e
+            raise
+        return self if result is self._cursor else result
+
+    def close(self):
+        if self._cursor is not None:
+            self._cursor.close()
+            self._cursor = None
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
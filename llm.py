@@ -1,7 +1,11 @@
+import asyncio
 import os
 from typing import List, Dict, Optional
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
+from cache import RoutingCache, catalog_fingerprint, tools_fingerprint
+from metrics import metrics
+from retrieval import TableIndex
 from tools import get_tool_schemas
 
 class LLMHandler:
@@ -17,17 +21,59 @@ class LLMHandler:
         
         # Initialize OpenAI client
         self.client = OpenAI(api_key=self.api_key)
+        
+        # Limits for the async client used by batch processing
+        self.llm_concurrency = int(os.getenv('LLM_CONCURRENCY', '8'))
+        self.llm_rate_limit = float(os.getenv('LLM_RATE_LIMIT', '0'))
+        self._async_loop = None
+        self._async_client = None
+        self._llm_slots = None
+        self._rate_limiter = None
+        
+        # Repeat questions are answered from the routing cache without an API call
+        cache_path = os.getenv('ROUTING_CACHE_PATH', '.routing_cache.sqlite')
+        self.routing_cache = RoutingCache(cache_path, int(os.getenv('ROUTING_CACHE_SIZE', '10000'))) if cache_path else None
+        self._tools_hash = tools_fingerprint(get_tool_schemas())
+        # (table list, fingerprint), replaced in one assignment as requests share the handler
+        self._catalog_hash = (None, None)
+        
+        # Only the tables most relevant to a question are listed in the prompt
+        self.table_index = TableIndex()
+        self.prompt_table_limit = int(os.getenv('PROMPT_TABLE_LIMIT', '25'))
+        self.prompt_token_budget = int(os.getenv('PROMPT_TABLE_TOKEN_BUDGET', '1000'))
+
+    def _catalog_fingerprint(self, tables: List[Dict]) -> str:
+        """Fingerprint the table list, reusing the last result for the same (cached) list"""
+        fingerprinted, fingerprint = self._catalog_hash
+        if tables is not fingerprinted:
+            fingerprint = catalog_fingerprint(tables)
+            self._catalog_hash = (tables, fingerprint)
+        return fingerprint
+
+    def _create_table_context(self, tables: List[Dict], question: str = "") -> str:
+        """Create a context string from the available tables most relevant to the question"""
+        lines = [f"- {table['schema']}.{table['name']} ({table['row_count']} rows)" for table in tables]
+        if self._estimate_tokens(lines) <= self.prompt_token_budget:
+            return "\n".join(lines)
 
-    def _create_table_context(self, tables: List[Dict]) -> str:
-        """Create a context string from available tables"""
+        # Unchanged (cached) table lists are not re-indexed
+        self.table_index.update(tables)
         table_info = []
-        for table in tables:
-            table_info.append(f"- {table['schema']}.{table['name']} ({table['row_count']} rows)")
+        for table, score in self.table_index.search(question, self.prompt_table_limit):
+            line = f"- {table['schema']}.{table['name']} ({table['row_count']} rows)"
+            if self._estimate_tokens(table_info + [line]) > self.prompt_token_budget:
+                break
+            table_info.append(line)
+        table_info.append(f"({len(tables) - len(table_info)} less relevant tables omitted)")
         return "\n".join(table_info)
 
+    def _estimate_tokens(self, lines: List[str]) -> int:
+        """Rough token count of prompt lines (about four characters per token)"""
+        return sum(len(line) + 1 for line in lines) // 4
+
     def _create_prompt(self, question: str, tables: List[Dict]) -> str:
         """Create a prompt for the LLM"""
-        table_context = self._create_table_context(tables)
+        table_context = self._create_table_context(tables, question)
         
         return f"""Given the following question about database tables, determine which database operation to perform.
 Available tables:
@@ -35,44 +81,150 @@ Available tables:
 
 Question: {question}
 
-Please analyze the question and determine which database operation would be most appropriate."""
+Please analyze the question and determine which database operation would be most appropriate.
+If the question covers several tables, call the operation once for each of them."""
+
+    def _cache_key(self, question: str, tables: List[Dict]) -> Optional[str]:
+        """Build the routing cache key for a question, or None when caching is off"""
+        if not self.routing_cache:
+            return None
+        return RoutingCache.make_key(question, self.model, self._tools_hash, self._catalog_fingerprint(tables))
+
+    def _request_arguments(self, question: str, tables: List[Dict]) -> Dict:
+        """Build the chat-completions arguments for a question"""
+        # Create the prompt
+        prompt = self._create_prompt(question, tables)
+        # print(prompt)
+        
+        # Get available tools
+        tools = get_tool_schemas()
+        
+        return dict(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": "You are a database expert that helps determine which database operations to perform based on natural language questions."},
+                {"role": "user", "content": prompt}
+            ],
+            tools=[{"type": "function", "function": tool} for tool in tools],
+            tool_choice="auto",
+            temperature=0,
+            max_tokens=self.max_tokens
+        )
+
+    def _parse_response(self, response, cache_key: Optional[str]) -> Optional[Dict]:
+        """Extract the function call from the response and remember it"""
+        message = response.choices[0].message
+        
+        if message.tool_calls:
+            # A question about several tables comes back as several tool calls
+            calls = []
+            for tool_call in message.tool_calls:
+                print(tool_call.function.name, tool_call.function.arguments)
+                calls.append({
+                    "tool_name": tool_call.function.name,
+                    "parameters": tool_call.function.arguments
+                })
+            result = dict(calls[0])
+            if len(calls) > 1:
+                result["calls"] = calls
+            if cache_key:
+                self.routing_cache.put(cache_key, result)
+            return result
+        
+        return None
 
     def process_question(self, question: str, tables: List[Dict]) -> Dict:
         """Process a question and determine which database operation to perform"""
         try:
-            # Create the prompt
-            prompt = self._create_prompt(question, tables)
-            # print(prompt)
-            
-            # Get available tools
-            tools = get_tool_schemas()
+            cache_key = self._cache_key(question, tables)
+            if cache_key:
+                cached = self.routing_cache.get(cache_key)
+                if cached:
+                    metrics.inc('llm.cache_hits')
+                    return cached
             
             # Call the LLM using function calling
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a database expert that helps determine which database operations to perform based on natural language questions."},
-                    {"role": "user", "content": prompt}
-                ],
-                tools=[{"type": "function", "function": tool} for tool in tools],
-                tool_choice="auto",
-                temperature=0,
-                max_tokens=self.max_tokens
-            )
-            
-            # Extract the function call from the response
-            message = response.choices[0].message
-            
-            if message.tool_calls:
-                tool_call = message.tool_calls[0]
-                print(tool_call.function.name, tool_call.function.arguments)
-                return {
-                    "tool_name": tool_call.function.name,
-                    "parameters": tool_call.function.arguments
-                }
+            arguments = self._request_arguments(question, tables)
+            with metrics.span('llm.request', model=self.model) as span:
+                response = self.client.chat.completions.create(**arguments)
+                self._record_usage(span, response)
+            return self._parse_response(response, cache_key)
             
+        except Exception as e:
+            print(f"Error in LLM processing: {str(e)}")
             return None
+
+    async def aprocess_question(self, question: str, tables: List[Dict]) -> Dict:
+        """Async variant of process_question for batch pipelines.
+
+        Calls go through an AsyncOpenAI client, with at most LLM_CONCURRENCY
+        requests in flight and no more than LLM_RATE_LIMIT started per second.
+        """
+        try:
+            cache_key = self._cache_key(question, tables)
+            if cache_key:
+                cached = self.routing_cache.get(cache_key)
+                if cached:
+                    metrics.inc('llm.cache_hits')
+                    return cached
+            
+            client, slots, rate_limiter = self._async_state()
+            arguments = self._request_arguments(question, tables)
+            async with slots:
+                await rate_limiter.wait()
+                # Timed inside the limits so the span measures the API, not the queue
+                with metrics.span('llm.request', model=self.model) as span:
+                    response = await client.chat.completions.create(**arguments)
+                    self._record_usage(span, response)
+            return self._parse_response(response, cache_key)
             
         except Exception as e:
             print(f"Error in LLM processing: {str(e)}")
-            return None 
\ No newline at end of file
+            return None
+
+    def _record_usage(self, span: Dict, response):
+        """Count the tokens a response used and add them to its span"""
+        usage = getattr(response, 'usage', None)
+        if usage is None:
+            return
+        span.update(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+        metrics.inc('llm.prompt_tokens', usage.prompt_tokens, model=self.model)
+        metrics.inc('llm.completion_tokens', usage.completion_tokens, model=self.model)
+
+    def _async_state(self):
+        """Get the async client and limits bound to the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop:
+            # Async clients and semaphores cannot be shared between event loops
+            self._async_loop = loop
+            self._async_client = AsyncOpenAI(api_key=self.api_key)
+            self._llm_slots = asyncio.Semaphore(self.llm_concurrency)
+            self._rate_limiter = RateLimiter(self.llm_rate_limit)
+        return self._async_client, self._llm_slots, self._rate_limiter
+
+    async def aclose(self):
+        """Close the async client of the running event loop and its connection pool"""
+        if self._async_loop is asyncio.get_running_loop() and self._async_client is not None:
+            await self._async_client.close()
+            self._async_loop = None
+            self._async_client = None
+
+
+class RateLimiter:
+    """Spaces out request starts to at most `rate` per second (0 means unlimited)"""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            now = loop.time()
+            delay = self._next_start - now
+            self._next_start = max(now, self._next_start) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
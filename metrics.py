@@ -0,0 +1,369 @@
+import cProfile
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, List, Optional
+
+# Upper bounds, in seconds, of the histogram buckets every timing is counted in
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def sql_hash(sql: str) -> str:
+    """Short fingerprint of a statement, ignoring whitespace differences"""
+    return hashlib.sha1(re.sub(r"\s+", " ", sql.strip()).encode()).hexdigest()[:12]
+
+
+class Timing:
+    """Count, sum, maximum and bucket counts of one timed metric"""
+
+    __slots__ = ('count', 'total', 'maximum', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+        self.buckets = [0] * len(BUCKETS)
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.maximum = max(self.maximum, seconds)
+        for index, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[index] += 1
+                break
+
+
+class Metrics:
+    """Process-wide counters and timings of the hot paths.
+
+    Labels are kept to low-cardinality values such as an operation or tool
+    name, so the Prometheus output stays small. Per-event detail such as the
+    table, statement hash or row count goes to the listeners instead, which
+    receive one dict per finished span (see JsonLinesExporter and SlowLog).
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.counters: Dict[tuple, float] = {}
+        self.timings: Dict[tuple, Timing] = {}
+        self.listeners: List[Callable[[Dict], None]] = []
+        # Listeners attached by configure(), replaced when it runs again
+        self.exporters: List[Callable[[Dict], None]] = []
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """Add to a counter"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        """Record one duration of a timed metric"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            timing = self.timings.get(key)
+            if timing is None:
+                timing = self.timings[key] = Timing()
+            timing.observe(seconds)
+
+    def emit(self, event: Dict):
+        """Pass a finished event to every listener; a failing listener never breaks the caller"""
+        for listener in list(self.listeners):
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"Error exporting metrics: {str(e)}")
+
+    @contextmanager
+    def span(self, name: str, **labels):
+        """Time a block as the `name` timing and emit it as an event.
+
+        Yields a dict the block can add event attributes to, such as a table
+        name or row count; an exception is counted and re-raised.
+        """
+        attributes = {}
+        if not self.enabled:
+            yield attributes
+            return
+        started = time.perf_counter()
+        error = None
+        try:
+            yield attributes
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            self.observe(name, duration, **labels)
+            if error:
+                self.inc('errors', stage=name, error=error)
+            if self.listeners:
+                event = dict(attributes, span=name, duration=duration, at=time.time(), **labels)
+                if error:
+                    event['error'] = error
+                self.emit(event)
+
+    def timed(self, name: str, **labels):
+        """Decorator form of span()"""
+        def decorate(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(name, **labels):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def snapshot(self) -> Dict:
+        """Current counters and timings as plain data"""
+        with self._lock:
+            return {
+                'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                             for (name, labels), value in self.counters.items()],
+                'timings': [{'name': name, 'labels': dict(labels), 'count': timing.count,
+                             'sum': timing.total, 'max': timing.maximum}
+                            for (name, labels), timing in self.timings.items()]
+            }
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.timings.clear()
+
+    def prometheus_text(self, prefix: str = 'dbagent') -> str:
+        """Render the counters and timings in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            counters = sorted(self.counters.items())
+            timings = sorted((key, (timing.count, timing.total, list(timing.buckets)))
+                             for key, timing in self.timings.items())
+
+        declared = set()
+        for (name, labels), value in counters:
+            metric = f"{prefix}_{_metric_name(name)}_total"
+            if metric not in declared:
+                lines.append(f"# TYPE {metric} counter")
+                declared.add(metric)
+            lines.append(f"{metric}{_labels(labels)} {value:g}")
+
+        for (name, labels), (count, total, buckets) in timings:
+            metric = f"{prefix}_{_metric_name(name)}_seconds"
+            if metric not in declared:
+                lines.append(f"# TYPE {metric} histogram")
+                declared.add(metric)
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS, buckets):
+                cumulative += bucket
+                lines.append(f"{metric}_bucket{_labels(labels + (('le', f'{bound:g}'),))} {cumulative}")
+            lines.append(f"{metric}_bucket{_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{metric}_sum{_labels(labels)} {total:.6f}")
+            lines.append(f"{metric}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        """Write the Prometheus text to a file, e.g. for node_exporter's textfile collector"""
+        temporary = path + '.tmp'
+        with open(temporary, 'w') as file:
+            file.write(self.prometheus_text())
+        os.replace(temporary, path)
+
+
+def _metric_name(name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{str(value)}"'.replace("\n", " ") for key, value in labels)
+    return "{" + pairs + "}"
+
+
+class JsonLinesExporter:
+    """Listener appending every event to a file as one JSON object per line"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', buffering=1)
+
+    def __call__(self, event: Dict):
+        line = json.dumps(event, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class SlowLog:
+    """Listener reporting database statements and other spans slower than a threshold.
+
+    Slow events are printed, or appended to path as JSON lines when one is given.
+    """
+
+    def __init__(self, threshold: float, path: Optional[str] = None, spans=('db.query',)):
+        self.threshold = threshold
+        self.spans = spans
+        self.exporter = JsonLinesExporter(path) if path else None
+
+    def __call__(self, event: Dict):
+        if event['span'] not in self.spans or event['duration'] < self.threshold:
+            return
+        if self.exporter:
+            self.exporter(event)
+        else:
+            statement = " ".join(event.get('sql', event.get('table', '')).split())
+            print(f"Slow {event['span']} ({event['duration']:.3f}s): {statement[:200]}")
+
+    def close(self):
+        if self.exporter:
+            self.exporter.close()
+
+
+class InstrumentedCursor:
+    """DB-API cursor wrapper that times each statement and its fetches.
+
+    A statement is recorded when the next one starts or the cursor closes,
+    as a db.query event with the statement hash, rows fetched, execute and
+    fetch time, and the time spent waiting for the pooled connection.
+    """
+
+    def __init__(self, cursor, metrics: Metrics, wait: float = 0.0):
+        self._cursor = cursor
+        self._metrics = metrics
+        self._wait = wait
+        self._statement = None
+
+    def execute(self, sql, *params):
+        self._finish()
+        started = time.perf_counter()
+        self._statement = {'sql': sql, 'started': started, 'execute': 0.0, 'fetch': 0.0, 'rows': 0}
+        try:
+            result = self._cursor.execute(sql, *params)
+        except BaseException as e:
+            self._statement['error'] = type(e).__name__
+            raise
+        finally:
+            if self._statement is not None:
+                self._statement['execute'] = time.perf_counter() - started
+        return self if result is self._cursor else result
+
+    def fetchone(self):
+        row = self._fetch(self._cursor.fetchone)
+        self._count(1 if row is not None else 0)
+        return row
+
+    def fetchmany(self, *size):
+        rows = self._fetch(self._cursor.fetchmany, *size)
+        self._count(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._fetch(self._cursor.fetchall)
+        self._count(len(rows))
+        return rows
+
+    def nextset(self):
+        return self._fetch(self._cursor.nextset)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def close(self):
+        self._finish()
+        self._cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def _fetch(self, method, *args):
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            if self._statement is not None:
+                self._statement['fetch'] += time.perf_counter() - started
+
+    def _count(self, rows: int):
+        if self._statement is not None:
+            self._statement['rows'] += rows
+
+    def _finish(self):
+        statement, self._statement = self._statement, None
+        if statement is None:
+            return
+        metrics = self._metrics
+        metrics.inc('db.queries')
+        metrics.inc('db.rows', statement['rows'])
+        metrics.observe('db.execute', statement['execute'])
+        metrics.observe('db.fetch', statement['fetch'])
+        if 'error' in statement:
+            metrics.inc('errors', stage='db.query', error=statement['error'])
+        if metrics.listeners:
+            event = {
+                'span': 'db.query',
+                'duration': statement['execute'] + statement['fetch'],
+                'at': time.time(),
+                'sql_hash': sql_hash(statement['sql']),
+                'sql': statement['sql'],
+                'rows': statement['rows'],
+                'execute': statement['execute'],
+                'fetch': statement['fetch'],
+                'connection_wait': self._wait
+            }
+            if 'error' in statement:
+                event['error'] = statement['error']
+            metrics.emit(event)
+
+
+@contextmanager
+def profiled(path: Optional[str]):
+    """Run a block under cProfile and dump its stats to path; does nothing without a path"""
+    if not path:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+
+
+def configure(metrics: 'Metrics'):
+    """Attach the exporters selected by environment variables.
+
+    METRICS_JSONL_PATH appends every event as JSON lines, SLOW_QUERY_MS
+    reports statements slower than that (to SLOW_QUERY_LOG if set), and
+    METRICS=no turns instrumentation off. Exporters from an earlier call are
+    closed and replaced, so every agent in a process can call it.
+    """
+    metrics.enabled = os.getenv('METRICS', 'yes').lower() not in ('0', 'no', 'false')
+    for exporter in metrics.exporters:
+        if exporter in metrics.listeners:
+            metrics.listeners.remove(exporter)
+        exporter.close()
+    metrics.exporters = []
+    jsonl_path = os.getenv('METRICS_JSONL_PATH')
+    if jsonl_path:
+        metrics.exporters.append(JsonLinesExporter(jsonl_path))
+    slow_ms = float(os.getenv('SLOW_QUERY_MS', '0'))
+    if slow_ms > 0:
+        metrics.exporters.append(SlowLog(slow_ms / 1000, os.getenv('SLOW_QUERY_LOG')))
+    metrics.listeners.extend(metrics.exporters)
+
+
+# Shared registry the database, LLM and formatting code report to
+metrics = Metrics()
@@ -0,0 +1,163 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, List, Optional
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the checkout timeout"""
+
+
+class PooledConnection:
+    """A raw DB-API connection plus the bookkeeping the pool needs"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+    def age(self) -> float:
+        return time.monotonic() - self.created_at
+
+    def idle_time(self) -> float:
+        return time.monotonic() - self.last_used
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of database connections.
+
+    Connections are opened lazily up to max_size. Idle connections are pinged
+    before reuse once they have sat longer than health_check_interval, and any
+    connection older than max_lifetime is closed instead of being reused.
+    """
+
+    def __init__(self, connect: Callable, max_size: int = 5, timeout: float = 30,
+                 max_lifetime: float = 1800, health_check_interval: float = 60):
+        self._connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_interval = health_check_interval
+
+        self._idle: List[PooledConnection] = []
+        self._size = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+    @property
+    def size(self) -> int:
+        """Number of open connections, idle or checked out"""
+        return self._size
+
+    @property
+    def idle_count(self) -> int:
+        """Number of connections waiting in the pool"""
+        return len(self._idle)
+
+    def acquire(self, timeout: Optional[float] = None) -> PooledConnection:
+        """Check out a healthy connection, opening one if the pool has room"""
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._condition:
+                while True:
+                    if self._closed:
+                        raise PoolTimeout("Connection pool is closed")
+                    if self._idle:
+                        pooled = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        # Reserve the slot now and open the connection outside the lock
+                        self._size += 1
+                        pooled = None
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(f"No database connection available after {timeout}s")
+                    self._condition.wait(remaining)
+
+            if pooled is None:
+                try:
+                    return PooledConnection(self._connect())
+                except Exception:
+                    self._discard_slot()
+                    raise
+
+            if self._is_usable(pooled):
+                return pooled
+            self._close(pooled)
+
+    def release(self, pooled: PooledConnection, discard: bool = False):
+        """Return a connection to the pool, closing it if it is broken or too old"""
+        if not discard:
+            try:
+                # Drop any transaction the caller left open so the next user starts clean
+                pooled.raw.rollback()
+            except Exception:
+                discard = True
+
+        if discard or self._closed or pooled.age() > self.max_lifetime:
+            self._close(pooled)
+            return
+
+        pooled.last_used = time.monotonic()
+        with self._condition:
+            self._idle.append(pooled)
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        """Check out a raw connection for the duration of a with block"""
+        pooled = self.acquire(timeout)
+        discard = False
+        try:
+            yield pooled.raw
+        except Exception:
+            # The failure may have left the connection in a bad state
+            discard = True
+            raise
+        finally:
+            self.release(pooled, discard)
+
+    def close(self):
+        """Close idle connections and stop handing out new ones"""
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._condition.notify_all()
+        for pooled in idle:
+            self._close(pooled)
+
+    def reopen(self):
+        """Allow checkouts again after close()"""
+        with self._condition:
+            self._closed = False
+
+    def _is_usable(self, pooled: PooledConnection) -> bool:
+        """Check lifetime and, for long-idle connections, liveness"""
+        if pooled.age() > self.max_lifetime:
+            return False
+        if pooled.idle_time() < self.health_check_interval:
+            return True
+        try:
+            cursor = pooled.raw.cursor()
+            try:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+            finally:
+                cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _close(self, pooled: PooledConnection):
+        try:
+            pooled.raw.close()
+        except Exception:
+            pass
+        self._discard_slot()
+
+    def _discard_slot(self):
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
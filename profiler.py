@@ -0,0 +1,729 @@
+import math
+from typing import Iterator, List, Dict, Optional, Tuple
+
+from sketches import MIX_MULTIPLIER, ColumnSketch, HyperLogLog
+
+# Column type groups used to decide which aggregates apply to a column
+INTEGER_TYPES = ('int', 'bigint', 'smallint', 'tinyint')
+NUMERIC_TYPES = INTEGER_TYPES + ('decimal', 'numeric', 'float', 'real', 'money', 'smallmoney')
+STRING_TYPES = ('varchar', 'nvarchar', 'char', 'nchar')
+DATE_TYPES = ('datetime', 'date', 'datetime2', 'datetimeoffset', 'smalldatetime')
+
+# SQL Server cannot compare these types, so COUNT(DISTINCT), MIN and MAX fail on them
+NON_COMPARABLE_TYPES = ('text', 'ntext', 'image', 'xml', 'geography', 'geometry')
+
+# Upper bound on columns folded into one aggregate statement. Each column adds up
+# to five select-list expressions, which keeps statements well under SQL Server's
+# 4096 expression limit while still scanning a 60-column table only once.
+MAX_COLUMNS_PER_QUERY = 64
+
+# Key types a table can be split on for partitioned profiling
+RANGE_KEY_TYPES = INTEGER_TYPES + DATE_TYPES
+
+# Types SQL Server bumps on every insert and update; incremental profiling uses
+# their maximum per key range to spot ranges that changed in place
+VERSION_TYPES = ('timestamp', 'rowversion')
+
+# Registers per column (2 ** precision) in the distinct sketches of partitioned profiles
+SKETCH_PRECISION = 10
+
+# In 'auto' mode, tables with more rows than this are profiled from a sample
+EXACT_ROW_LIMIT = 5_000_000
+SAMPLE_ROWS = 100_000
+
+# z-score for the 95% confidence intervals reported on sampled metrics
+Z_95 = 1.96
+
+# APPROX_COUNT_DISTINCT is documented to stay within 2% error with 97% probability
+HLL_RELATIVE_ERROR = 0.02
+HLL_CONFIDENCE = 0.97
+
+# Leading-column statistics of a table with their histogram steps. Histogram keys
+# are sql_variant, which ODBC drivers cannot fetch, so they come back as text
+# (dates in ISO 8601). Needs SQL Server 2016 SP1 CU2 or later.
+STATISTICS_QUERY = """
+SELECT
+    c.name AS ColumnName,
+    s.stats_id AS StatsId,
+    sp.last_updated AS LastUpdated,
+    sp.rows AS StatsRows,
+    sp.rows_sampled AS RowsSampled,
+    sp.modification_counter AS ModificationCounter,
+    h.step_number AS StepNumber,
+    CASE WHEN CAST(SQL_VARIANT_PROPERTY(h.range_high_key, 'BaseType') AS sysname)
+              IN ('date', 'datetime', 'datetime2', 'smalldatetime', 'datetimeoffset')
+         THEN CONVERT(nvarchar(4000), CONVERT(datetime2, h.range_high_key), 126)
+         ELSE CONVERT(nvarchar(4000), h.range_high_key) END AS RangeHighKey,
+    h.range_rows AS RangeRows,
+    h.equal_rows AS EqualRows,
+    h.distinct_range_rows AS DistinctRangeRows
+FROM sys.stats s
+INNER JOIN sys.stats_columns sc
+    ON sc.object_id = s.object_id AND sc.stats_id = s.stats_id AND sc.stats_column_id = 1
+INNER JOIN sys.columns c
+    ON c.object_id = sc.object_id AND c.column_id = sc.column_id
+CROSS APPLY sys.dm_db_stats_properties(s.object_id, s.stats_id) sp
+OUTER APPLY sys.dm_db_stats_histogram(s.object_id, s.stats_id) h
+WHERE s.object_id = OBJECT_ID(?)
+ORDER BY c.column_id, s.stats_id, h.step_number;
+"""
+
+
+def quote_identifier(name: str) -> str:
+    """Quote a single identifier the way QUOTENAME does"""
+    if name.startswith('[') and name.endswith(']'):
+        name = name[1:-1].replace(']]', ']')
+    return '[' + name.replace(']', ']]') + ']'
+
+
+def quote_table_name(table_name: str) -> str:
+    """Quote a possibly schema-qualified table name"""
+    return '.'.join(quote_identifier(part) for part in table_name.split('.'))
+
+
+def stats_stale_threshold(rows: int) -> float:
+    """Modifications after which SQL Server 2016+ would auto-update a statistics object"""
+    return min(500 + 0.2 * rows, math.sqrt(1000 * rows))
+
+
+def column_metrics(data_type: str, sampled: bool = False) -> List[str]:
+    """Get the aggregates computed for a column of the given data type"""
+    if data_type in NON_COMPARABLE_TYPES:
+        return ['non_null']
+    metrics = ['non_null', 'distinct']
+    if data_type in NUMERIC_TYPES:
+        metrics += ['min', 'max', 'avg']
+        # Sampled averages need the spread to report a confidence interval
+        if sampled:
+            metrics.append('stdev')
+    elif data_type in STRING_TYPES or data_type in DATE_TYPES:
+        metrics += ['min', 'max']
+    return metrics
+
+
+class TableProfiler:
+    """Profiles a table with a few wide aggregate statements instead of per-column scans"""
+
+    # SQL Server's COUNT returns int and overflows past 2^31 rows
+    count_function = 'COUNT_BIG'
+
+    def __init__(self, max_columns_per_query: int = MAX_COLUMNS_PER_QUERY,
+                 exact_row_limit: int = EXACT_ROW_LIMIT, sample_rows: int = SAMPLE_ROWS,
+                 distinct_method: str = 'sample'):
+        self.max_columns_per_query = max_columns_per_query
+        self.exact_row_limit = exact_row_limit
+        self.sample_rows = sample_rows
+        # 'sample' extrapolates distinct counts from the sample, 'hll' runs
+        # APPROX_COUNT_DISTINCT over the full table in one extra statement
+        self.distinct_method = distinct_method
+
+    def choose_mode(self, row_count: Optional[int], mode: str = 'auto') -> str:
+        """Pick 'exact' or 'approximate' work for a table of the given size"""
+        if mode != 'auto':
+            return mode
+        if row_count is not None and row_count > self.exact_row_limit:
+            return 'approximate'
+        return 'exact'
+
+    def sample_source(self, source: str, rows: int, method: str = 'tablesample') -> str:
+        """Build a FROM clause reading roughly the given number of rows"""
+        if method == 'top':
+            return f"(SELECT TOP ({rows}) * FROM {source}) AS sampled"
+        return f"{source} TABLESAMPLE SYSTEM ({rows} ROWS) REPEATABLE (42)"
+
+    def _metric_expression(self, metric: str, column: str) -> str:
+        """Build the aggregate expression for one metric of one column"""
+        if metric == 'non_null':
+            return f"{self.count_function}({column})"
+        if metric == 'distinct':
+            return f"{self.count_function}(DISTINCT {column})"
+        if metric == 'min':
+            return f"MIN({column})"
+        if metric == 'max':
+            return f"MAX({column})"
+        if metric == 'avg':
+            return f"AVG(CAST({column} AS float))"
+        if metric == 'sum':
+            return f"SUM(CAST({column} AS float))"
+        if metric == 'stdev':
+            return f"STDEV(CAST({column} AS float))"
+        if metric == 'approx_distinct':
+            return f"APPROX_COUNT_DISTINCT({column})"
+        raise ValueError(f"Unknown metric: {metric}")
+
+    def build_queries(self, table_name: str, columns: List[Dict], sample_rows: Optional[int] = None,
+                      sample_method: str = 'tablesample') -> List[Tuple[str, List[Tuple[int, str]]]]:
+        """Build the aggregate statements for a table.
+
+        Returns a list of (sql, layout) pairs where layout maps each select-list
+        position to a (column index, metric) pair. The row count is folded into
+        the first statement as column index -1. With sample_rows set, the
+        statements read a TABLESAMPLE of the table instead of all of it.
+        """
+        source = quote_table_name(table_name)
+        if sample_rows:
+            source = self.sample_source(source, sample_rows, sample_method)
+        metrics = [column_metrics(column['data_type'], sampled=bool(sample_rows)) for column in columns]
+        return self._aggregate_statements(source, columns, metrics)
+
+    def _aggregate_statements(self, source: str, columns: List[Dict], metrics: List[List[str]],
+                              where: str = '') -> List[Tuple[str, List[Tuple[int, str]]]]:
+        """Fold the given metrics of every column into as few SELECTs as the chunk size allows"""
+        queries = []
+        for start in range(0, max(len(columns), 1), self.max_columns_per_query):
+            expressions = []
+            layout = []
+            if start == 0:
+                expressions.append(f"{self.count_function}(*)")
+                layout.append((-1, 'rows'))
+            for index in range(start, min(start + self.max_columns_per_query, len(columns))):
+                quoted = quote_identifier(columns[index]['name'])
+                for metric in metrics[index]:
+                    expressions.append(self._metric_expression(metric, quoted))
+                    layout.append((index, metric))
+            select_list = ",\n    ".join(expressions)
+            queries.append((f"SELECT\n    {select_list}\nFROM {source}{where}", layout))
+        return queries
+
+    def build_distinct_queries(self, table_name: str, columns: List[Dict],
+                               indexes: Optional[List[int]] = None) -> List[Tuple[str, List[Tuple[int, str]]]]:
+        """Build full-table APPROX_COUNT_DISTINCT statements for the comparable columns (or those of indexes)"""
+        source = quote_table_name(table_name)
+        candidates = range(len(columns)) if indexes is None else indexes
+        indexes = [i for i in candidates if 'distinct' in column_metrics(columns[i]['data_type'])]
+        queries = []
+        for start in range(0, len(indexes), self.max_columns_per_query):
+            chunk = indexes[start:start + self.max_columns_per_query]
+            expressions = [self._metric_expression('approx_distinct', quote_identifier(columns[i]['name'])) for i in chunk]
+            layout = [(i, 'approx_distinct') for i in chunk]
+            select_list = ",\n    ".join(expressions)
+            queries.append((f"SELECT\n    {select_list}\nFROM {source}", layout))
+        return queries
+
+    def _run_queries(self, cursor, queries, stats: List[Dict], params: Tuple = ()) -> Optional[int]:
+        """Execute aggregate statements, collecting values into per-column stats"""
+        total_rows = None
+        for sql, layout in queries:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+            for value, (index, metric) in zip(row, layout):
+                if index < 0:
+                    total_rows = value or 0
+                else:
+                    stats[index][metric] = value
+        return total_rows
+
+    def profile(self, cursor, table_name: str, columns: List[Dict],
+                row_count: Optional[int] = None, mode: str = 'auto') -> Optional[Dict]:
+        """Run the aggregate statements on the cursor and build the profile dict.
+
+        mode is 'exact', 'approximate' or 'auto'; 'auto' samples tables whose
+        catalog row_count exceeds exact_row_limit.
+        """
+        items = self.iter_profile(cursor, table_name, columns, row_count, mode)
+        profile_data = next(items)
+        profile_data['columns'] = list(items)
+        return profile_data
+
+    def iter_profile(self, cursor, table_name: str, columns: List[Dict],
+                     row_count: Optional[int] = None, mode: str = 'auto') -> Iterator[Dict]:
+        """Yield the profile dict (with an empty column list), then each column profile.
+
+        The header follows the first statement, which also returns the row
+        count, and each column is yielded as soon as the statement covering it
+        completes, so wide tables start reporting after one chunk.
+        """
+        if self.choose_mode(row_count, mode) == 'approximate':
+            yield from self._iter_sample(cursor, table_name, columns, row_count)
+            return
+
+        stats = [{} for _ in columns]
+        queries = self.build_queries(table_name, columns)
+        total_rows = self._run_queries(cursor, queries[:1], stats) or 0
+        yield self.build_profile(table_name, [], [], total_rows)
+        for position, (sql, layout) in enumerate(queries):
+            if position > 0:
+                self._run_queries(cursor, [(sql, layout)], stats)
+            for index in _layout_columns(layout):
+                yield self._column_profile(columns[index], stats[index], total_rows)
+                stats[index] = None
+
+    def build_profile(self, table_name: str, columns: List[Dict], stats: List[Dict], total_rows: int,
+                      mode: str = 'exact') -> Dict:
+        """Build an exact profile dict from per-column aggregates computed elsewhere"""
+        return {
+            'table_name': table_name,
+            'total_rows': total_rows,
+            'mode': mode,
+            'sample_rows': None,
+            'sample_method': None,
+            'estimated': {},
+            'columns': [self._column_profile(column, column_stats, total_rows)
+                        for column, column_stats in zip(columns, stats)]
+        }
+
+    def _iter_sample(self, cursor, table_name: str, columns: List[Dict], row_count: Optional[int]) -> Iterator[Dict]:
+        """Profile a table from a TABLESAMPLE, scaling counts up to the catalog row count"""
+        stats = [{} for _ in columns]
+        sample_method = 'tablesample'
+        queries = self.build_queries(table_name, columns, self.sample_rows)
+        sample_size = self._run_queries(cursor, queries[:1], stats) or 0
+        if sample_size == 0 and row_count:
+            # TABLESAMPLE picks whole pages and can come back empty; read the first rows instead
+            sample_method = 'top'
+            stats = [{} for _ in columns]
+            queries = self.build_queries(table_name, columns, self.sample_rows, sample_method)
+            sample_size = self._run_queries(cursor, queries[:1], stats) or 0
+        total_rows = row_count if row_count is not None else sample_size
+
+        yield {
+            'table_name': table_name,
+            'total_rows': total_rows,
+            'mode': 'approximate',
+            'sample_rows': sample_size,
+            'sample_method': sample_method,
+            # Row counts come from partition metadata rather than COUNT(*)
+            'estimated': {'total_rows': _estimate('catalog', total_rows, total_rows, None)},
+            'columns': []
+        }
+        for position, (sql, layout) in enumerate(queries):
+            if position > 0:
+                self._run_queries(cursor, [(sql, layout)], stats)
+            indexes = _layout_columns(layout)
+            if self.distinct_method == 'hll':
+                self._run_queries(cursor, self.build_distinct_queries(table_name, columns, indexes), stats)
+            for index in indexes:
+                yield self._sampled_column_profile(columns[index], stats[index], sample_size, total_rows, sample_method)
+                stats[index] = None
+
+    def metadata_profile(self, table_name: str, columns: List[Dict], rows: List[Tuple],
+                         total_rows: Optional[int]) -> Dict:
+        """Build a profile from the rows of STATISTICS_QUERY without reading table data.
+
+        Each column uses its most recently updated statistics object. Null
+        counts come from the histogram's NULL step, distinct counts from its
+        steps plus distinct_range_rows, min/max from its first and last keys and
+        numeric averages from the step frequencies; counts are scaled from the
+        rows the statistics saw to total_rows. Every value is an estimate, and
+        each column reports how many modifications its statistics have missed.
+        """
+        by_stats = {}
+        for row in rows:
+            (column_name, stats_id, last_updated, stats_rows, rows_sampled, modifications,
+             step, high_key, range_rows, equal_rows, distinct_range_rows) = row
+            if last_updated is None:
+                # Statistics that were created but never populated
+                continue
+            entry = by_stats.setdefault((column_name.lower(), stats_id), {
+                'last_updated': last_updated, 'rows': stats_rows or 0, 'rows_sampled': rows_sampled or 0,
+                'modification_counter': modifications or 0, 'steps': []})
+            if step is not None:
+                entry['steps'].append((high_key, range_rows or 0, equal_rows or 0, distinct_range_rows or 0))
+
+        best = {}
+        for (column_name, stats_id), entry in by_stats.items():
+            current = best.get(column_name)
+            if current is None or (entry['last_updated'], entry['rows_sampled']) > (current['last_updated'], current['rows_sampled']):
+                best[column_name] = entry
+
+        if total_rows is None:
+            total_rows = max((entry['rows'] for entry in best.values()), default=0)
+        profile_data = {
+            'table_name': table_name,
+            'total_rows': total_rows,
+            'mode': 'metadata',
+            'sample_rows': None,
+            'sample_method': None,
+            'estimated': {'total_rows': _estimate('catalog', total_rows, total_rows, None)},
+            'stale': False,
+            'columns': []
+        }
+        for column in columns:
+            entry = best.get(column['name'].lower())
+            col_profile = self._statistics_column_profile(column, entry, total_rows)
+            if col_profile['statistics'] and col_profile['statistics']['stale']:
+                profile_data['stale'] = True
+            profile_data['columns'].append(col_profile)
+        return profile_data
+
+    def _statistics_column_profile(self, column: Dict, entry: Optional[Dict], total_rows: int) -> Dict:
+        """Estimate one column's profile entry from its statistics histogram"""
+        col_profile = self._column_profile(column, {}, total_rows)
+        col_profile['statistics'] = None
+        col_profile['histogram'] = []
+        if entry is None:
+            # No statistics on this column yet, so nothing is known about it
+            col_profile.update(null_count=None, null_percentage=None, unique_count=None,
+                               unique_percentage=None, distinct_values=None)
+            return col_profile
+
+        scale = total_rows / entry['rows'] if entry['rows'] else 1.0
+        numeric = column['data_type'] in NUMERIC_TYPES
+        null_rows = 0
+        distinct = 0
+        steps = []
+        for high_key, range_rows, equal_rows, distinct_range_rows in entry['steps']:
+            if high_key is None:
+                null_rows += equal_rows
+                continue
+            if numeric:
+                try:
+                    high_key = int(high_key) if column['data_type'] in INTEGER_TYPES else float(high_key)
+                except ValueError:
+                    pass
+            distinct += 1 + round(distinct_range_rows)
+            steps.append((high_key, range_rows, equal_rows, distinct_range_rows))
+
+        null_count = round(null_rows * scale)
+        non_null = max(total_rows - null_count, 0)
+        # Statistics saw fewer rows than the table may hold now, so key-like counts are scaled up
+        unique_count = _extrapolate_distinct(distinct, max(entry['rows'] - null_rows, 0), non_null)
+        col_profile.update(
+            null_count=null_count,
+            null_percentage=(null_count / total_rows) * 100 if total_rows > 0 else 0,
+            unique_count=unique_count,
+            unique_percentage=(unique_count / total_rows) * 100 if total_rows > 0 else 0,
+            distinct_values=unique_count
+        )
+        if steps and column['data_type'] not in NON_COMPARABLE_TYPES:
+            col_profile['min_value'] = steps[0][0]
+            col_profile['max_value'] = steps[-1][0]
+        if numeric and steps and all(isinstance(step[0], (int, float)) for step in steps):
+            # Rows inside a step are taken to sit halfway between its bounds
+            weighted, counted, previous = 0.0, 0.0, steps[0][0]
+            for high_key, range_rows, equal_rows, distinct_range_rows in steps:
+                weighted += equal_rows * high_key + range_rows * (previous + high_key) / 2
+                counted += equal_rows + range_rows
+                previous = high_key
+            col_profile['avg_value'] = weighted / counted if counted else None
+
+        modified = entry['modification_counter']
+        col_profile['statistics'] = {
+            'last_updated': entry['last_updated'],
+            'rows': entry['rows'],
+            'rows_sampled': entry['rows_sampled'],
+            'modification_counter': modified,
+            'modified_percentage': (modified / entry['rows']) * 100 if entry['rows'] else None,
+            'stale': modified > stats_stale_threshold(entry['rows'])
+        }
+        col_profile['histogram'] = [
+            {'high_key': high_key, 'range_rows': range_rows, 'equal_rows': equal_rows,
+             'distinct_range_rows': distinct_range_rows}
+            for high_key, range_rows, equal_rows, distinct_range_rows in steps]
+        col_profile['estimated'] = {
+            metric: _estimate('statistics', None, None, None)
+            for metric in ('null_percentage', 'unique_count', 'min_value', 'max_value', 'avg_value')
+            if col_profile.get(metric) is not None
+        }
+        return col_profile
+
+    def distribution_columns(self, columns: List[Dict]) -> List[int]:
+        """Get the columns that client-side distribution sketches are built for"""
+        return [i for i, column in enumerate(columns)
+                if column['data_type'] in NUMERIC_TYPES + STRING_TYPES + DATE_TYPES]
+
+    def build_scan_query(self, table_name: str, columns: List[Dict], indexes: List[int],
+                         sample_rows: Optional[int] = None, key_index: Optional[int] = None,
+                         is_last: bool = False) -> str:
+        """Build the SELECT that streams the given columns to the client.
+
+        With sample_rows set only a sample is read; with key_index set the
+        statement reads one key range and takes (lower, upper) parameters.
+        """
+        source = quote_table_name(table_name)
+        if sample_rows:
+            source = self.sample_source(source, sample_rows)
+        select_list = ", ".join(quote_identifier(columns[i]['name']) for i in indexes)
+        where = ''
+        if key_index is not None:
+            where = f"\nWHERE {self._range_predicate(columns[key_index]['name'], is_last)}"
+        return f"SELECT {select_list}\nFROM {source}{where}"
+
+    def sketch_rows(self, cursor, columns: List[Dict], indexes: List[int], batch_size: int) -> Dict[str, ColumnSketch]:
+        """Fold the rows of an executed scan into one sketch per column, batch by batch"""
+        sketches = {columns[i]['name']: ColumnSketch(numeric=columns[i]['data_type'] in NUMERIC_TYPES)
+                    for i in indexes}
+        names = [columns[i]['name'] for i in indexes]
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for name, values in zip(names, zip(*rows)):
+                sketches[name].update(values)
+        return sketches
+
+    def range_key(self, columns: List[Dict]) -> Optional[int]:
+        """Get the index of a single-column integer or date primary key to split on"""
+        keys = [i for i, column in enumerate(columns) if column.get('is_primary_key')]
+        if len(keys) == 1 and columns[keys[0]]['data_type'] in RANGE_KEY_TYPES:
+            return keys[0]
+        return None
+
+    def split_range(self, low, high, partitions: int) -> List[Tuple]:
+        """Split [low, high] into up to `partitions` (lower, upper, is_last) key ranges"""
+        if low is None or high is None:
+            return []
+        if isinstance(low, int):
+            bounds = [low + (high - low + 1) * i // partitions for i in range(partitions)]
+        else:
+            bounds = [low + (high - low) * i / partitions for i in range(partitions)]
+        bounds = sorted(set(bounds))
+        ranges = [(lower, upper, False) for lower, upper in zip(bounds, bounds[1:])]
+        ranges.append((bounds[-1], high, True))
+        return ranges
+
+    def build_range_queries(self, table_name: str, columns: List[Dict], key_index: int, is_last: bool,
+                            lower_exclusive: bool = False) -> List[Tuple[str, List[Tuple[int, str]]]]:
+        """Build mergeable partial aggregates for one key range.
+
+        Averages become sums and distinct counts are left to sketches, except on
+        the key itself: ranges are disjoint, so its distinct counts simply add up.
+        The statements take (lower, upper) parameters.
+        """
+        metrics = []
+        for index, column in enumerate(columns):
+            column_list = ['sum' if metric == 'avg' else metric
+                           for metric in column_metrics(column['data_type']) if metric != 'distinct']
+            if index == key_index:
+                column_list.append('distinct')
+            metrics.append(column_list)
+        where = f"\nWHERE {self._range_predicate(columns[key_index]['name'], is_last, lower_exclusive)}"
+        return self._aggregate_statements(quote_table_name(table_name), columns, metrics, where)
+
+    def sketch_columns(self, columns: List[Dict], key_index: int) -> List[int]:
+        """Get the columns whose distinct counts are merged through sketches"""
+        return [i for i, column in enumerate(columns)
+                if i != key_index and 'distinct' in column_metrics(column['data_type'])]
+
+    def build_sketch_query(self, table_name: str, columns: List[Dict], key_index: int,
+                           is_last: bool, precision: int = SKETCH_PRECISION,
+                           lower_exclusive: bool = False) -> Optional[str]:
+        """Build one statement that returns HyperLogLog registers for every sketched column.
+
+        Rows are unpivoted into (column, hash) pairs so a single scan of the
+        range yields (ColumnIndex, Bucket, Rank) rows, at most 2 ** precision
+        per column. CHECKSUM values are scrambled with the same steps as
+        sketches.mix32, and bucket and rank follow HyperLogLog.add_hash.
+        """
+        indexes = self.sketch_columns(columns, key_index)
+        if not indexes:
+            return None
+        size = 1 << precision
+        max_rank = HyperLogLog.hash_bits - precision + 1
+        hashes = ",\n        ".join(
+            f"({i}, CASE WHEN {quote_identifier(columns[i]['name'])} IS NULL THEN NULL "
+            f"ELSE CAST(CHECKSUM({quote_identifier(columns[i]['name'])}) AS bigint) & 4294967295 END)"
+            for i in indexes)
+        return f"""SELECT s.ColumnIndex, s.Bucket, MAX(s.Rank) AS Rank
+FROM {quote_table_name(table_name)}
+CROSS APPLY (VALUES
+        {hashes}) AS u(ColumnIndex, Hash)
+CROSS APPLY (SELECT ((u.Hash ^ (u.Hash / 65536)) * {MIX_MULTIPLIER}) & 4294967295 AS Hash) AS m1
+CROSS APPLY (SELECT ((m1.Hash ^ (m1.Hash / 65536)) * {MIX_MULTIPLIER}) & 4294967295 AS Hash) AS m2
+CROSS APPLY (SELECT m2.Hash ^ (m2.Hash / 65536) AS Hash) AS m3
+CROSS APPLY (SELECT m3.Hash % {size} AS Bucket, m3.Hash / {size} AS Rest) AS b
+CROSS APPLY (SELECT u.ColumnIndex AS ColumnIndex,
+                    b.Bucket AS Bucket,
+                    CASE WHEN b.Rest = 0 THEN {max_rank}
+                         ELSE CAST(ROUND(LOG(b.Rest & -b.Rest, 2), 0) AS int) + 1 END AS Rank) AS s
+WHERE u.Hash IS NOT NULL AND {self._range_predicate(columns[key_index]['name'], is_last, lower_exclusive)}
+GROUP BY s.ColumnIndex, s.Bucket"""
+
+    def profile_range(self, cursor, table_name: str, columns: List[Dict], key_index: int, key_range: Tuple,
+                      lower_exclusive: bool = False) -> Dict:
+        """Compute the partial aggregates and sketches of one key range"""
+        lower, upper, is_last = key_range
+        stats = [{} for _ in columns]
+        queries = self.build_range_queries(table_name, columns, key_index, is_last, lower_exclusive)
+        rows = self._run_queries(cursor, queries, stats, (lower, upper)) or 0
+
+        sketches = {i: HyperLogLog(SKETCH_PRECISION) for i in self.sketch_columns(columns, key_index)}
+        sketch_sql = self.build_sketch_query(table_name, columns, key_index, is_last,
+                                             lower_exclusive=lower_exclusive)
+        if sketch_sql:
+            cursor.execute(sketch_sql, (lower, upper))
+            for column_index, bucket, rank in cursor.fetchall():
+                sketches[column_index].update(bucket, rank)
+        return {'rows': rows, 'stats': stats, 'sketches': sketches}
+
+    def merge_partials(self, columns: List[Dict], partials: List[Dict]) -> Dict:
+        """Fold key-range partials into one partial; the inputs are left unchanged"""
+        merged = [{} for _ in columns]
+        sketches = {}
+        for partial in partials:
+            for target, stats in zip(merged, partial['stats']):
+                for metric, value in stats.items():
+                    if value is None:
+                        continue
+                    if metric not in target or target[metric] is None:
+                        target[metric] = value
+                    elif metric == 'min':
+                        target[metric] = min(target[metric], value)
+                    elif metric == 'max':
+                        target[metric] = max(target[metric], value)
+                    else:
+                        target[metric] += value
+            for index, sketch in partial['sketches'].items():
+                if index in sketches:
+                    sketches[index].merge(sketch)
+                else:
+                    sketches[index] = HyperLogLog(sketch.precision, sketch.registers)
+        return {'rows': sum(partial['rows'] for partial in partials), 'stats': merged, 'sketches': sketches}
+
+    def version_column(self, columns: List[Dict]) -> Optional[int]:
+        """Get the index of a rowversion column, if the table has one"""
+        for index, column in enumerate(columns):
+            if column['data_type'] in VERSION_TYPES:
+                return index
+        return None
+
+    def build_version_query(self, table_name: str, columns: List[Dict], key_index: int,
+                            ranges: List[Tuple], version_index: Optional[int] = None) -> str:
+        """Build one statement returning (RangeIndex, RowCounts, Version) for every key range.
+
+        ranges holds (lower, upper, is_last, lower_exclusive) tuples and the
+        statement takes their bounds as parameters in order. Each branch is a
+        seek on the key, and Version is the largest rowversion in the range, or
+        NULL when version_index is None.
+        """
+        version = (f"MAX({quote_identifier(columns[version_index]['name'])})"
+                   if version_index is not None else "NULL")
+        branches = [
+            f"SELECT {index} AS RangeIndex, {self.count_function}(*) AS RowCounts, {version} AS Version "
+            f"FROM {quote_table_name(table_name)} "
+            f"WHERE {self._range_predicate(columns[key_index]['name'], is_last, lower_exclusive)}"
+            for index, (lower, upper, is_last, lower_exclusive) in enumerate(ranges)]
+        return "\nUNION ALL\n".join(branches)
+
+    def merge_ranges(self, table_name: str, columns: List[Dict], partials: List[Dict]) -> Dict:
+        """Merge the partial aggregates of every key range into one profile dict"""
+        merged = self.merge_partials(columns, partials)
+        total_rows = merged['rows']
+        sketches = merged['sketches']
+        profile_data = {
+            'table_name': table_name,
+            'total_rows': total_rows,
+            'mode': 'partitioned',
+            'sample_rows': None,
+            'sample_method': None,
+            'partitions': len(partials),
+            'estimated': {},
+            'columns': []
+        }
+        for index, (column, stats) in enumerate(zip(columns, merged['stats'])):
+            # Stored partials are merged again later, so derived values go on a copy
+            stats = dict(stats)
+            if stats.get('sum') is not None and stats.get('non_null'):
+                stats['avg'] = stats['sum'] / stats['non_null']
+            stats.setdefault('non_null', 0)
+            col_profile = self._column_profile(column, stats, total_rows)
+            if index in sketches:
+                sketch = sketches[index]
+                estimate = min(round(sketch.estimate()), stats['non_null'])
+                margin = Z_95 * sketch.relative_error
+                col_profile['unique_count'] = estimate
+                col_profile['distinct_values'] = estimate
+                col_profile['unique_percentage'] = (estimate / total_rows) * 100 if total_rows > 0 else 0
+                col_profile['estimated'] = {
+                    'unique_count': _estimate('hll', estimate * (1 - margin), estimate * (1 + margin), 0.95)
+                }
+            profile_data['columns'].append(col_profile)
+        return profile_data
+
+    def _range_predicate(self, key_name: str, is_last: bool, lower_exclusive: bool = False) -> str:
+        """WHERE condition selecting one key range; the last range includes its upper bound"""
+        key = quote_identifier(key_name)
+        return f"{key} {'>' if lower_exclusive else '>='} ? AND {key} {'<=' if is_last else '<'} ?"
+
+    def _column_profile(self, column: Dict, stats: Dict, total_rows: int) -> Dict:
+        """Turn the raw aggregates of one column into its profile entry"""
+        null_count = total_rows - stats.get('non_null', total_rows)
+        unique_count = stats.get('distinct', 0) or 0
+        return {
+            'name': column['name'],
+            'data_type': column['data_type'],
+            'null_count': null_count,
+            'null_percentage': (null_count / total_rows) * 100 if total_rows > 0 else 0,
+            'unique_count': unique_count,
+            'unique_percentage': (unique_count / total_rows) * 100 if total_rows > 0 else 0,
+            'min_value': stats.get('min'),
+            'max_value': stats.get('max'),
+            'avg_value': stats.get('avg'),
+            'distinct_values': unique_count,
+            'estimated': {}
+        }
+
+    def _sampled_column_profile(self, column: Dict, stats: Dict, sample_size: int, total_rows: int,
+                                sample_method: str) -> Dict:
+        """Scale the sample aggregates of one column and attach their error bounds"""
+        col_profile = self._column_profile(column, stats, sample_size)
+        # The first rows of a table are not a random sample, so no confidence can be claimed
+        confidence = 0.95 if sample_method == 'tablesample' else None
+        estimated = {}
+        if sample_size == 0:
+            col_profile['estimated'] = estimated
+            return col_profile
+
+        # Finite population correction: a sample covering the whole table has no error
+        fpc = math.sqrt((total_rows - sample_size) / (total_rows - 1)) if total_rows > sample_size else 0.0
+
+        null_fraction = col_profile['null_count'] / sample_size
+        margin = Z_95 * math.sqrt(null_fraction * (1 - null_fraction) / sample_size) * fpc
+        col_profile['null_count'] = round(null_fraction * total_rows)
+        col_profile['null_percentage'] = null_fraction * 100
+        estimated['null_percentage'] = _estimate(
+            'sample', max(null_fraction - margin, 0) * 100, min(null_fraction + margin, 1) * 100, confidence)
+
+        sample_non_null = sample_size - round(null_fraction * sample_size)
+        population_non_null = total_rows - col_profile['null_count']
+        if 'approx_distinct' in stats:
+            unique_count = stats['approx_distinct'] or 0
+            estimated['unique_count'] = _estimate(
+                'hll', unique_count * (1 - HLL_RELATIVE_ERROR), unique_count * (1 + HLL_RELATIVE_ERROR), HLL_CONFIDENCE)
+        elif 'distinct' in stats:
+            sample_distinct = stats['distinct'] or 0
+            unique_count = _extrapolate_distinct(sample_distinct, sample_non_null, population_non_null)
+            # Every unseen row could be a new value, so the upper bound is loose
+            estimated['unique_count'] = _estimate(
+                'sample', sample_distinct, sample_distinct + max(population_non_null - sample_non_null, 0), None)
+        else:
+            unique_count = 0
+        col_profile['unique_count'] = unique_count
+        col_profile['distinct_values'] = unique_count
+        col_profile['unique_percentage'] = (unique_count / total_rows) * 100 if total_rows > 0 else 0
+
+        if col_profile['avg_value'] is not None and stats.get('stdev') is not None and sample_non_null > 0:
+            margin = Z_95 * stats['stdev'] / math.sqrt(sample_non_null) * fpc
+            estimated['avg_value'] = _estimate(
+                'sample', col_profile['avg_value'] - margin, col_profile['avg_value'] + margin, confidence)
+
+        # Sample extremes only bound the true ones, so no confidence is attached
+        if col_profile['min_value'] is not None:
+            estimated['min_value'] = _estimate('sample', None, col_profile['min_value'], None)
+        if col_profile['max_value'] is not None:
+            estimated['max_value'] = _estimate('sample', col_profile['max_value'], None, None)
+
+        col_profile['estimated'] = estimated
+        return col_profile
+
+
+def _layout_columns(layout: List[Tuple[int, str]]) -> List[int]:
+    """Get the column indexes a statement covers, in order, without the row count slot"""
+    return list(dict.fromkeys(index for index, metric in layout if index >= 0))
+
+
+def _estimate(method: str, lower, upper, confidence: Optional[float]) -> Dict:
+    """Describe how an estimated metric was derived and how far off it may be"""
+    return {'method': method, 'lower': lower, 'upper': upper, 'confidence': confidence}
+
+
+def _extrapolate_distinct(sample_distinct: int, sample_non_null: int, population_non_null: int) -> int:
+    """Estimate a column's distinct count from the distinct values seen in a sample"""
+    if sample_non_null <= 0:
+        return 0
+    ratio = sample_distinct / sample_non_null
+    # Key-like columns keep producing new values, so scale them with the table.
+    # Low-cardinality columns saturate quickly, so the sample count is the estimate.
+    if ratio >= 0.95:
+        return round(ratio * population_non_null)
+    return sample_distinct
@@ -0,0 +1,256 @@
+import json
+from array import array
+from collections.abc import Mapping, MutableMapping, Sequence
+from typing import Dict, Iterable, List, Optional, TextIO, Tuple
+
+from store import dumps, loads
+
+# Marks a field a record does not have, as opposed to one holding None
+_MISSING = object()
+
+_INT64_MIN, _INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+def _pack(values: List):
+    """Store an all-bool field as a bytearray and an all-int field as array('q'), else keep the list"""
+    if values and all(type(value) is bool for value in values):
+        return bytearray(values)
+    if values and all(type(value) is int and _INT64_MIN <= value <= _INT64_MAX for value in values):
+        return array('q', values)
+    return values
+
+
+class Records(Sequence):
+    """Column-oriented list of records that share their field names.
+
+    Each field is stored once as a column: bool and int columns without
+    NULLs are packed into bytes and machine integers, everything else stays
+    a list. Indexing and iteration give RecordView objects, dict-compatible
+    views onto one row, so code written against lists of dicts keeps working
+    while a wide schema or profile holds a handful of columns instead of one
+    dict per row. to_dicts() materializes plain dicts when a caller needs them.
+    """
+
+    __slots__ = ('_columns', '_length')
+
+    def __init__(self, columns: Dict[str, Sequence], length: Optional[int] = None):
+        self._columns = {name: _pack(list(values)) if isinstance(values, list) else values
+                         for name, values in columns.items()}
+        if length is None:
+            length = len(next(iter(self._columns.values()))) if self._columns else 0
+        self._length = length
+
+    @classmethod
+    def from_dicts(cls, rows: Iterable[Mapping]) -> 'Records':
+        """Build records from dicts; fields missing from some rows stay missing in their views"""
+        if isinstance(rows, Records):
+            return rows
+        rows = list(rows)
+        fields = list(dict.fromkeys(field for row in rows for field in row))
+        return cls({field: [row.get(field, _MISSING) for row in rows] for field in fields}, len(rows))
+
+    @property
+    def fields(self) -> List[str]:
+        return list(self._columns)
+
+    def column(self, field: str) -> List:
+        """All values of one field, with None for rows that lack it"""
+        values = self._columns[field]
+        if isinstance(values, bytearray):
+            return [bool(value) for value in values]
+        return [None if value is _MISSING else value for value in values]
+
+    def value(self, index: int, field: str):
+        """One row's value of a field; raises KeyError if the row lacks it"""
+        values = self._columns.get(field)
+        if values is None:
+            raise KeyError(field)
+        value = values[index]
+        if value is _MISSING:
+            raise KeyError(field)
+        return bool(value) if isinstance(values, bytearray) else value
+
+    def set_value(self, index: int, field: str, value):
+        """Change one row's value, unpacking the column if the value no longer fits it"""
+        values = self._columns.get(field)
+        if values is None:
+            values = self._columns[field] = [_MISSING] * self._length
+        elif not isinstance(values, list):
+            fits = (type(value) is bool) if isinstance(values, bytearray) else \
+                (type(value) is int and _INT64_MIN <= value <= _INT64_MAX)
+            if fits:
+                values[index] = value
+                return
+            values = self._columns[field] = [bool(v) for v in values] if isinstance(values, bytearray) else list(values)
+        values[index] = value
+
+    def has_value(self, index: int, field: str) -> bool:
+        values = self._columns.get(field)
+        return values is not None and values[index] is not _MISSING
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return Records({field: values[index] for field, values in self._columns.items()},
+                           len(range(*index.indices(self._length))))
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("record index out of range")
+        return RecordView(self, index)
+
+    def __iter__(self):
+        for index in range(self._length):
+            yield RecordView(self, index)
+
+    def __eq__(self, other):
+        if not isinstance(other, Sequence) or isinstance(other, (str, bytes)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __repr__(self):
+        return f"Records({self._length} rows, fields={self.fields})"
+
+    def to_dicts(self) -> List[Dict]:
+        """Materialize every record as a plain dict"""
+        return [view.to_dict() for view in self]
+
+    def rows(self) -> Iterable[Tuple]:
+        """Yield each record as a tuple of values in field order, with _MISSING for absent fields"""
+        columns = [self.column(field) if isinstance(values, bytearray) else values
+                   for field, values in self._columns.items()]
+        return zip(*columns)
+
+    def to_jsonl(self, file: TextIO, metadata: Optional[Dict] = None):
+        """Write a header line with the field names, then one JSON array per record.
+
+        Values use the same tagged encoding as ProfileStore, so dates,
+        decimals and sketches come back as the same types; absent fields are
+        written as {"$missing": 1}.
+        """
+        file.write(dumps({'fields': self.fields, 'rows': self._length, 'metadata': metadata or {}}) + "\n")
+        for row in self.rows():
+            file.write(dumps([{'$missing': 1} if value is _MISSING else value for value in row]) + "\n")
+
+    @classmethod
+    def from_jsonl(cls, file: TextIO) -> Tuple['Records', Dict]:
+        """Read records written by to_jsonl, returning (records, metadata)"""
+        header = loads(file.readline())
+        fields = header['fields']
+        columns = [[] for _ in fields]
+        for line in file:
+            for values, value in zip(columns, loads(line)):
+                values.append(_MISSING if isinstance(value, dict) and value.get('$missing') == 1 else value)
+        return cls(dict(zip(fields, columns)), header['rows']), header['metadata']
+
+    def to_arrow(self, metadata: Optional[Dict] = None):
+        """Convert to a pyarrow Table, one Arrow column per field.
+
+        Fields whose values Arrow cannot type as one column (dicts, mixed
+        types) are stored as tagged-JSON strings and decoded again by
+        from_arrow. In fields some records lack, nulls read back as absent.
+        """
+        import pyarrow as pa
+
+        arrays, fields = [], []
+        for name, values in self._columns.items():
+            optional = isinstance(values, list) and any(value is _MISSING for value in values)
+            plain = self.column(name)
+            encoding = None
+            try:
+                if any(isinstance(value, (dict, list, tuple, bytes)) for value in plain):
+                    raise pa.ArrowInvalid("nested")
+                column = pa.array(plain)
+                if pa.types.is_null(column.type) and plain:
+                    column = pa.array(plain, type=pa.string())
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                column = pa.array([None if value is None else dumps(value) for value in plain], type=pa.string())
+                encoding = 'json'
+            field_metadata = {}
+            if encoding:
+                field_metadata['encoding'] = encoding
+            if optional:
+                field_metadata['optional'] = '1'
+            arrays.append(column)
+            fields.append(pa.field(name, column.type, metadata=field_metadata or None))
+        schema = pa.schema(fields, metadata={'records': json.dumps({'metadata': metadata or {}}, default=str)})
+        return pa.Table.from_arrays(arrays, schema=schema)
+
+    @classmethod
+    def from_arrow(cls, table) -> Tuple['Records', Dict]:
+        """Rebuild records from a Table made by to_arrow, returning (records, metadata)"""
+        columns = {}
+        for field in table.schema:
+            field_metadata = field.metadata or {}
+            values = table.column(field.name).to_pylist()
+            if field_metadata.get(b'encoding') == b'json':
+                values = [None if value is None else loads(value) for value in values]
+            if field_metadata.get(b'optional') == b'1':
+                values = [_MISSING if value is None else value for value in values]
+            columns[field.name] = values
+        info = json.loads((table.schema.metadata or {}).get(b'records', b'{}'))
+        return cls(columns, table.num_rows), info.get('metadata', {})
+
+    def write_arrow(self, sink, metadata: Optional[Dict] = None):
+        """Write the records as an Arrow IPC stream to a path or writable file"""
+        import pyarrow as pa
+
+        table = self.to_arrow(metadata)
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+
+    @classmethod
+    def read_arrow(cls, source) -> Tuple['Records', Dict]:
+        """Read records from an Arrow IPC stream written by write_arrow"""
+        import pyarrow as pa
+
+        with pa.ipc.open_stream(source) as reader:
+            return cls.from_arrow(reader.read_all())
+
+
+class RecordView(MutableMapping):
+    """Dict-compatible view of one row of a Records container; writes go to the container"""
+
+    __slots__ = ('_records', '_index')
+
+    def __init__(self, records: Records, index: int):
+        self._records = records
+        self._index = index
+
+    def __getitem__(self, field):
+        return self._records.value(self._index, field)
+
+    def __setitem__(self, field, value):
+        self._records.set_value(self._index, field, value)
+
+    def __delitem__(self, field):
+        if not self._records.has_value(self._index, field):
+            raise KeyError(field)
+        self._records.set_value(self._index, field, _MISSING)
+
+    def __contains__(self, field):
+        return self._records.has_value(self._index, field)
+
+    def __iter__(self):
+        return (field for field in self._records._columns if self._records.has_value(self._index, field))
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+    def to_dict(self) -> Dict:
+        return {field: self[field] for field in self}
+
+
+def to_json(value):
+    """json.dumps default hook for results: records become lists of dicts, other values strings"""
+    if isinstance(value, Records):
+        return value.to_dicts()
+    if isinstance(value, RecordView):
+        return value.to_dict()
+    # Dates, decimals and anything else without a JSON form
+    return str(value)
@@ -0,0 +1,127 @@
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import List, Dict, Optional, Tuple
+
+# BM25 term-frequency saturation and length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Search walks query terms from rarest to most common and stops adding common
+# terms once this many postings were scored, which bounds latency on catalogs
+# where a word like "stage" or "customer" appears in thousands of table names
+POSTINGS_BUDGET = 50000
+
+
+def name_terms(text: str) -> List[str]:
+    """Split identifiers and text into words plus their character trigrams.
+
+    snake_case, dotted and CamelCase names are split into words, and each word
+    contributes padded trigrams so that "custmer" still finds "Customers".
+    """
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", text)
+    terms = []
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        terms.append(word)
+        padded = f"#{word}#"
+        terms.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return terms
+
+
+class TableIndex:
+    """BM25 index over table names (and optionally column names) for prompt pruning.
+
+    update() diffs a new table list against the indexed one and only
+    tokenizes tables that were added or whose columns changed, so keeping the
+    index in step with a large catalog costs in proportion to the changes.
+    update() and search() may be called from several threads at once.
+    """
+
+    def __init__(self):
+        self.documents: Dict[str, Tuple[Dict, Counter, int]] = {}
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self.total_length = 0
+        # The table list last indexed without schemas; updating with it again is a no-op
+        self._source = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.documents)
+
+    def update(self, tables: List[Dict], schemas: Optional[Dict[str, Dict]] = None):
+        """Bring the index in line with a table list, with column names from schemas if given"""
+        with self._lock:
+            if schemas is None and tables is self._source:
+                return
+            self._update(tables, schemas or {})
+            self._source = tables if schemas is None else None
+
+    def _update(self, tables: List[Dict], schemas: Dict[str, Dict]):
+        current = {}
+        for table in tables:
+            key = f"{table['schema']}.{table['name']}"
+            current[key] = table
+
+        for key in [key for key in self.documents if key not in current]:
+            self._remove(key)
+
+        for key, table in current.items():
+            columns = schemas.get(key, {}).get('columns') if key in schemas else None
+            indexed = self.documents.get(key)
+            if indexed is not None and columns is None:
+                # Keep previously indexed columns, but pick up new row counts
+                self.documents[key] = (table,) + indexed[1:]
+                continue
+            text = f"{table['schema']} {table['name']}"
+            if columns:
+                text += " " + " ".join(column['name'] for column in columns)
+            terms = Counter(name_terms(text))
+            if indexed is not None and indexed[1] == terms:
+                self.documents[key] = (table,) + indexed[1:]
+                continue
+            if indexed is not None:
+                self._remove(key)
+            self._add(key, table, terms)
+
+    def search(self, query: str, limit: int = 25) -> List[Tuple[Dict, float]]:
+        """Get up to `limit` (table, score) pairs ranked by BM25 relevance to the query"""
+        with self._lock:
+            return self._search(query, limit)
+
+    def _search(self, query: str, limit: int) -> List[Tuple[Dict, float]]:
+        if not self.documents:
+            return []
+        count = len(self.documents)
+        average_length = self.total_length / count
+        walked = 0
+        scores = defaultdict(float)
+        terms = [term for term in set(name_terms(query)) if term in self.postings]
+        for term in sorted(terms, key=lambda term: len(self.postings[term])):
+            postings = self.postings[term]
+            if walked + len(postings) > POSTINGS_BUDGET and scores:
+                break
+            walked += len(postings)
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for key, frequency in postings.items():
+                length = self.documents[key][2]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                scores[key] += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [(self.documents[key][0], score) for key, score in ranked]
+
+    def _add(self, key: str, table: Dict, terms: Counter):
+        length = sum(terms.values())
+        self.documents[key] = (table, terms, length)
+        self.total_length += length
+        for term, frequency in terms.items():
+            self.postings[term][key] = frequency
+
+    def _remove(self, key: str):
+        table, terms, length = self.documents.pop(key)
+        self.total_length -= length
+        for term in terms:
+            postings = self.postings[term]
+            postings.pop(key, None)
+            if not postings:
+                del self.postings[term]
@@ -0,0 +1,255 @@
+import difflib
+import json
+import re
+from collections import defaultdict
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+
+from tools import get_tool_schemas
+
+# Words that describe the request rather than name a table, so they are never fuzzy-matched
+STOPWORDS = {
+    'a', 'about', 'all', 'an', 'analyze', 'and', 'are', 'available', 'columns', 'data', 'database',
+    'describe', 'do', 'fields', 'for', 'give', 'have', 'in', 'is', 'layout', 'list', 'me', 'metrics',
+    'of', 'on', 'profile', 'quality', 'schema', 'show', 'statistics', 'stats', 'structure', 'table',
+    'tables', 'tell', 'the', 'we', 'what', "what's", 'whats', 'which'
+}
+
+# Requests to change data or objects, which no tool serves; they always go to the LLM
+WRITE_WORDS = {
+    'add', 'alter', 'create', 'delete', 'drop', 'exec', 'execute', 'grant', 'insert', 'kill', 'merge',
+    'modify', 'remove', 'rename', 'revoke', 'truncate', 'update', 'upsert'
+}
+
+# Words that carry no intent; they are dropped before questions are vectorized
+FILLER_WORDS = {'a', 'about', 'an', 'are', 'do', 'for', 'in', 'is', 'me', 'of', 'on', 'table', 'the', 'there', 'this', 'to'}
+
+# Stands in for table names in examples and questions, so routing depends on
+# what is asked rather than which table it is asked about
+TABLE_PLACEHOLDER = 'tablename'
+
+
+def char_ngrams(text: str, sizes: Tuple[int, ...] = (2, 3, 4)) -> List[str]:
+    """Split text into character n-grams, padding each word with spaces.
+
+    Filler words and the table placeholder are skipped so that similarity
+    comes from the words that say what is being asked.
+    """
+    grams = []
+    for word in re.findall(r"[a-z0-9_']+", text.lower()):
+        if word in FILLER_WORDS or word == TABLE_PLACEHOLDER:
+            continue
+        padded = f" {word} "
+        for size in sizes:
+            grams.extend(padded[i:i + size] for i in range(len(padded) - size + 1))
+    return grams
+
+
+class TableMatcher:
+    """Finds the table a question refers to by exact, plural-insensitive or fuzzy name match"""
+
+    def __init__(self, tables: List[Dict], cutoff: float = 0.8):
+        self.cutoff = cutoff
+        self.by_name = defaultdict(list)
+        for table in tables:
+            for key in self._keys(table['name']) | self._keys(f"{table['schema']}.{table['name']}"):
+                self.by_name[key].append(table)
+        self.names = list(self.by_name)
+
+    def _keys(self, name: str) -> set:
+        name = name.lower()
+        return {name, name.rstrip('s')}
+
+    def match(self, question: str) -> Tuple[Optional[Dict], float, Optional[str]]:
+        """Get the best matching table, a 0-1 match score and the words that named it"""
+        candidates = self._candidate_words(question)
+        exact = [word for word in candidates if word in self.by_name or word.rstrip('s') in self.by_name]
+        if exact:
+            # Prefer real nouns over request words that happen to name a table
+            exact.sort(key=lambda word: (word in STOPWORDS, -len(word)))
+            word = exact[0]
+            tables = self.by_name.get(word) or self.by_name[word.rstrip('s')]
+            return self._pick(tables), 1.0, word
+
+        best, best_score, best_word = None, 0.0, None
+        for word in candidates:
+            if word in STOPWORDS or len(word) < 3:
+                continue
+            for name in difflib.get_close_matches(word, self.names, n=1, cutoff=self.cutoff):
+                score = difflib.SequenceMatcher(None, word, name).ratio()
+                if score > best_score:
+                    best, best_score, best_word = self._pick(self.by_name[name]), score, word
+        return best, best_score, best_word
+
+    def named(self, question: str) -> List[Tuple[Dict, str]]:
+        """Get (table, word) for every table named exactly, in question order.
+
+        A name written as two words ("order items") replaces matches of its
+        parts, and request words only count when no other word names a table.
+        """
+        exact = [word for word in self._candidate_words(question)
+                 if word in self.by_name or word.rstrip('s') in self.by_name]
+        parts = {part for word in exact if '_' in word for part in word.split('_')}
+        exact = [word for word in exact if word not in parts]
+        # Two-word names are listed after single words; put every name back where it is written
+        text = question.lower()
+        exact.sort(key=lambda word: text.find(word.split('_')[0]))
+        if any(word not in STOPWORDS for word in exact):
+            exact = [word for word in exact if word not in STOPWORDS]
+        named = []
+        for word in exact:
+            table = self._pick(self.by_name.get(word) or self.by_name[word.rstrip('s')])
+            if all(table is not other for other, _ in named):
+                named.append((table, word))
+        return named
+
+    def candidates(self, question: str, limit: int = 3) -> List[Dict]:
+        """Get up to `limit` tables the question may be about, most likely first.
+
+        Every exactly named table is included, so questions that mention several
+        tables yield all of them; without an exact match the best fuzzy match is used.
+        """
+        named = sorted(self.named(question), key=lambda item: (item[1] in STOPWORDS, -len(item[1])))
+        tables = [table for table, word in named]
+        if not tables:
+            table, score, word = self.match(question)
+            if table is not None:
+                tables.append(table)
+        return tables[:limit]
+
+    def _candidate_words(self, question: str) -> List[str]:
+        words = re.findall(r"[a-z0-9_.]+", question.lower())
+        # Multi-word table names are often written with spaces ("order items")
+        return words + ['_'.join(pair) for pair in zip(words, words[1:])]
+
+    def _pick(self, tables: List[Dict]) -> Dict:
+        # The same name in several schemas resolves to dbo first, then alphabetically
+        return sorted(tables, key=lambda table: (table['schema'] != 'dbo', table['schema']))[0]
+
+
+class IntentRouter:
+    """Routes questions to database tools locally, without calling the LLM.
+
+    Tool examples and keywords from tools.py are embedded as character n-gram
+    TF-IDF vectors. A question is routed to the tool of its most similar
+    example when that similarity clears `threshold` and beats the best other
+    tool by `margin`; otherwise route() returns None and the caller should fall
+    back to the LLM.
+    """
+
+    def __init__(self, tools: Optional[List[Dict]] = None, threshold: float = 0.45, margin: float = 0.05):
+        self.tools = tools or get_tool_schemas()
+        self.threshold = threshold
+        self.margin = margin
+        # (table list, matcher), replaced in one assignment so concurrent requests see a matching pair
+        self._matcher = (None, None)
+
+        # Table names in the examples are the words of table-taking tools that are
+        # neither request words nor used by tools without a table parameter
+        table_tools = [tool for tool in self.tools if 'table_name' in tool['parameters']['properties']]
+        request_words = set(STOPWORDS)
+        for tool in self.tools:
+            texts = tool.get('keywords', []) + ([] if tool in table_tools else tool.get('examples', []))
+            request_words.update(word for text in texts for word in self._words(text))
+        self.example_tables = {word for tool in table_tools for text in tool.get('examples', [])
+                               for word in self._words(text)} - request_words
+
+        documents, labels = [], []
+        for tool in self.tools:
+            for text in tool.get('examples', []) + tool.get('keywords', []):
+                documents.append(self._mask_words(text, self.example_tables))
+                labels.append(tool['name'])
+        self.labels = np.array(labels)
+        self.tool_names = [tool['name'] for tool in self.tools]
+
+        self.vocabulary = {}
+        for text in documents:
+            for gram in char_ngrams(text):
+                self.vocabulary.setdefault(gram, len(self.vocabulary))
+        counts = np.zeros((len(documents), len(self.vocabulary)))
+        for row, text in enumerate(documents):
+            for gram in char_ngrams(text):
+                counts[row, self.vocabulary[gram]] += 1
+        document_frequency = np.count_nonzero(counts, axis=0)
+        self.idf = np.log((1 + len(documents)) / (1 + document_frequency)) + 1
+        self.matrix = self._normalize(counts * self.idf)
+
+    def _words(self, text: str) -> List[str]:
+        return re.findall(r"[a-z0-9_']+", text.lower())
+
+    def _mask_words(self, text: str, names) -> str:
+        return " ".join(TABLE_PLACEHOLDER if word in names else word for word in self._words(text))
+
+    def _normalize(self, vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def _vectorize(self, text: str) -> np.ndarray:
+        vector = np.zeros(len(self.vocabulary))
+        for gram in char_ngrams(text):
+            index = self.vocabulary.get(gram)
+            if index is not None:
+                vector[index] += 1
+        return self._normalize(vector * self.idf)
+
+    def classify(self, question: str) -> Tuple[str, float, float]:
+        """Get the best tool, its similarity and its lead over the runner-up tool"""
+        similarities = self.matrix @ self._vectorize(question)
+        scores = sorted(((similarities[self.labels == name].max(), name) for name in self.tool_names), reverse=True)
+        best_score, best_tool = scores[0]
+        runner_up = scores[1][0] if len(scores) > 1 else 0.0
+        return best_tool, float(best_score), float(best_score - runner_up)
+
+    def route(self, question: str, tables: List[Dict]) -> Optional[Dict]:
+        """Resolve a question to {tool_name, parameters, confidence} or None when unsure.
+
+        Questions asking to change data or objects are never routed locally.
+
+        A question naming several tables gets a "calls" list with one call per
+        table, in the format LLMHandler returns for several tool calls.
+        """
+        if WRITE_WORDS.intersection(self._words(question)):
+            return None
+
+        matcher = self._table_matcher(tables)
+        table, match_score, table_words = matcher.match(question)
+        named = matcher.named(question)
+        masked = question.lower()
+        for words in [word for _, word in named] if len(named) > 1 else [table_words] if table_words else []:
+            masked = re.sub(r"[\s_]+".join(map(re.escape, re.split(r"[_.]", words))) + r"\w*",
+                            TABLE_PLACEHOLDER, masked)
+
+        tool_name, score, lead = self.classify(masked)
+        if score < self.threshold or lead < self.margin:
+            return None
+
+        tool = next(tool for tool in self.tools if tool['name'] == tool_name)
+        if 'table_name' not in tool['parameters']['properties']:
+            return {"tool_name": tool_name, "parameters": json.dumps({}), "confidence": score}
+        if table is None:
+            return None
+        if len(named) < 2:
+            named, score = [(table, table_words)], score * match_score
+
+        calls = [{
+            "tool_name": tool_name,
+            "parameters": json.dumps({'table_name': _qualified(named_table)}),
+        } for named_table, _ in named]
+        result = dict(calls[0], confidence=score)
+        if len(calls) > 1:
+            result["calls"] = calls
+        return result
+
+    def _table_matcher(self, tables: List[Dict]) -> TableMatcher:
+        """Build the table name index once per (cached) table list"""
+        matched, matcher = self._matcher
+        if tables is not matched:
+            matcher = TableMatcher(tables)
+            self._matcher = (tables, matcher)
+        return matcher
+
+
+def _qualified(table: Dict) -> str:
+    """Name a table as the tools expect: bare for dbo, schema-qualified otherwise"""
+    return table['name'] if table['schema'] == 'dbo' else f"{table['schema']}.{table['name']}"
@@ -0,0 +1,175 @@
+import io
+import json
+import os
+import socketserver
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+from agent import DatabaseAgent
+from metrics import metrics
+from results import Records, to_json
+
+
+class AgentRequestHandler(BaseHTTPRequestHandler):
+    """JSON API over one long-lived DatabaseAgent.
+
+    GET  /health, /tables, /schema/<table>, /profile/<table>?mode=..., /metrics
+    POST /ask with {"question": "..."} or {"questions": [...]}
+    POST /cancel stops every running profile
+
+    /tables, /schema and /profile also take format=jsonl or format=arrow to
+    receive their rows as Records JSON lines or an Arrow IPC stream, with
+    the remaining fields (table name, row totals) as metadata.
+    """
+
+    server_version = "DatabaseAgent/1.0"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [unquote(part) for part in url.path.strip('/').split('/') if part]
+        query = parse_qs(url.query)
+        data_format = query.get('format', ['json'])[0]
+        agent = self.server.agent
+        if parts == ['health']:
+            self._send({'status': 'ok'})
+        elif parts == ['metrics']:
+            self._send_text(metrics.prometheus_text())
+        elif parts == ['tables']:
+            tables = agent.db.list_tables()
+            if data_format != 'json':
+                self._send_records(Records.from_dicts(tables), {}, data_format)
+            else:
+                self._send({'tables': tables})
+        elif len(parts) == 2 and parts[0] in ('schema', 'profile'):
+            if parts[0] == 'schema':
+                result = agent.db.get_table_schema(parts[1])
+            else:
+                result = agent.db.profile_table(parts[1], mode=query.get('mode', [None])[0])
+            if data_format != 'json' and result:
+                metadata = {key: value for key, value in result.items() if key != 'columns'}
+                self._send_records(Records.from_dicts(result['columns']), metadata, data_format)
+            else:
+                self._send({parts[0]: result})
+        else:
+            self._send({'error': f"Unknown path: {url.path}"}, 404)
+
+    def do_POST(self):
+        path = urlparse(self.path).path.rstrip('/')
+        if path == '/cancel':
+            self._send({'cancelled': self.server.agent.db.cancel_profiles()})
+            return
+        if path != '/ask':
+            self._send({'error': f"Unknown path: {self.path}"}, 404)
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        except ValueError as e:
+            self._send({'error': f"Invalid JSON: {str(e)}"}, 400)
+            return
+
+        agent = self.server.agent
+        if isinstance(request.get('questions'), list):
+            self._send({'answers': agent.process_questions(request['questions'], display=False)})
+        elif isinstance(request.get('question'), str):
+            with metrics.span('question'):
+                self._send({'answer': agent.answer(request['question'])})
+        else:
+            self._send({'error': "Expected a 'question' string or a 'questions' list"}, 400)
+
+    def _send(self, payload, status=200):
+        # Profiles can hold dates and decimals, which clients receive as strings
+        self._send_text(json.dumps(payload, default=to_json), status, 'application/json')
+
+    def _send_records(self, records, metadata, data_format):
+        """Send records as JSON lines or an Arrow IPC stream"""
+        if data_format == 'jsonl':
+            text = io.StringIO()
+            records.to_jsonl(text, metadata)
+            self._send_text(text.getvalue(), content_type='application/x-ndjson')
+        elif data_format == 'arrow':
+            body = io.BytesIO()
+            records.write_arrow(body, metadata)
+            self._send_bytes(body.getvalue(), 200, 'application/vnd.apache.arrow.stream')
+        else:
+            self._send({'error': f"Unknown format: {data_format}"}, 400)
+
+    def _send_text(self, text, status=200, content_type='text/plain; version=0.0.4'):
+        self._send_bytes(text.encode(), status, content_type)
+
+    def _send_bytes(self, body, status, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix socket peers have no address
+        return self.client_address[0] if self.client_address else 'local'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """HTTP server on a Unix domain socket, one thread per request"""
+
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        super().server_bind()
+
+
+def create_server(agent: DatabaseAgent, host: str = '127.0.0.1', port: int = 8765,
+                  socket_path: str = None, verbose: bool = False):
+    """Build the HTTP server for an agent, on a Unix socket when socket_path is given"""
+    if socket_path:
+        server = UnixHTTPServer(socket_path, AgentRequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), AgentRequestHandler)
+    server.agent = agent
+    server.verbose = verbose
+    return server
+
+
+def serve(host: str = None, port: int = None, socket_path: str = None, verbose: bool = False):
+    """Run the agent daemon until interrupted.
+
+    The agent, its pooled connections, catalog cache and LLM client are built
+    once and shared by every request, so a question costs only its own work.
+    Requests are handled concurrently, each on its own thread.
+    """
+    host = host or os.getenv('AGENT_HOST', '127.0.0.1')
+    port = port or int(os.getenv('AGENT_PORT', '8765'))
+    socket_path = socket_path or os.getenv('AGENT_SOCKET')
+
+    agent = DatabaseAgent()
+    # Opens the first pooled connection, which stays warm for the first request
+    if not agent.db.connect():
+        print("Agent failed to connect to the database.")
+        return 1
+    # Load the table list before the first question arrives
+    agent.db.list_tables()
+    # Concurrent batch requests share one event loop, async LLM client and its limits
+    agent.start_event_loop()
+
+    server = create_server(agent, host, port, socket_path, verbose)
+    print(f"Database agent listening on {socket_path or f'http://{host}:{port}'}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+        agent.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(serve(verbose='-v' in sys.argv[1:]))
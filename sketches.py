@@ -0,0 +1,336 @@
+import math
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+# Multiplier of the 32-bit integer finalizer below. It stays under 2**31 so the
+# same steps can run in T-SQL bigint arithmetic without overflowing.
+MIX_MULTIPLIER = 0x45D9F3B
+
+
+def mix32(value: int) -> int:
+    """Scramble a 32-bit value so sequential inputs give well-spread hashes"""
+    value &= 0xFFFFFFFF
+    value = ((value ^ (value >> 16)) * MIX_MULTIPLIER) & 0xFFFFFFFF
+    value = ((value ^ (value >> 16)) * MIX_MULTIPLIER) & 0xFFFFFFFF
+    return value ^ (value >> 16)
+
+
+def mix32_array(values: np.ndarray) -> np.ndarray:
+    """Vectorized mix32 over an array of 32-bit values"""
+    values = values.astype(np.uint64) & 0xFFFFFFFF
+    values = ((values ^ (values >> 16)) * MIX_MULTIPLIER) & 0xFFFFFFFF
+    values = ((values ^ (values >> 16)) * MIX_MULTIPLIER) & 0xFFFFFFFF
+    return values ^ (values >> 16)
+
+
+def hash_values(values: Sequence, numeric: bool = False) -> np.ndarray:
+    """Hash non-null column values to 32-bit sketch hashes.
+
+    Numbers hash their float64 bits and everything else its text form through
+    CRC-32, so hashes are stable across processes and runs (unlike hash()).
+    They differ from the server-side CHECKSUM hashes, so client and server
+    sketches must not be merged with each other.
+    """
+    if numeric:
+        bits = np.asarray(values, dtype=np.float64).view(np.uint64)
+        folded = (bits ^ (bits >> 32)) & 0xFFFFFFFF
+    else:
+        folded = np.fromiter((zlib.crc32(str(value).encode()) for value in values),
+                             dtype=np.uint64, count=len(values))
+    return mix32_array(folded)
+
+
+class HyperLogLog:
+    """Mergeable distinct-count sketch over 32-bit hashes.
+
+    The low `precision` bits of a hash pick a register and the register keeps
+    the largest rank (position of the lowest set bit, 1-based) seen in the
+    remaining bits. Sketches built over disjoint ranges merge by taking the
+    register-wise maximum, which gives the same result as one sketch over all
+    rows. Relative standard error is about 1.04 / sqrt(2 ** precision).
+    """
+
+    hash_bits = 32
+
+    def __init__(self, precision: int = 10, registers: Optional[Iterable[int]] = None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.size)
+
+    @property
+    def max_rank(self) -> int:
+        """Rank recorded when every remaining hash bit is zero"""
+        return self.hash_bits - self.precision + 1
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(self.size)
+
+    def add_hash(self, value: int):
+        """Record one 32-bit hash value, already passed through mix32"""
+        value &= 0xFFFFFFFF
+        bucket = value & (self.size - 1)
+        rest = value >> self.precision
+        rank = (rest & -rest).bit_length() if rest else self.max_rank
+        self.update(bucket, rank)
+
+    def add_hashes(self, hashes: np.ndarray):
+        """Record an array of mixed 32-bit hashes at once"""
+        hashes = np.asarray(hashes, dtype=np.uint64) & 0xFFFFFFFF
+        buckets = (hashes & (self.size - 1)).astype(np.intp)
+        rest = hashes >> self.precision
+        lowest = rest & (~rest + np.uint64(1))
+        ranks = np.where(rest == 0, self.max_rank,
+                         np.log2(np.maximum(lowest, 1).astype(np.float64)).astype(np.int64) + 1)
+        registers = np.frombuffer(self.registers, dtype=np.uint8)
+        np.maximum.at(registers, buckets, ranks.astype(np.uint8))
+
+    def update(self, bucket: int, rank: int):
+        """Raise one register, as when loading registers computed by the server"""
+        if rank > self.registers[bucket]:
+            self.registers[bucket] = rank
+
+    def merge(self, other: 'HyperLogLog') -> 'HyperLogLog':
+        """Fold another sketch with the same precision into this one"""
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches with different precision")
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+        return self
+
+    def estimate(self) -> float:
+        """Estimate the number of distinct hashes recorded"""
+        m = self.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            # Linear counting is more accurate while many registers are empty
+            return m * math.log(m / zeros)
+        space = 2.0 ** self.hash_bits
+        if raw > space / 30:
+            # Hash collisions start to hide distinct values near the 32-bit limit
+            return -space * math.log(1 - raw / space)
+        return raw
+
+
+class KLLSketch:
+    """Mergeable quantile sketch (KLL) over numeric values.
+
+    Level h holds items that each stand for 2 ** h inputs. A level over its
+    capacity is sorted and every other item, from a random offset, moves up
+    a level, so memory stays around 3 * k items however many values are added
+    and the rank error is about 1.7 / k. Batches are added and compacted
+    with NumPy.
+    """
+
+    def __init__(self, k: int = 200, seed: Optional[int] = None):
+        self.k = k
+        self.count = 0
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(int(math.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def update(self, values):
+        """Add an array of values; NaNs are ignored"""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.count += len(values)
+        self._compress()
+
+    def merge(self, other: 'KLLSketch') -> 'KLLSketch':
+        """Fold another sketch into this one"""
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self._compress()
+        return self
+
+    def _compress(self):
+        while True:
+            over = [level for level in range(len(self.levels)) if len(self.levels[level]) > self._capacity(level)]
+            if not over:
+                return
+            level = over[0]
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            items = np.sort(self.levels[level])
+            # An odd item out stays behind so the promoted half keeps exact weight
+            keep = items[:len(items) % 2]
+            items = items[len(items) % 2:]
+            promoted = items[self._rng.integers(2)::2]
+            self.levels[level] = keep
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+
+    def _weighted(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2.0 ** level) for level, items in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        return items[order], weights[order]
+
+    def quantiles(self, fractions: Sequence[float]) -> List[Optional[float]]:
+        """Estimate the values at the given fractions (0-1) of the distribution"""
+        if not self.count:
+            return [None for _ in fractions]
+        items, weights = self._weighted()
+        cumulative = np.cumsum(weights)
+        positions = np.searchsorted(cumulative, np.asarray(fractions) * cumulative[-1], side='left')
+        return [float(items[min(position, len(items) - 1)]) for position in positions]
+
+    def histogram(self, bins: int = 10):
+        """Estimate (bin edges, counts) of an equal-width histogram"""
+        if not self.count:
+            return [], []
+        items, weights = self._weighted()
+        counts, edges = np.histogram(items, bins=bins, weights=weights)
+        return edges.tolist(), np.round(counts).astype(int).tolist()
+
+    def state(self) -> Dict:
+        return {'k': self.k, 'count': self.count, 'levels': [items.tolist() for items in self.levels]}
+
+    @classmethod
+    def from_state(cls, state: Dict) -> 'KLLSketch':
+        sketch = cls(state['k'])
+        sketch.count = state['count']
+        sketch.levels = [np.asarray(items, dtype=np.float64) for items in state['levels']]
+        return sketch
+
+
+class MisraGries:
+    """Mergeable top-k summary of the most frequent values.
+
+    At most k counters are kept. When more are needed, the (k+1)-th largest
+    count is subtracted from every counter and those left at zero dropped, so
+    each reported count undercounts by at most `error` and any value more
+    frequent than n / (k + 1) is guaranteed to be kept.
+    """
+
+    def __init__(self, k: int = 64):
+        self.k = k
+        self.counters: Dict = {}
+        self.error = 0
+
+    def update(self, values: Iterable):
+        """Add a batch of hashable values"""
+        self._add(Counter(values))
+
+    def merge(self, other: 'MisraGries') -> 'MisraGries':
+        """Fold another summary into this one"""
+        self.error += other.error
+        self._add(other.counters)
+        return self
+
+    def _add(self, counts):
+        for value, count in counts.items():
+            self.counters[value] = self.counters.get(value, 0) + count
+        if len(self.counters) > self.k:
+            values = list(self.counters)
+            totals = np.fromiter(self.counters.values(), dtype=np.int64, count=len(values))
+            cut = int(np.partition(totals, len(totals) - self.k - 1)[len(totals) - self.k - 1])
+            self.error += cut
+            self.counters = {value: int(total) - cut for value, total in zip(values, totals) if total > cut}
+
+    def top(self, n: int = 10) -> List[Dict]:
+        """Most frequent values with their (lower bound) counts, largest first"""
+        ranked = sorted(self.counters.items(), key=lambda item: item[1], reverse=True)[:n]
+        return [{'value': value, 'count': count, 'max_count': count + self.error} for value, count in ranked]
+
+    def state(self) -> Dict:
+        return {'k': self.k, 'error': self.error, 'counters': list(self.counters.items())}
+
+    @classmethod
+    def from_state(cls, state: Dict) -> 'MisraGries':
+        summary = cls(state['k'])
+        summary.error = state['error']
+        summary.counters = {value: count for value, count in state['counters']}
+        return summary
+
+
+class ColumnSketch:
+    """Bounded-memory, mergeable summary of one column's values.
+
+    Tracks rows and nulls, distinct values (HyperLogLog), frequent values
+    (Misra-Gries) and, for numeric columns, quantiles and a histogram (KLL).
+    Sketches built by different workers or runs over disjoint rows merge into
+    the sketch of all those rows.
+    """
+
+    def __init__(self, numeric: bool = False, k: int = 200, top_k: int = 64, precision: int = 12):
+        self.numeric = numeric
+        self.rows = 0
+        self.nulls = 0
+        self.distinct = HyperLogLog(precision)
+        self.frequent = MisraGries(top_k)
+        self.quantile_sketch = KLLSketch(k) if numeric else None
+
+    def update(self, values: Sequence):
+        """Add a batch of values, None for NULL"""
+        non_null = [value for value in values if value is not None]
+        self.rows += len(values)
+        self.nulls += len(values) - len(non_null)
+        if not non_null:
+            return
+        if self.numeric:
+            numbers = np.asarray(non_null, dtype=np.float64)
+            self.quantile_sketch.update(numbers)
+            self.distinct.add_hashes(hash_values(numbers, numeric=True))
+        else:
+            self.distinct.add_hashes(hash_values(non_null))
+        self.frequent.update(non_null)
+
+    def merge(self, other: 'ColumnSketch') -> 'ColumnSketch':
+        """Fold another column sketch into this one"""
+        self.rows += other.rows
+        self.nulls += other.nulls
+        self.distinct.merge(other.distinct)
+        self.frequent.merge(other.frequent)
+        if self.quantile_sketch is not None and other.quantile_sketch is not None:
+            self.quantile_sketch.merge(other.quantile_sketch)
+        return self
+
+    def summary(self, fractions: Sequence[float] = (0.01, 0.25, 0.5, 0.75, 0.99), top: int = 10,
+                bins: int = 10) -> Dict:
+        """Describe the distribution: quantiles, histogram, top values and distinct estimate"""
+        non_null = self.rows - self.nulls
+        result = {
+            'rows': self.rows,
+            'null_count': self.nulls,
+            'distinct_estimate': min(round(self.distinct.estimate()), non_null),
+            'top_values': self.frequent.top(top),
+            'quantiles': None,
+            'histogram': None
+        }
+        if self.quantile_sketch is not None and self.quantile_sketch.count:
+            result['quantiles'] = dict(zip(fractions, self.quantile_sketch.quantiles(fractions)))
+            edges, counts = self.quantile_sketch.histogram(bins)
+            result['histogram'] = {'edges': edges, 'counts': counts}
+        return result
+
+    def state(self) -> Dict:
+        """Plain-data form for persisting a partial sketch between runs"""
+        return {
+            'numeric': self.numeric, 'rows': self.rows, 'nulls': self.nulls,
+            'distinct': {'precision': self.distinct.precision, 'registers': bytes(self.distinct.registers).hex()},
+            'frequent': self.frequent.state(),
+            'quantiles': self.quantile_sketch.state() if self.quantile_sketch is not None else None
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict) -> 'ColumnSketch':
+        sketch = cls(state['numeric'])
+        sketch.rows = state['rows']
+        sketch.nulls = state['nulls']
+        sketch.distinct = HyperLogLog(state['distinct']['precision'], bytes.fromhex(state['distinct']['registers']))
+        sketch.frequent = MisraGries.from_state(state['frequent'])
+        sketch.quantile_sketch = KLLSketch.from_state(state['quantiles']) if state['quantiles'] else None
+        return sketch
@@ -0,0 +1,162 @@
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from profiler import STRING_TYPES, column_metrics, quote_identifier, quote_table_name
+
+# Arrow types for SQL Server column types; anything else is inferred from the values
+ARROW_TYPES = {
+    'bigint': pa.int64(), 'int': pa.int64(), 'smallint': pa.int64(), 'tinyint': pa.int64(),
+    'bit': pa.bool_(), 'float': pa.float64(), 'real': pa.float64(),
+    'date': pa.date32(), 'datetime': pa.timestamp('us'), 'datetime2': pa.timestamp('us'),
+    'smalldatetime': pa.timestamp('us'),
+}
+
+
+def arrow_type(column: Dict) -> Optional[pa.DataType]:
+    """Get the Arrow type a column is exported as, or None to infer it"""
+    if column['data_type'] in STRING_TYPES:
+        return pa.string()
+    if column['data_type'] in ('decimal', 'numeric') and column.get('precision'):
+        return pa.decimal128(column['precision'], column.get('scale') or 0)
+    if column['data_type'] in ('money', 'smallmoney'):
+        return pa.decimal128(19, 4)
+    return ARROW_TYPES.get(column['data_type'])
+
+
+def to_array(values: List, column: Dict) -> pa.Array:
+    """Convert one batch of column values to an Arrow array"""
+    data_type = arrow_type(column)
+    if data_type is not None:
+        try:
+            return pa.array(values, type=data_type)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Drivers may return a different Python type than the SQL type suggests
+            pass
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([None if value is None else str(value) for value in values], type=pa.string())
+
+
+class SnapshotStore:
+    """Local columnar copies of tables, for profiling without loading the server.
+
+    export() streams a table once in large fetchmany batches into an Arrow IPC
+    file. open() memory-maps it, so repeated profiles read from the OS page
+    cache instead of the database, and profile() computes the same profile
+    dict as TableProfiler with vectorized Arrow kernels, one column per core.
+    """
+
+    def __init__(self, directory: str, batch_size: int = 50000, workers: Optional[int] = None):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.workers = workers or os.cpu_count() or 1
+
+    def path(self, table_name: str) -> str:
+        """File a table's snapshot is written to"""
+        safe = re.sub(r"[^A-Za-z0-9_.-]", "_", table_name.lower())
+        return os.path.join(self.directory, f"{safe}.arrow")
+
+    def export(self, cursor, table_name: str, columns: List[Dict], metadata: Optional[Dict] = None) -> Tuple[str, int]:
+        """Copy a table into its snapshot file, returning (path, rows written).
+
+        The file is written under a temporary name and renamed when complete,
+        so readers never see a partial snapshot.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(table_name)
+        select_list = ", ".join(quote_identifier(column['name']) for column in columns)
+        cursor.execute(f"SELECT {select_list} FROM {quote_table_name(table_name)}")
+
+        info = dict(metadata or {}, table_name=table_name, exported_at=time.time())
+        names = [column['name'] for column in columns]
+        rows_written = 0
+        writer = None
+        schema = None
+        temporary = path + '.tmp'
+        try:
+            while True:
+                rows = cursor.fetchmany(self.batch_size)
+                if not rows:
+                    break
+                arrays = [to_array(list(values), column) for values, column in zip(zip(*rows), columns)]
+                batch = pa.RecordBatch.from_arrays(arrays, names=names)
+                if writer is None:
+                    schema = batch.schema.with_metadata({'snapshot': json.dumps(info, default=str)})
+                    writer = pa.ipc.new_file(temporary, schema)
+                elif batch.schema != schema.remove_metadata():
+                    # Later batches can infer a different type (e.g. all-NULL first batch)
+                    batch = pa.RecordBatch.from_arrays(
+                        [array.cast(field.type) for array, field in zip(batch.columns, schema)], names=names)
+                writer.write_batch(batch)
+                rows_written += len(rows)
+            if writer is None:
+                schema = pa.schema([pa.field(name, arrow_type(column) or pa.null())
+                                    for name, column in zip(names, columns)])
+                writer = pa.ipc.new_file(temporary, schema.with_metadata({'snapshot': json.dumps(info, default=str)}))
+        except BaseException:
+            if writer is not None:
+                writer.close()
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        writer.close()
+        os.replace(temporary, path)
+        return path, rows_written
+
+    def open(self, table_name: str) -> Optional[Tuple[pa.Table, Dict]]:
+        """Memory-map a table's snapshot, returning (table, metadata) or None if there is none"""
+        path = self.path(table_name)
+        if not os.path.exists(path):
+            return None
+        source = pa.memory_map(path, 'r')
+        table = pa.ipc.open_file(source).read_all()
+        metadata = json.loads((table.schema.metadata or {}).get(b'snapshot', b'{}'))
+        return table, metadata
+
+    def remove(self, table_name: str):
+        """Delete a table's snapshot if it exists"""
+        path = self.path(table_name)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def column_stats(self, array: pa.ChunkedArray, data_type: str) -> Dict:
+        """Compute one column's raw aggregates, named as in TableProfiler's stats.
+
+        Strings compare by code point, not by the server's collation, so
+        case-insensitive databases can report more distinct values here.
+        """
+        stats = {}
+        metrics = column_metrics(data_type)
+        stats['non_null'] = len(array) - array.null_count
+        if 'distinct' in metrics:
+            stats['distinct'] = pc.count_distinct(array).as_py()
+        if 'min' in metrics and stats['non_null']:
+            extremes = pc.min_max(array)
+            stats['min'], stats['max'] = extremes['min'].as_py(), extremes['max'].as_py()
+        if 'avg' in metrics and stats['non_null']:
+            # The exact profiler averages as float too: AVG(CAST(col AS float))
+            stats['avg'] = pc.mean(array.cast(pa.float64())).as_py()
+        return stats
+
+    def profile(self, profiler, table: pa.Table, table_name: str, columns: List[Dict],
+                metadata: Optional[Dict] = None) -> Dict:
+        """Build the profile dict of a snapshot, one column per worker thread"""
+        total_rows = table.num_rows
+
+        def stats_for(column):
+            return self.column_stats(table.column(column['name']), column['data_type'])
+
+        with ThreadPoolExecutor(max_workers=min(self.workers, max(len(columns), 1))) as executor:
+            stats = list(executor.map(stats_for, columns))
+
+        profile_data = profiler.build_profile(table_name, columns, stats, total_rows, mode='snapshot')
+        profile_data['snapshot'] = {'path': self.path(table_name), 'exported_at': (metadata or {}).get('exported_at')}
+        return profile_data
@@ -0,0 +1,135 @@
+import datetime
+import json
+import sqlite3
+import threading
+import time
+from collections.abc import Mapping, Sequence
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from sketches import HyperLogLog
+
+
+def _encode(value):
+    """JSON encoder hook for the non-JSON values that appear in profiles and partials"""
+    if isinstance(value, HyperLogLog):
+        return {'$hll': value.precision, 'registers': bytes(value.registers).hex()}
+    if isinstance(value, Decimal):
+        return {'$decimal': str(value)}
+    if isinstance(value, datetime.datetime):
+        return {'$datetime': value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {'$date': value.isoformat()}
+    if isinstance(value, datetime.time):
+        return {'$time': value.isoformat()}
+    if isinstance(value, (bytes, bytearray)):
+        return {'$bytes': bytes(value).hex()}
+    # Compact result containers (results.Records and its row views) are stored as plain lists and dicts
+    if isinstance(value, Mapping):
+        return dict(value)
+    if isinstance(value, Sequence):
+        return list(value)
+    raise TypeError(f"Cannot store value of type {type(value).__name__}")
+
+
+def _decode(obj: Dict):
+    """JSON object hook reversing _encode"""
+    if '$hll' in obj:
+        return HyperLogLog(obj['$hll'], bytes.fromhex(obj['registers']))
+    if '$decimal' in obj:
+        return Decimal(obj['$decimal'])
+    if '$datetime' in obj:
+        return datetime.datetime.fromisoformat(obj['$datetime'])
+    if '$date' in obj:
+        return datetime.date.fromisoformat(obj['$date'])
+    if '$time' in obj:
+        return datetime.time.fromisoformat(obj['$time'])
+    if '$bytes' in obj:
+        return bytes.fromhex(obj['$bytes'])
+    return obj
+
+
+# Built once: json.dumps/json.loads with hooks construct a new coder on every call
+_encoder = json.JSONEncoder(default=_encode)
+_decoder = json.JSONDecoder(object_hook=_decode)
+
+
+def dumps(value) -> str:
+    return _encoder.encode(value)
+
+
+def loads(text: Optional[str]):
+    return _decoder.decode(text) if text else None
+
+
+class ProfileStore:
+    """Persistent store of table profiles and the change markers they were built from.
+
+    Each record keeps the table's modify_date and catalog row count, the
+    profile dict itself and, for tables profiled by key range, the mergeable
+    partial of every range with its row count and largest rowversion. A
+    refresh compares those markers with the live table and recomputes only
+    what changed. Records live in a SQLite file and values such as dates,
+    decimals and sketches round-trip through tagged JSON.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS profiles (
+                table_name TEXT PRIMARY KEY,
+                modify_date TEXT,
+                row_count INTEGER,
+                profile TEXT NOT NULL,
+                ranges TEXT,
+                profiled_at REAL NOT NULL
+            )""")
+        self._db.commit()
+
+    def get(self, table_name: str) -> Optional[Dict]:
+        """Get the stored record for a table: modify_date, row_count, profile, ranges, profiled_at"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT modify_date, row_count, profile, ranges, profiled_at FROM profiles WHERE table_name = ?",
+                (table_name.lower(),)).fetchone()
+        if row is None:
+            return None
+        modify_date, row_count, profile, ranges, profiled_at = row
+        return {
+            'modify_date': loads(modify_date),
+            'row_count': row_count,
+            'profile': loads(profile),
+            'ranges': loads(ranges),
+            'profiled_at': profiled_at
+        }
+
+    def put(self, table_name: str, profile: Dict, modify_date, row_count: Optional[int],
+            ranges: Optional[List[Dict]] = None):
+        """Store a table's profile with the markers it was built from"""
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO profiles (table_name, modify_date, row_count, profile, ranges, profiled_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (table_name.lower(), dumps(modify_date), row_count, dumps(profile),
+                 dumps(ranges) if ranges is not None else None, time.time()))
+            self._db.commit()
+
+    def delete(self, table_name: Optional[str] = None):
+        """Forget one table's profile, or every profile when no table is given"""
+        with self._lock:
+            if table_name is None:
+                self._db.execute("DELETE FROM profiles")
+            else:
+                self._db.execute("DELETE FROM profiles WHERE table_name = ?", (table_name.lower(),))
+            self._db.commit()
+
+    def tables(self) -> List[str]:
+        """Names of the tables with a stored profile"""
+        with self._lock:
+            return [row[0] for row in self._db.execute("SELECT table_name FROM profiles ORDER BY table_name")]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Tests must not read or write the developer's caches and profile store
+os.environ['ROUTING_CACHE_PATH'] = ''
+os.environ['PROFILE_STORE_PATH'] = ''
+
+from benchmarks.backends import SQLiteDatabase, build_catalog
+
+
+@pytest.fixture
+def make_db(tmp_path, monkeypatch):
+    """Build a synthetic SQLite catalog and return a DatabaseConnection over it"""
+    monkeypatch.setenv('SNAPSHOT_DIR', str(tmp_path / 'snapshots'))
+    databases = []
+
+    def make(tables=2, columns=6, rows=500, **env):
+        for name, value in env.items():
+            monkeypatch.setenv(name, str(value))
+        path = str(tmp_path / f"catalog_{len(databases)}.sqlite")
+        build_catalog(path, tables, columns, rows)
+        db = SQLiteDatabase(path)
+        databases.append(db)
+        return db
+
+    yield make
+    for db in databases:
+        db.disconnect()
@@ -0,0 +1,56 @@
+import asyncio
+import threading
+
+from agent import DatabaseAgent
+from benchmarks.backends import FakeLLM
+
+
+class LoopRecordingLLM(FakeLLM):
+    """FakeLLM that notes which event loop each call ran on and whether it was closed"""
+
+    def __init__(self, latency=0.0):
+        super().__init__(latency)
+        self.loops = set()
+        self.closed = 0
+
+    async def aprocess_question(self, question, tables):
+        self.loops.add(asyncio.get_running_loop())
+        return await super().aprocess_question(question, tables)
+
+    async def aclose(self):
+        self.closed += 1
+
+
+def make_agent(make_db, monkeypatch):
+    monkeypatch.setenv('ROUTER_THRESHOLD', '0')
+    return DatabaseAgent(db=make_db(), llm=LoopRecordingLLM(latency=0.05))
+
+
+def test_concurrent_batches_share_one_event_loop(make_db, monkeypatch):
+    agent = make_agent(make_db, monkeypatch)
+    agent.start_event_loop()
+    answers = []
+
+    def batch(n):
+        answers.append(agent.process_questions([f"list tables {n}", f"show tables {n}"], display=False))
+
+    threads = [threading.Thread(target=batch, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    agent.close()
+
+    assert len(answers) == 4 and all(len(answer) == 2 and all(answer) for answer in answers)
+    assert len(agent.llm.loops) == 1
+    assert agent.llm.closed == 1
+
+
+def test_one_off_batch_closes_its_client(make_db, monkeypatch):
+    agent = make_agent(make_db, monkeypatch)
+
+    answers = agent.process_questions(["list tables"], display=False)
+    agent.close()
+
+    assert answers[0][0]['tool_name'] == 'list_tables'
+    assert agent.llm.closed == 1
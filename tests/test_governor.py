@@ -0,0 +1,158 @@
+import threading
+import time
+
+import pytest
+
+from governor import BudgetExceeded, Cancelled, QueryGovernor
+
+# Counts to a large number one row at a time, so it runs until interrupted
+SLOW_QUERY = """
+WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 100000000)
+SELECT COUNT(*) FROM n
+"""
+
+
+def run_slow_query(db):
+    with db.governor.job('slow'):
+        with db.scan_cursor() as cursor:
+            cursor.execute(SLOW_QUERY)
+            return cursor.fetchone()
+
+
+def test_cancel_interrupts_running_statement(make_db):
+    db = make_db(tables=1)
+    threading.Timer(0.2, db.cancel_profiles).start()
+
+    started = time.perf_counter()
+    with pytest.raises(Cancelled):
+        run_slow_query(db)
+    assert time.perf_counter() - started < 5
+
+
+def test_budget_interrupts_running_statement(make_db):
+    db = make_db(tables=1)
+    db.governor.job_budget = 0.2
+
+    with pytest.raises(BudgetExceeded):
+        run_slow_query(db)
+
+
+def test_cancel_reaches_jobs_waiting_for_a_slot():
+    governor = QueryGovernor(max_concurrency=1)
+    holding = threading.Event()
+    release = threading.Event()
+    errors = []
+
+    def hold():
+        with governor.job('running'):
+            holding.set()
+            release.wait(5)
+
+    def wait_for_slot():
+        try:
+            with governor.job('waiting'):
+                pass
+        except Cancelled as e:
+            errors.append(e)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    holding.wait(5)
+    waiter = threading.Thread(target=wait_for_slot)
+    waiter.start()
+    time.sleep(0.1)
+
+    assert governor.cancel_all() == 1
+    waiter.join(5)
+    release.set()
+    holder.join(5)
+    assert len(errors) == 1
+    # Jobs started after the cancellation run normally
+    with governor.job('later') as job:
+        assert not job.cancelled
+
+
+def test_cancel_stops_profile_database_submitting_tables(make_db):
+    db = make_db(tables=6)
+
+    def cancel_after_first(done, total, table_name, profile):
+        if done == 1:
+            db.cancel_profiles()
+
+    results = db.profile_database(max_workers=1, progress=cancel_after_first, mode='exact')
+    # The next table is submitted before progress runs, so it may finish too
+    assert sum(1 for profile in results.values() if profile) <= 2
+
+
+def test_iter_profile_leaves_no_job_between_items(make_db):
+    db = make_db(tables=1, columns=12)
+    db.profiler.max_columns_per_query = 4
+    name = db.list_tables()[0]['name']
+
+    items = db.iter_profile(name, mode='exact')
+    header = next(items)
+    assert header['table_name'] == name
+    assert db.governor.current() is None
+    assert len(list(items)) == 12
+
+
+def test_pressure_halves_limit_and_prefers_sampling():
+    governor = QueryGovernor(max_concurrency=4, latency_factor=4, check_interval=0)
+    governor.observe(1.0, 1000000)
+    governor.observe(100.0, 1000000)
+
+    assert governor.prefer_sampling()
+    assert governor.limit == 2
+    for _ in range(10):
+        governor.check_load(lambda: None)
+    assert not governor.prefer_sampling()
+    assert governor.limit == 4
+
+
+class TimeoutConnection:
+    """pyodbc-like connection whose cursors take the timeout set when they are created"""
+
+    def __init__(self):
+        self.timeout = 0
+        self.statements = []
+
+    def cursor(self):
+        return TimeoutCursor(self)
+
+    def close(self):
+        pass
+
+
+class TimeoutCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.timeout = connection.timeout
+
+    def execute(self, sql, *params):
+        self.connection.statements.append((sql, self.timeout))
+        return self
+
+    def fetchone(self):
+        return (1,)
+
+    def close(self):
+        pass
+
+
+def test_statement_timeout_applies_to_the_cursor_that_runs_it(monkeypatch):
+    from database import DatabaseConnection
+
+    monkeypatch.setenv('PROFILE_QUERY_TIMEOUT', '7')
+    monkeypatch.setenv('PROFILE_ISOLATION', 'read_uncommitted')
+    connection = TimeoutConnection()
+    db = DatabaseConnection(connect=lambda: connection, driver_error=Exception)
+    try:
+        with db.scan_cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM t")
+            cursor.execute("SELECT COUNT(*) FROM u")
+    finally:
+        db.disconnect()
+
+    timeouts = {sql: timeout for sql, timeout in connection.statements}
+    assert timeouts["SELECT COUNT(*) FROM t"] == 7
+    assert timeouts["SELECT COUNT(*) FROM u"] == 7
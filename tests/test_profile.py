@@ -0,0 +1,9 @@
+def test_approximate_profile_reports_catalog_row_count(make_db):
+    db = make_db(tables=1, rows=2000, PROFILE_SAMPLE_ROWS=100)
+    table = db.list_tables()[0]
+
+    profile = db.profile_table(table['name'], mode='approximate')
+
+    assert profile['mode'] == 'approximate'
+    assert profile['total_rows'] == table['row_count']
+    assert table['row_count'] > 100
@@ -0,0 +1,59 @@
+import io
+from array import array
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+from results import Records
+
+ROWS = [
+    {'name': 'id', 'count': 3, 'nullable': False, 'min': Decimal('1.50'), 'seen': datetime(2024, 1, 2, 3, 4)},
+    {'name': 'total', 'count': 7, 'nullable': True, 'min': None, 'extra': {'top': [1, 2]}},
+    {'name': 'day', 'count': 0, 'nullable': True, 'min': date(2024, 5, 6)},
+]
+
+
+def test_views_behave_like_the_dicts():
+    records = Records.from_dicts(ROWS)
+
+    assert records.to_dicts() == ROWS
+    assert records == ROWS
+    assert 'extra' not in records[0]
+    assert records[1]['extra'] == {'top': [1, 2]}
+    assert records.column('count') == [3, 7, 0]
+
+
+def test_int_and_bool_columns_are_packed():
+    records = Records.from_dicts(ROWS)
+
+    assert isinstance(records._columns['count'], array)
+    assert isinstance(records._columns['nullable'], bytearray)
+    assert records[0]['nullable'] is False
+
+    # A value that no longer fits unpacks the column
+    records[0]['count'] = 'many'
+    assert records.column('count') == ['many', 7, 0]
+
+
+def test_jsonl_round_trip():
+    records = Records.from_dicts(ROWS)
+    text = io.StringIO()
+    records.to_jsonl(text, {'table_name': 'vendors'})
+    text.seek(0)
+
+    restored, metadata = Records.from_jsonl(text)
+    assert restored.to_dicts() == ROWS
+    assert metadata == {'table_name': 'vendors'}
+
+
+def test_arrow_round_trip():
+    pytest.importorskip('pyarrow')
+    records = Records.from_dicts(ROWS)
+    stream = io.BytesIO()
+    records.write_arrow(stream, {'table_name': 'vendors'})
+    stream.seek(0)
+
+    restored, metadata = Records.read_arrow(stream)
+    assert restored.to_dicts() == ROWS
+    assert metadata == {'table_name': 'vendors'}
@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from router import IntentRouter
+
+TABLES = [{'name': name, 'schema': 'dbo', 'row_count': 100}
+          for name in ('customers', 'vendors', 'orders', 'products', 'order_items', 'items')]
+
+
+@pytest.fixture(scope='module')
+def router():
+    return IntentRouter()
+
+
+def table_names(result):
+    return [json.loads(call['parameters'])['table_name'] for call in result.get('calls') or [result]]
+
+
+def test_single_table(router):
+    result = router.route("What's the structure of the vendors table?", TABLES)
+    assert result['tool_name'] == 'get_table_schema'
+    assert table_names(result) == ['vendors']
+    assert 'calls' not in result
+
+
+@pytest.mark.parametrize('question, tool, tables', [
+    ("Profile the customers and vendors tables", 'profile_table', ['customers', 'vendors']),
+    ("Show the schema of orders and products", 'get_table_schema', ['orders', 'products']),
+    ("Give me statistics about orders, products and customers", 'profile_table',
+     ['orders', 'products', 'customers']),
+])
+def test_several_tables_get_one_call_each(router, question, tool, tables):
+    result = router.route(question, TABLES)
+    assert all(call['tool_name'] == tool for call in result['calls'])
+    assert table_names(result) == tables
+
+
+def test_two_word_name_replaces_its_parts(router):
+    result = router.route("Show the schema of order items", TABLES)
+    assert table_names(result) == ['order_items']
+
+
+@pytest.mark.parametrize('question', [
+    "delete all rows from customers",
+    "Drop the vendors table",
+    "truncate orders",
+])
+def test_write_requests_go_to_the_llm(router, question):
+    assert router.route(question, TABLES) is None
@@ -0,0 +1,37 @@
+import pytest
+
+
+def test_export_writes_every_batch(make_db):
+    db = make_db(tables=1, rows=1000, SNAPSHOT_BATCH_SIZE=300)
+    table = db.list_tables()[0]
+
+    assert db.snapshot_table(table['name']) == table['row_count']
+    assert table['row_count'] > 300
+    snapshot, metadata = db.snapshot_store().open(table['name'])
+    assert snapshot.num_rows == table['row_count']
+    assert metadata['table_name'] == table['name']
+
+
+def test_snapshot_profile_matches_exact_profile(make_db):
+    db = make_db(tables=1, rows=1000, SNAPSHOT_BATCH_SIZE=300)
+    name = db.list_tables()[0]['name']
+
+    exact = db.profile_table(name, mode='exact')
+    snapshot = db.profile_table(name, mode='snapshot')
+
+    assert snapshot['mode'] == 'snapshot'
+    assert snapshot['total_rows'] == exact['total_rows']
+    for column, expected in zip(snapshot['columns'], exact['columns']):
+        assert column['null_count'] == expected['null_count']
+        if expected['avg_value'] is not None and column['data_type'] != 'bit':
+            assert column['avg_value'] == pytest.approx(expected['avg_value'])
+
+
+def test_snapshot_fits_a_single_pooled_connection(make_db):
+    db = make_db(tables=3, DB_POOL_SIZE='1', DB_POOL_TIMEOUT='1')
+
+    snapshot = db.get_catalog_snapshot()
+
+    assert snapshot is not None
+    assert len(snapshot['schemas']) == 3
+    assert all(db.catalog_cache.has_schema(name) for name in snapshot['schemas'])
@@ -1,60 +1,119 @@
+import itertools
+import time
+
+from metrics import metrics
+
+@metrics.timed('format', formatter='format_table_schema')
 def format_table_schema(schema):
     """Format and display table schema information"""
     if not schema:
         return None
         
-    print(f"\nSchema for table '{schema['table_name']}':")
+    stream_table_schema(schema['table_name'], schema['columns'])
+    return schema
+
+def stream_table_schema(table_name, columns):
+    """Display schema columns as they arrive from any iterable, returning how many were shown"""
+    print(f"\nSchema for table '{table_name}':")
     print("-" * 80)
     print(f"{'Column Name':<20} {'Data Type':<15} {'Nullable':<10} {'Primary Key':<12} {'Foreign Key':<12} {'Identity':<10}")
     print("-" * 80)
     
-    for column in schema['columns']:
+    shown = 0
+    for column in columns:
         print(f"{column['name']:<20} "
               f"{column['data_type']:<15} "
               f"{'Yes' if column['is_nullable'] else 'No':<10} "
               f"{'Yes' if column['is_primary_key'] else 'No':<12} "
               f"{'Yes' if column['is_foreign_key'] else 'No':<12} "
-              f"{'Yes' if column['is_identity'] else 'No':<10}")
+              f"{'Yes' if column['is_identity'] else 'No':<10}", flush=True)
+        shown += 1
     print("-" * 80)
-    return schema
+    return shown
 
+@metrics.timed('format', formatter='format_table_profile')
 def format_table_profile(profile):
     """Format and display table profile information"""
     if not profile:
         return None
         
+    header = {key: value for key, value in profile.items() if key != 'columns'}
+    stream_table_profile(itertools.chain([header], profile['columns']))
+    return profile
+
+def stream_table_profile(items):
+    """Display a profile from an iterator of its header dict followed by column profiles.
+
+    Rows are printed as the columns arrive, so a streamed profile shows its
+    first columns before the remaining statements finish. Returns how many
+    columns were shown, or None when the iterator was empty.
+    """
+    profile = next(items, None)
+    if not profile:
+        return None
+        
     print(f"\nProfile for table '{profile['table_name']}':")
     print(f"Total Rows: {profile['total_rows']}")
+    if profile.get('mode') == 'approximate':
+        print(f"Approximate profile from a {profile['sample_rows']}-row sample ({profile['sample_method']}); "
+              f"estimated values are marked with ~")
+    elif profile.get('mode') == 'metadata':
+        print("Estimated from statistics objects without reading the table; estimated values are marked with ~")
+    elif profile.get('mode') == 'snapshot':
+        print(f"Computed from a local snapshot exported at {time.strftime('%Y-%m-%d %H:%M', time.localtime(profile['snapshot']['exported_at']))}")
     print("\nColumn Statistics:")
     print("-" * 100)
     print(f"{'Column':<20} {'Type':<12} {'Null %':<10} {'Unique %':<10} {'Min':<15} {'Max':<15} {'Avg':<15}")
     print("-" * 100)
     
-    for col in profile['columns']:
+    shown = 0
+    stale = []
+    for col in items:
         # Format min, max, avg values based on data type
         min_val = str(col['min_value'])[:15] if col['min_value'] is not None else 'N/A'
         max_val = str(col['max_value'])[:15] if col['max_value'] is not None else 'N/A'
         avg_val = f"{col['avg_value']:.2f}" if col['avg_value'] is not None else 'N/A'
-        
+        estimated = col.get('estimated', {})
+        if 'avg_value' in estimated and estimated['avg_value']['upper'] is not None:
+            avg_val = f"~{avg_val}±{estimated['avg_value']['upper'] - col['avg_value']:.2f}"[:15]
+        null_mark = '~' if 'null_percentage' in estimated else ' '
+        unique_mark = '~' if 'unique_count' in estimated else ' '
+        # Columns without statistics have no estimates in metadata profiles
+        null_pct = f"{col['null_percentage']:>6.2f}%" if col['null_percentage'] is not None else f"{'N/A':>7}"
+        unique_pct = f"{col['unique_percentage']:>6.2f}%" if col['unique_percentage'] is not None else f"{'N/A':>7}"
+        if col.get('statistics') and col['statistics']['stale']:
+            stale.append(col['name'])
+
         print(f"{col['name']:<20} "
               f"{col['data_type']:<12} "
-              f"{col['null_percentage']:>6.2f}%  "
-              f"{col['unique_percentage']:>6.2f}%  "
+              f"{null_mark}{null_pct} "
+              f"{unique_mark}{unique_pct} "
               f"{min_val:<15} "
               f"{max_val:<15} "
-              f"{avg_val:<15}")
+              f"{avg_val:<15}", flush=True)
+        shown += 1
     print("-" * 100)
-    return profile
+    if stale:
+        print(f"Statistics are stale for: {', '.join(stale)}")
+    return shown
 
+@metrics.timed('format', formatter='format_table_list')
 def format_table_list(tables):
     """Format and display list of tables"""
     if not tables:
         return None
         
+    stream_table_list(tables)
+    return tables
+
+def stream_table_list(tables):
+    """Display tables as they arrive from any iterable, returning how many were shown"""
     print("\nDatabase Tables:")
     print("-" * 50)
+    shown = 0
     for table in tables:
         print(f"Table: {table['schema']}.{table['name']}")
-        print(f"Row Count: {table['row_count']}")
+        print(f"Row Count: {table['row_count']}", flush=True)
         print("-" * 50)
-    return tables 
\ No newline at end of file
+        shown += 1
+    return shown